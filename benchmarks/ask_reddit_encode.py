@@ -0,0 +1,61 @@
+"""ask_reddit_encode.py
+
+Measures how AskReddit encoding scales with the number of worker processes,
+on synthetic answers, and prints the speedup and scaling efficiency
+(speedup / workers) relative to encoding in-process.
+
+Usage: PYTHONPATH=. python benchmarks/ask_reddit_encode.py
+"""
+
+from __future__ import print_function
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from soc.modules import AskReddit
+
+NUM_ANSWERS = 100000
+MAX_LEN = 100
+
+
+def main():
+    rng = np.random.RandomState(0)
+    words = ['word%d' % i for i in range(5000)]
+    answers = [' '.join(rng.choice(words, rng.randint(5, MAX_LEN)))
+               for _ in range(NUM_ANSWERS)]
+
+    print('%d cores' % multiprocessing.cpu_count())
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        module = AskReddit()
+        module.update_dicts_with_str(' '.join(words))
+        start = time.time()
+        module.encode_indices(answers, MAX_LEN)
+        baseline = time.time() - start
+        print('in-process: %6.2f sec' % baseline)
+
+        for num_workers in (1, 2, 4, 8):
+            module.num_workers = num_workers
+            module._get_pool()  # Starts the workers before timing.
+            start = time.time()
+            module.encode_parallel(answers, MAX_LEN,
+                                   os.path.join(tmp_dir, 'indices.npy'),
+                                   os.path.join(tmp_dir, 'lengths.npy'))
+            elapsed = time.time() - start
+            module.close()
+
+            speedup = baseline / elapsed
+            print('%d workers:  %6.2f sec, %5.2fx, %3.0f%% efficiency'
+                  % (num_workers, elapsed, speedup,
+                     100 * speedup / num_workers))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
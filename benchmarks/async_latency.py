@@ -0,0 +1,70 @@
+"""async_latency.py
+
+Measures how long an asyncio event loop is blocked while a module loads its
+data, comparing `load_data` called from the loop with `await aload()`.
+
+Usage: PYTHONPATH=. python3 benchmarks/async_latency.py
+"""
+
+from __future__ import print_function
+
+import asyncio
+import time
+import zlib
+
+from soc.modules._base import Module
+
+# How often the loop checks in, in seconds.
+_TICK = 0.005
+
+
+class SlowModule(Module):
+    """Module whose load_data spends a while decompressing."""
+
+    _payload = zlib.compress(b'pysoc ' * (1 << 20), 1)
+
+    def load_data(self):
+        for _ in range(200):
+            zlib.decompress(self._payload)
+
+
+def _measure(loop, start_load):
+    """Returns the longest gap between ticks while the data loads."""
+
+    ticks = []
+
+    def _tick():
+        ticks.append(time.time())
+        loop.call_later(_TICK, _tick)
+
+    loop.call_soon(_tick)
+    loop.run_until_complete(asyncio.sleep(0.05))
+    start = time.time()
+    loop.run_until_complete(start_load())
+    loop.run_until_complete(asyncio.sleep(0.05))
+    ticks = ([t for t in ticks if t < start][-1:] +
+             [t for t in ticks if t >= start])
+    return max(b - a for a, b in zip(ticks, ticks[1:])), time.time() - start
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    module = SlowModule()
+
+    def _blocking():
+        future = loop.create_future()
+        loop.call_soon(lambda: (module.load_data(), future.set_result(None)))
+        return future
+
+    for name, start_load in (('load_data()', _blocking),
+                             ('await aload()', module.aload)):
+        max_gap, total = _measure(loop, start_load)
+        print('%-15s worst loop stall %7.1f ms (load took %.2f s)'
+              % (name, 1000 * max_gap, total))
+
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
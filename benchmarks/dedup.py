@@ -0,0 +1,50 @@
+"""dedup.py
+
+Measures how many texts per second `Deduplicator` filters, with and without
+near-duplicate detection, and the memory its filters take.
+
+Usage: PYTHONPATH=. python benchmarks/dedup.py
+"""
+
+from __future__ import print_function
+
+import time
+
+import numpy as np
+
+from soc.modules import Deduplicator
+
+NUM_TEXTS = 100000
+CHUNK_SIZE = 4096
+
+
+def _make_texts(rng):
+    texts = [' '.join('word%d' % w for w in
+                      rng.randint(20000, size=rng.randint(5, 60)))
+             for _ in range(NUM_TEXTS)]
+
+    # Repeats a tenth of the texts, half of them with one word changed.
+    for i in rng.randint(NUM_TEXTS, size=NUM_TEXTS // 10):
+        text = texts[rng.randint(NUM_TEXTS)]
+        if rng.rand() < 0.5:
+            text = text.replace(text.split()[0], 'changed', 1)
+        texts[i] = text
+    return texts
+
+
+def main():
+    texts = _make_texts(np.random.RandomState(0))
+
+    for near in (False, True):
+        deduplicator = Deduplicator(capacity=NUM_TEXTS, near=near)
+        start = time.time()
+        for i in range(0, NUM_TEXTS, CHUNK_SIZE):
+            deduplicator.keep(texts[i:i + CHUNK_SIZE])
+        elapsed = time.time() - start
+        print('%-6s %8.0f texts/sec, %5.1f MB of filters; %s'
+              % ('near' if near else 'exact', NUM_TEXTS / elapsed,
+                 deduplicator.nbytes / 1e6, deduplicator.summary()))
+
+
+if __name__ == '__main__':
+    main()
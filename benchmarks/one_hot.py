@@ -0,0 +1,63 @@
+"""one_hot.py
+
+Measures one-hot encoding throughput, in strings per second, of the
+per-string `np.eye` lookup and of the fused scatter into a reused buffer.
+
+Usage: PYTHONPATH=. python benchmarks/one_hot.py
+"""
+
+from __future__ import print_function
+
+import time
+
+import numpy as np
+
+from soc.modules._base import TextModule
+
+NUM_STRINGS = 2000
+MAX_LEN = 100
+
+
+def eye_encode(module, strings, max_len):
+    """The per-string encoding, with a row of the identity per character."""
+
+    eye = np.eye(module.num_chars)
+    arrs = []
+    for string in strings:
+        arr = np.zeros((max_len, module.num_chars))
+        data = np.asarray([eye[module._char_to_idx[c]] for c in string])
+        arr[:len(data)] = data[:max_len]
+        arrs.append(arr)
+    return np.stack(arrs)
+
+
+def main():
+    rng = np.random.RandomState(0)
+    alphabet = np.array(list('abcdefghijklmnopqrstuvwxyz .,!?'))
+    strings = [''.join(rng.choice(alphabet, rng.randint(20, MAX_LEN)))
+               for _ in range(NUM_STRINGS)]
+
+    module = TextModule(reuse_buffers=True)
+    module.encode(strings, MAX_LEN, update_dicts=True)
+    indices, lengths = module.encode_indices(strings, MAX_LEN)
+
+    runs = [
+        ('np.eye per string', lambda: eye_encode(module, strings, MAX_LEN)),
+        ('encode(one_hot=True)',
+         lambda: module.encode(strings, MAX_LEN, one_hot=True)),
+        ('scatter from cached indices',
+         lambda: module.indices_to_array('bench', indices, lengths, True)),
+    ]
+
+    expected = runs[0][1]()
+    for name, fn in runs:
+        np.testing.assert_array_equal(fn(), expected)
+        start = time.time()
+        for _ in range(5):
+            fn()
+        rate = 5 * NUM_STRINGS / (time.time() - start)
+        print('%-28s %10.0f strings/sec' % (name, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""sampling.py
+
+Measures weighted sampling throughput, in draws per second, of the alias
+table and of `np.random.choice` with probabilities, and how long building
+(or rebuilding, after a weight update) the alias table takes.
+
+Usage: PYTHONPATH=. python benchmarks/sampling.py
+"""
+
+from __future__ import print_function
+
+import time
+
+import numpy as np
+
+from soc.modules import WeightedSampler, StratifiedSampler
+
+NUM_SAMPLES = 1000000
+NUM_DRAWS = 1000000
+BATCH_SIZE = 1024
+
+
+def _draws_per_sec(draw):
+    start = time.time()
+    for _ in range(NUM_DRAWS // BATCH_SIZE):
+        draw()
+    return NUM_DRAWS / (time.time() - start)
+
+
+def main():
+    rng = np.random.RandomState(0)
+    weights = rng.pareto(1.5, size=NUM_SAMPLES)
+    probs = weights / weights.sum()
+
+    start = time.time()
+    sampler = WeightedSampler(weights)
+    print('alias table build:      %8.3f sec for %d samples'
+          % (time.time() - start, NUM_SAMPLES))
+
+    sampler.update_weights(rng.rand(1000), rng.randint(NUM_SAMPLES, size=1000))
+    start = time.time()
+    sampler.sample(1, rng)
+    print('rebuild after update:   %8.3f sec' % (time.time() - start))
+
+    rate = _draws_per_sec(lambda: sampler.sample(BATCH_SIZE, rng))
+    print('alias table:            %8.2fM draws/sec' % (rate / 1e6))
+
+    rate = _draws_per_sec(lambda: rng.choice(NUM_SAMPLES, BATCH_SIZE, p=probs))
+    print('np.random.choice(p=):   %8.2fM draws/sec' % (rate / 1e6))
+
+    stratified = StratifiedSampler(rng.randint(10, size=NUM_SAMPLES) ** 2)
+    rate = _draws_per_sec(lambda: stratified.sample(BATCH_SIZE, rng))
+    print('stratified, 10 classes: %8.2fM draws/sec' % (rate / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""sequence.py
+
+Compares MNIST-shaped batch throughput, in images per second, of the
+`iterate_data` generator and of `as_sequence`, read in order by one process
+and by a pool of processes fetching batches by index (as Keras does with
+`use_multiprocessing=True`).
+
+Usage: PYTHONPATH=. python benchmarks/sequence.py
+"""
+
+from __future__ import print_function
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from soc.modules import Compose, RandomShift, RandomRotation, Cast
+from soc.modules._base import Module
+
+BATCH_SIZE = 128
+NUM_BATCHES = 200
+
+
+class FakeMNIST(Module):
+    """MNIST-shaped random data, so the benchmark doesn't need a download."""
+
+    def __init__(self, transform=None):
+        self.transform = transform
+        rng = np.random.RandomState(0)
+        self._x = rng.randint(0, 256, size=(60000, 28, 28)).astype('uint8')
+        self._y = rng.randint(0, 10, size=(60000,))
+        super(FakeMNIST, self).__init__()
+
+    @property
+    def train_data(self):
+        return [self._x], [self._y]
+
+
+# The sequence that pool workers read from, inherited when they fork.
+_sequence = None
+
+
+def _get_batch(index):
+    return _sequence[index]
+
+
+def main():
+    global _sequence
+
+    transform = Compose([RandomShift(2), RandomRotation(15.),
+                         Cast('float32', 1. / 255)])
+    module = FakeMNIST(transform=transform)
+    print('%d cores' % multiprocessing.cpu_count())
+
+    def report(name, start):
+        rate = BATCH_SIZE * NUM_BATCHES / (time.time() - start)
+        print('%-28s %10.0f images/sec' % (name + ':', rate))
+
+    iterator = module.iterate_data(BATCH_SIZE, seed=0)
+    start = time.time()
+    for _ in range(NUM_BATCHES):
+        next(iterator)
+    report('generator', start)
+
+    _sequence = module.as_sequence(BATCH_SIZE, seed=0)
+    start = time.time()
+    for i in range(NUM_BATCHES):
+        _sequence[i]
+    report('sequence, in order', start)
+
+    for num_workers in (2, 4):
+        pool = multiprocessing.Pool(num_workers)
+        pool.map(_get_batch, range(num_workers))  # Starts the workers.
+        start = time.time()
+        for _ in pool.imap(_get_batch, range(NUM_BATCHES), chunksize=4):
+            pass
+        report('sequence, %d processes' % num_workers, start)
+        pool.terminate()
+        pool.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""transforms.py
+
+Measures MNIST augmentation throughput, in images per second, with the
+transforms run in the consumer or in prefetch workers.
+
+Usage: PYTHONPATH=. python benchmarks/transforms.py
+"""
+
+from __future__ import print_function
+
+import time
+
+import numpy as np
+
+from soc.modules import (Compose, RandomShift, RandomRotation, ElasticNoise,
+                         Cast)
+from soc.modules._base import Module
+
+
+class FakeMNIST(Module):
+    """MNIST-shaped random data, so the benchmark doesn't need a download."""
+
+    def __init__(self, transform=None):
+        self.transform = transform
+        rng = np.random.RandomState(0)
+        self._x = rng.randint(0, 256, size=(60000, 28, 28)).astype('uint8')
+        self._y = rng.randint(0, 10, size=(60000,))
+        super(FakeMNIST, self).__init__()
+
+    @property
+    def train_data(self):
+        return [self._x], [self._y]
+
+
+def _images_per_sec(iterator, batch_size, num_batches=200):
+    next(iterator)
+    start = time.time()
+    for _ in range(num_batches):
+        next(iterator)
+    return batch_size * num_batches / (time.time() - start)
+
+
+def main(batch_size=128):
+    transform = Compose([RandomShift(2), RandomRotation(15.),
+                         ElasticNoise(2., 5), Cast('float32', 1. / 255)])
+    module = FakeMNIST(transform=transform)
+
+    # Per-sample Python loop, for comparison.
+    rng = np.random.RandomState(0)
+    x = module._x[:batch_size]
+    start = time.time()
+    for _ in range(10):
+        for i in range(batch_size):
+            transform(x[i:i + 1], rng=rng)
+    per_sample = 10 * batch_size / (time.time() - start)
+    print('per-sample loop:          %10.0f images/sec' % per_sample)
+
+    configs = [('vectorized, no prefetch', {}),
+               ('prefetch, 1 worker', {'prefetch': 4, 'num_workers': 1}),
+               ('prefetch, 4 workers', {'prefetch': 4, 'num_workers': 4})]
+    for name, kwargs in configs:
+        iterator = module.iterate_data(batch_size, seed=0, **kwargs)
+        print('%-25s %10.0f images/sec'
+              % (name + ':', _images_per_sec(iterator, batch_size)))
+        iterator.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,8 @@ logging.getLogger().setLevel(logging.INFO)
 from .modules.mnist import mnist as mnist_cli
 from .modules.nietzsche import nietzsche as nietzsche_cli
 from .modules.ask_reddit import ask_reddit as ask_reddit_cli
+from .modules._cache import cache as cache_cli
+from .modules._sources import prefetch as prefetch_cli
 
 
 @click.group(options_metavar='',
@@ -29,3 +31,5 @@ def cli():
 cli.add_command(mnist_cli)
 cli.add_command(nietzsche_cli)
 cli.add_command(ask_reddit_cli)
+cli.add_command(cache_cli)
+cli.add_command(prefetch_cli)
@@ -3,6 +3,11 @@ from __future__ import absolute_import
 from .mnist import MNIST
 from .nietzsche import Nietzsche
 from .ask_reddit import AskReddit
-from ._settings import set_setting
+from ._settings import get_setting, set_setting, reload_settings
+from ._dedup import Deduplicator
+from ._compose import ArrayModule, ConcatModule, ZipModule, InterleaveModule
+from ._sampling import WeightedSampler, StratifiedSampler
+from ._transforms import (Compose, RandomShift, RandomRotation, ElasticNoise,
+                          Normalize, Cast)
 
 __all__ = ['MNIST', 'Nietzsche', 'AskReddit']
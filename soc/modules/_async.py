@@ -0,0 +1,88 @@
+"""_async.py
+
+Defines helpers for using modules from asyncio event loops (Python 3 only).
+
+Loading, downloading and decoding data blocks, so the asynchronous methods on
+`Module` run the blocking work in an executor and hand back futures which an
+event loop can await. The default executor is a thread pool; pass a process
+pool to move CPU-bound decoding out of the interpreter entirely.
+"""
+
+from __future__ import absolute_import
+
+import functools
+
+try:
+    import asyncio
+except ImportError:  # Python 2.
+    asyncio = None
+
+
+def _get_loop():
+    if asyncio is None:
+        raise RuntimeError('The asynchronous API needs asyncio (Python 3).')
+    return asyncio.get_event_loop()
+
+
+def run_in_executor(fn, *args, **kwargs):
+    """Runs a blocking function in an executor.
+
+    Args:
+        fn: the function to run.
+        args: positional arguments for the function.
+        kwargs: keyword arguments for the function, and optionally
+            `executor`, the concurrent.futures executor to use, or None for
+            the event loop's default one.
+
+    Returns:
+        an asyncio Future with the function's result.
+    """
+
+    executor = kwargs.pop('executor', None)
+    return _get_loop().run_in_executor(executor,
+                                       functools.partial(fn, *args, **kwargs))
+
+
+def gather(futures):
+    """Returns a Future which waits for all of the futures, in order."""
+
+    _get_loop()
+    return asyncio.gather(*futures)
+
+
+class AsyncIterator(object):
+    """Wraps a blocking iterator so it can be used with `async for`.
+
+    Each item is produced in an executor, so the event loop keeps running
+    while a batch is gathered. Items must be awaited one at a time.
+    """
+
+    def __init__(self, iterator, executor=None):
+        """Creates an AsyncIterator object.
+
+        Args:
+            iterator: the blocking iterator to wrap.
+            executor: a concurrent.futures executor, or None for the event
+                loop's default one.
+        """
+
+        self._iterator = iterator
+        self._executor = executor
+
+    def _next(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return run_in_executor(self._next, executor=self._executor)
+
+    def close(self):
+        """Closes the wrapped iterator, if it can be closed."""
+
+        if hasattr(self._iterator, 'close'):
+            self._iterator.close()
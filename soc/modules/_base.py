@@ -6,17 +6,28 @@ override the Module class or one of its subclasses.
 
 from __future__ import absolute_import
 
+from ._async import AsyncIterator, gather, run_in_executor
+from ._cache import get_cache_dir, prune, touch
+from ._export import export_arrays
+from ._lock import FileLock, LOCK_EXT, get_temp_path
 from ._settings import get_setting, get_module_subdir
+from ._prefetch import prefetch as prefetch_batches
+from ._sequence import get_sequence_class
+from ._shared import SharedDataset
+from ._stats import ArrayStats, Histogram
+from ._sources import download_url, fetch, get_resolver
 
 import click
+import functools
+import hashlib
+import json
 import logging
 import os
 import uuid
 import warnings
 import six
 import re
-
-from urllib2 import urlopen
+import shutil
 
 import numpy as np
 
@@ -24,9 +35,25 @@ import numpy as np
 class Module(object):
     """Defines the abstract module class."""
 
+    # A transform from `_transforms.py` applied to the inputs of each batch.
+    transform = None
+
     def __init__(self):
         self.module_name = self.__class__.__name__.lower()
         self.data_subdir = get_module_subdir(self.module_name)
+        self._shared = {}
+
+    def get_setting(self, key):
+        """Gets a setting, with this module's overrides applied.
+
+        Args:
+            key: str, the name of the setting.
+
+        Returns:
+            the setting's value.
+        """
+
+        return get_setting(key, self.module_name)
 
     def get_path(self, fname):
         """Returns the path to the specified module file.
@@ -41,6 +68,40 @@ class Module(object):
         fpath = os.path.join(self.data_subdir, fname)
         return fpath
 
+    def get_cache_path(self, fname):
+        """Returns the path to a derived artifact in the module's cache.
+
+        Derived artifacts can be rebuilt from the raw files, so unlike files
+        from `get_path`, they may be evicted when the data directory is over
+        the `cache_budget` setting. Getting the path of an existing artifact
+        marks it as recently used.
+
+        Args:
+            fname: str, the name of the artifact (a file or directory).
+
+        Returns:
+            fpath: str, the full path to the artifact.
+        """
+
+        fpath = os.path.join(get_cache_dir(self.data_subdir), fname)
+        if os.path.exists(fpath):
+            touch(fpath)
+        return fpath
+
+    def update_cache(self, fname):
+        """Records a newly built artifact and evicts old ones if over budget.
+
+        Args:
+            fname: str, the name of the artifact, which is never evicted by
+                this call.
+
+        Returns:
+            list of the CacheEntry tuples which were evicted.
+        """
+
+        fpath = self.get_cache_path(fname)
+        return prune(keep=[fpath])
+
     @staticmethod
     def get_unique(ext):
         """Returns a unique filename with the desired extension.
@@ -76,9 +137,25 @@ class Module(object):
         return is_valid
 
 
+    def _download(self, url, fpath, use_bar=True):
+        """Downloads a URL to a file.
+
+        Args:
+            url: str, the URL to download.
+            fpath: str, where to write the file.
+            use_bar: bool, whether or not to use the progress bar.
+        """
+
+        download_url(url, fpath, label=self.module_name, use_bar=use_bar)
+
     def get_file(self, fname, url, use_bar=True, download=False):
         """Retrieves a file from the specified URL, or loads it if it exists.
 
+        The mirrors in the `mirrors` setting are tried before the URL itself.
+        If several processes ask for the same missing file at once, one of
+        them downloads it while the others wait, and then they all use the
+        downloaded file.
+
         Args:
             fname: str, name of the file to download.
             url: str, original URL of the file.
@@ -89,33 +166,76 @@ class Module(object):
             fpath: str, path to the downloaded file.
         """
 
-        fpath = self.get_path(fname)
+        urls = get_resolver().get_urls(self.module_name, fname, url)
+        download_fn = functools.partial(self._download, use_bar=use_bar)
+        return fetch(self.get_path(fname), urls, download_fn, force=download)
+
+    def aget_file(self, fname, url, download=False, executor=None):
+        """Asynchronous version of `get_file`, for asyncio event loops.
+
+        Args:
+            fname: str, name of the file to download.
+            url: str, original URL of the file.
+            download: bool, if set, always download a new file.
+            executor: a concurrent.futures executor, or None for the event
+                loop's default one.
+
+        Returns:
+            an awaitable Future with the path to the downloaded file.
+        """
+
+        return run_in_executor(self.get_file, fname, url, use_bar=False,
+                               download=download, executor=executor)
+
+    def aget_files(self, files, download=False, executor=None):
+        """Downloads several files concurrently, for asyncio event loops.
 
-        if not os.path.exists(fpath) or download:
-            response = urlopen(url)
-            info, url = response.info(), response.url
+        Args:
+            files: list of (fname, url) tuples.
+            download: bool, if set, always download new files.
+            executor: a concurrent.futures executor, or None for the event
+                loop's default one.
 
-            # Gets the total file size from the header.
-            fsize = int(info.get('Content-Length').strip())
+        Returns:
+            an awaitable Future with the list of paths, in the same order.
+        """
 
-            if use_bar:
-                bar = click.progressbar(length=fsize,
-                                        label=self.module_name,
-                                        fill_char='=',
-                                        empty_char='.')
+        return gather([self.aget_file(fname, url, download=download,
+                                      executor=executor)
+                       for fname, url in files])
 
-            # Downloads the file.
-            chunk_size = get_setting('chunk_size')
-            with open(fpath, 'wb') as f:
-                chunk = response.read(chunk_size)
-                while chunk:
-                    f.write(chunk)
-                    if use_bar:
-                        bar.update(chunk_size)
-                    chunk = response.read(chunk_size)
+    def build_cached(self, fname, build_fn):
+        """Gets a derived artifact from the cache, building it if necessary.
 
-            if use_bar:
-                bar.finish()
+        If several processes need the same missing artifact at once, one of
+        them builds it while the others wait, and then they all use it.
+
+        Args:
+            fname: str, the name of the artifact.
+            build_fn: function taking the path to write the artifact to, which
+                may be a file or a directory.
+
+        Returns:
+            fpath: str, the path to the artifact.
+        """
+
+        fpath = self.get_cache_path(fname)
+
+        if os.path.exists(fpath):
+            return fpath
+
+        with FileLock(fpath + LOCK_EXT):
+            if not os.path.exists(fpath):
+                tmp_path = get_temp_path(fpath)
+                try:
+                    build_fn(tmp_path)
+                    os.rename(tmp_path, fpath)
+                finally:
+                    if os.path.isdir(tmp_path):
+                        shutil.rmtree(tmp_path)
+                    elif os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                self.update_cache(fname)
 
         return fpath
 
@@ -133,7 +253,7 @@ class Module(object):
 
         # Checks that the batch sizes are equal.
         def _check_batch_dim(args):
-            return not args or [len(i) == args[0] for i in args[1:]]
+            return all(len(i) == len(args[0]) for i in args)
 
         if not _check_batch_dim(x_data):
             raise ValueError('The batch dimension of x_data is not equal '
@@ -152,6 +272,76 @@ class Module(object):
 
         return True
 
+    def get_params_hash(self):
+        """Returns a hash of the module's public configuration.
+
+        Two module objects with the same hash produce the same preprocessed
+        data, so the hash can be used to name derived artifacts.
+
+        Returns:
+            str, the hex digest of the configuration.
+        """
+
+        params = dict((k, v) for k, v in vars(self).items()
+                      if not k.startswith('_') and
+                      isinstance(v, (bool, int, float) + six.string_types))
+        params['class'] = self.__class__.__name__
+        params_str = json.dumps(params, sort_keys=True)
+        return hashlib.md5(params_str.encode('utf-8')).hexdigest()
+
+    def _get_shared_name(self, mode):
+        """Returns the name of the shared segment for a mode."""
+
+        return '%s-%s-%s' % (self.module_name, mode, self.get_params_hash())
+
+    def shared_data(self, mode='train', persist=False):
+        """Gets a dataset from shared memory, publishing it if necessary.
+
+        The first process to request the data preprocesses it and publishes
+        it. Every other process with the same configuration attaches to the
+        published copy read-only, without copying or preprocessing it.
+
+        Args:
+            mode: str, 'train' or 'test'.
+            persist: bool, if set, the shared copy outlives the process that
+                published it, until `release_shared` is called.
+
+        Returns:
+            tuple of lists (x_data, y_data) of read-only Numpy arrays.
+        """
+
+        if mode not in ('train', 'test'):
+            raise ValueError('Invalid mode: "%s" (should be "train" or '
+                             '"test")' % mode)
+
+        if mode not in self._shared:
+            self._shared[mode] = SharedDataset(self._get_shared_name(mode))
+
+        shared = self._shared[mode]
+        if not shared.exists():
+            x_data, y_data = (self.train_data if mode == 'train'
+                              else self.test_data)
+            shared.publish(x_data, y_data, persist=persist)
+
+        return shared.attach()
+
+    def release_shared(self, mode=None, force=False):
+        """Removes shared copies of the data published by this process.
+
+        Args:
+            mode: str, 'train' or 'test', or None to release both.
+            force: bool, if set, also removes copies published by other
+                processes, such as ones published with `persist=True`.
+        """
+
+        modes = ('train', 'test') if mode is None else (mode,)
+        for m in modes:
+            shared = self._shared.pop(m, None)
+            if shared is None and force:
+                shared = SharedDataset(self._get_shared_name(m))
+            if shared is not None and (shared.is_owner or force):
+                shared.unlink()
+
     @property
     def shape(self):
         """Gets a tuple of (input_shape, output_shape)."""
@@ -166,6 +356,19 @@ class Module(object):
 
         raise NotImplementedError()
 
+    def aload(self, executor=None):
+        """Asynchronous version of `load_data`, for asyncio event loops.
+
+        Args:
+            executor: a concurrent.futures executor, or None for the event
+                loop's default one.
+
+        Returns:
+            an awaitable Future which is done when the data is loaded.
+        """
+
+        return run_in_executor(self.load_data, executor=executor)
+
     @property
     def test_data(self):
         """Gets the testing data, a tuple (x_test, y_test)."""
@@ -194,16 +397,269 @@ class Module(object):
         # return [()]
         raise NotImplementedError()
 
+    def _get_stats_accumulators(self, x_data, y_data):
+        """Returns the accumulators `stats` updates with each batch.
+
+        Subclasses add their own statistics by extending the dict.
+
+        Args:
+            x_data: list of Numpy arrays, the input data.
+            y_data: list of Numpy arrays, the output / target data.
+
+        Returns:
+            dict mapping names to (accumulator, fn) pairs, where fn maps
+                (x_batch, y_batch) to what to update the accumulator with.
+        """
+
+        accumulators = {}
+        for i in range(len(x_data)):
+            accumulators['input_%d' % i] = (
+                ArrayStats(), lambda x, y, i=i: x[i])
+        for i in range(len(y_data)):
+            accumulators['output_%d' % i] = (
+                ArrayStats(), lambda x, y, i=i: y[i])
+        return accumulators
+
+    def compute_stats(self, mode='train', batch_size=1024):
+        """Computes summary statistics of a dataset in a single pass.
+
+        Args:
+            mode: str, 'train' or 'test'.
+            batch_size: int, the number of samples to process at a time.
+
+        Returns:
+            dict with the number of samples and a dict of statistics.
+        """
+
+        if mode == 'train':
+            x_data, y_data = self.train_data
+        elif mode == 'test':
+            x_data, y_data = self.test_data
+        else:
+            raise ValueError('"mode" should be one of ["train", "test"], got '
+                             '"%s"' % mode)
+
+        accumulators = self._get_stats_accumulators(x_data, y_data)
+        num_samples = len((x_data or y_data)[0])
+
+        for start in range(0, num_samples, batch_size):
+            x_batch = [x[start:start + batch_size] for x in x_data]
+            y_batch = [y[start:start + batch_size] for y in y_data]
+            for accumulator, fn in accumulators.values():
+                accumulator.update(fn(x_batch, y_batch))
+
+        return {'mode': mode,
+                'num_samples': num_samples,
+                'stats': dict((name, accumulator.result())
+                              for name, (accumulator, _)
+                              in accumulators.items())}
+
+    def stats(self, mode='train', batch_size=1024, refresh=False):
+        """Gets summary statistics of a dataset, computing them if necessary.
+
+        The statistics are cached as JSON, named after the module's
+        configuration, so later calls with the same configuration just read
+        them back.
+
+        Args:
+            mode: str, 'train' or 'test'.
+            batch_size: int, the number of samples to process at a time.
+            refresh: bool, if set, recompute the statistics.
+
+        Returns:
+            dict, see `compute_stats`.
+        """
+
+        fname = 'stats-%s-%s.json' % (mode, self.get_params_hash())
+        fpath = self.get_cache_path(fname)
+        if refresh and os.path.exists(fpath):
+            os.remove(fpath)
+
+        def _build(tmp_path):
+            report = self.compute_stats(mode, batch_size=batch_size)
+            with open(tmp_path, 'w') as f:
+                json.dump(report, f)
+
+        with open(self.build_cached(fname, _build)) as f:
+            return json.load(f)
+
+    @staticmethod
+    def get_epoch_batches(num_samples,
+                          batch_size,
+                          epoch=0,
+                          randomize=True,
+                          seed=None,
+                          num_shards=1,
+                          shard_index=0,
+                          contiguous_shards=False):
+        """Gets the batch indices for one epoch of one shard.
+
+        With a seed, the permutation for an epoch only depends on the seed and
+        the epoch number, so workers that share a seed agree on it without
+        communicating. Every shard gets the same number of batches and no two
+        shards share a sample; samples left over are dropped.
+
+        Args:
+            num_samples: int, the number of samples in the dataset.
+            batch_size: int, the size of each batch.
+            epoch: int, the epoch number.
+            randomize: bool, whether to randomize the batch entries.
+            seed: int or None, the seed for the per-epoch permutations.
+            num_shards: int, the number of workers splitting the data.
+            shard_index: int, the worker for which to get batches.
+            contiguous_shards: bool, if set, each shard is a contiguous range
+                of samples, so that a worker only touches its part of
+                disk-backed arrays. Otherwise, batches of the whole dataset
+                are dealt out to the shards in turn.
+
+        Returns:
+            list of slices or Numpy integer arrays, one per batch.
+        """
+
+        if not 0 <= shard_index < num_shards:
+            raise ValueError('Invalid shard_index %d for %d shards'
+                             % (shard_index, num_shards))
+
+        if randomize and num_shards > 1 and seed is None:
+            raise ValueError('A seed must be provided when iterating over '
+                             'random shards, so that the shards agree on '
+                             'the order of the samples.')
+
+        if contiguous_shards:
+            shard_size = num_samples // num_shards
+            offset = shard_size * shard_index
+            num_batches = shard_size // batch_size
+            num_samples, num_shards, shard_index = shard_size, 1, 0
+        else:
+            offset = 0
+            num_batches = num_samples // (batch_size * num_shards)
+
+        if not randomize:
+            return [slice(offset + i * batch_size,
+                          offset + (i + 1) * batch_size)
+                    for i in range(shard_index, num_batches * num_shards,
+                                   num_shards)]
+
+        if seed is None:
+            idxs = np.random.permutation(num_samples)
+        else:
+            rng = np.random.RandomState((seed + epoch) % (2 ** 32))
+            idxs = rng.permutation(num_samples)
+
+        batches = []
+        for i in range(shard_index, num_batches * num_shards, num_shards):
+            idx = idxs[i * batch_size:(i + 1) * batch_size] + offset
+
+            # Reading disk-backed arrays in order is faster.
+            if contiguous_shards:
+                idx.sort()
+            batches.append(idx)
+
+        return batches
+
+    def _iterate_jobs(self, batch_size, mode, sampler=None, **kwargs):
+        """Yields (x_data, y_data, idx) for each batch, epoch after epoch.
+
+        Args:
+            batch_size: int, the size of each batch.
+            mode: str, 'train' or 'test'.
+            sampler: a Sampler from `_sampling.py`, or None to shuffle.
+            kwargs: passed on to `get_epoch_batches`.
+        """
+
+        epoch = 0
+        while True:
+            # Updates the data.
+            if mode == 'train':
+                x_data, y_data = self.train_data
+            else:
+                x_data, y_data = self.test_data
+
+            # Gets the number of samples.
+            num_samples = x_data[0].shape[0]
+
+            if sampler is not None:
+                if sampler.num_samples != num_samples:
+                    raise ValueError('The sampler is for %d samples, but '
+                                     'the dataset has %d'
+                                     % (sampler.num_samples, num_samples))
+
+                # Each shard draws from its own random stream; an epoch is
+                # as many batches as a shuffled epoch would have.
+                seed = kwargs.get('seed')
+                rng = np.random.RandomState(
+                    None if seed is None else
+                    [seed, epoch, kwargs.get('shard_index', 0)])
+                num_batches = num_samples // (batch_size *
+                                              kwargs.get('num_shards', 1))
+                if not num_batches:
+                    raise ValueError('There are not enough samples (%d) to '
+                                     'make batches of size %d for each shard.'
+                                     % (num_samples, batch_size))
+                for _ in range(num_batches):
+                    yield x_data, y_data, sampler.sample(batch_size, rng)
+                epoch += 1
+                continue
+
+            batches = self.get_epoch_batches(num_samples,
+                                             batch_size,
+                                             epoch=epoch,
+                                             **kwargs)
+
+            if not batches:
+                raise ValueError('There are not enough samples (%d) to make '
+                                 'batches of size %d for each shard.'
+                                 % (num_samples, batch_size))
+
+            for idx in batches:
+                yield x_data, y_data, idx
+
+            epoch += 1
+
+    def _apply_transform(self, x_batch, rng, training):
+        """Applies the module's transform to each input array of a batch."""
+
+        if self.transform is None:
+            return x_batch
+        return [self.transform(x, rng=rng, training=training) for x in x_batch]
+
     def iterate_data(self,
                      batch_size,
                      mode='train',
-                     randomize=True):
+                     randomize=True,
+                     seed=None,
+                     num_shards=1,
+                     shard_index=0,
+                     contiguous_shards=False,
+                     prefetch=None,
+                     num_workers=None,
+                     transform_in_workers=True,
+                     sampler=None):
         """Iterates the training data.
 
         Args:
             batch_size: int, the size of each batch.
             mode: str, 'train' or 'test'.
             randomize: bool, whether to randomize the batch entries.
+            seed: int or None, the seed for the per-epoch permutations and
+                the transforms. It must be set, and be the same for every
+                worker, if num_shards is more than 1.
+            num_shards: int, the number of workers splitting the data.
+            shard_index: int, which of the workers this is.
+            contiguous_shards: bool, if set, each worker only reads a
+                contiguous range of the samples (see `get_epoch_batches`).
+            prefetch: int, if positive, the number of batches each background
+                worker prepares ahead of time. Defaults to the
+                `prefetch_depth` setting.
+            num_workers: int, the number of background workers, if prefetch
+                is set. Defaults to the `num_workers` setting.
+            transform_in_workers: bool, if set, the module's transform is run
+                by the background workers rather than by the consumer.
+            sampler: a Sampler from `_sampling.py` (such as a
+                WeightedSampler or StratifiedSampler) which draws the samples
+                of each batch, or None for a uniform shuffle. If set,
+                randomize and contiguous_shards are ignored, and samples are
+                drawn with replacement.
 
         Yields:
             tuple of lists (x_data, y_data), where x_data and y_data are lists
@@ -214,27 +670,141 @@ class Module(object):
             raise ValueError('Invalid mode: "%s" (should be "train" or '
                              '"test")' % mode)
 
-        while True:
-            # Updates the data.
-            if mode == 'train':
-                x_data, y_data = self.train_data
-            else:
-                x_data, y_data = self.test_data
+        if prefetch is None:
+            prefetch = self.get_setting('prefetch_depth')
+        if num_workers is None:
+            num_workers = self.get_setting('num_workers')
+
+        training = mode == 'train'
+        jobs = self._iterate_jobs(batch_size,
+                                  mode,
+                                  randomize=randomize,
+                                  seed=seed,
+                                  num_shards=num_shards,
+                                  shard_index=shard_index,
+                                  contiguous_shards=contiguous_shards,
+                                  sampler=sampler)
+
+        # Each worker gets its own random number generator for transforms.
+        num_rngs = num_workers if prefetch else 1
+        rngs = [np.random.RandomState(None if seed is None else [seed, i])
+                for i in range(num_rngs)]
+
+        def _make_batch(job, worker_index=0, transform=True):
+            x_data, y_data, idx = job
+            x_batch = [x[idx] for x in x_data]
+            if transform:
+                x_batch = self._apply_transform(x_batch, rngs[worker_index],
+                                                training)
+            return x_batch, [y[idx] for y in y_data]
+
+        if not prefetch:
+            for job in jobs:
+                yield _make_batch(job)
+            return
+
+        make_batch = functools.partial(_make_batch,
+                                       transform=transform_in_workers)
+        for x_batch, y_batch in prefetch_batches(jobs,
+                                                 make_batch,
+                                                 depth=prefetch,
+                                                 num_workers=num_workers):
+            if not transform_in_workers:
+                x_batch = self._apply_transform(x_batch, rngs[0], training)
+            yield x_batch, y_batch
+
+
+    def export_data(self, mode='train', format='arrow', copy=False):
+        """Gets the data in a format other libraries read without copying.
+
+        With `copy=False`, the result shares memory with the module's arrays,
+        so changing one changes the other.
 
-            # Gets the number of samples.
-            num_samples = x_data[0].shape[0]
+        Args:
+            mode: str, 'train' or 'test'.
+            format: str, 'arrow' for a pyarrow.RecordBatch (needs pyarrow),
+                'dlpack' for DLPack capsules, or 'memoryview' for
+                buffer-protocol views.
+            copy: bool or None, False to never copy, and raise a ValueError
+                if the data can't be shared (for example, read-only
+                memory-mapped data can't be exported to DLPack), True to
+                always copy, or None to copy only when needed. See
+                `_export.py` for when data can't be shared.
 
-            if randomize:
-                idxs = np.arange(num_samples)
+        Returns:
+            a pyarrow.RecordBatch, with columns `x0`, ..., `y0`, ..., for
+                'arrow', otherwise a tuple of lists (x_data, y_data).
+        """
 
-            if randomize:
-                np.random.shuffle(idxs)
-                for i in range(batch_size, num_samples, batch_size):
-                    idx = idxs[i - batch_size:i]
-                    yield [x[idx] for x in x_data], [y[idx] for y in y_data]
-            else:
-                for i in range(batch_size, num_samples, batch_size):
-                    yield x_data[i - batch_size:i], y_data[i - batch_size:i]
+        if mode == 'train':
+            x_data, y_data = self.train_data
+        elif mode == 'test':
+            x_data, y_data = self.test_data
+        else:
+            raise ValueError('Invalid mode: "%s" (should be "train" or '
+                             '"test")' % mode)
+
+        return export_arrays(x_data, y_data, format, copy)
+
+    def iterate_export(self, batch_size, format='arrow', copy=False,
+                       **kwargs):
+        """Iterates the data, with each batch exported like `export_data`.
+
+        Batches are gathered into new arrays, so they can always be shared,
+        except boolean arrays in Arrow.
+
+        Args:
+            batch_size: int, the size of each batch.
+            format: str, the format (see `export_data`).
+            copy: bool or None, whether to copy the data (see `export_data`).
+            kwargs: passed on to `iterate_data`.
+
+        Yields:
+            pyarrow.RecordBatch objects, or tuples of lists (x_data, y_data).
+        """
+
+        for x_batch, y_batch in self.iterate_data(batch_size, **kwargs):
+            yield export_arrays(x_batch, y_batch, format, copy)
+
+    def aiterate_data(self, batch_size, executor=None, **kwargs):
+        """Asynchronous version of `iterate_data`, for asyncio event loops.
+
+        Usage:
+            async for x_batch, y_batch in module.aiterate_data(32):
+                ...
+
+        Args:
+            batch_size: int, the size of each batch.
+            executor: a concurrent.futures executor, or None for the event
+                loop's default one.
+            kwargs: passed on to `iterate_data`.
+
+        Returns:
+            an asynchronous iterator of (x_data, y_data) batches.
+        """
+
+        return AsyncIterator(self.iterate_data(batch_size, **kwargs),
+                             executor=executor)
+
+    def as_sequence(self, batch_size, **kwargs):
+        """Gets the batches as a random-access sequence.
+
+        Any batch of an epoch can be computed independently, so data loaders
+        with several workers, like Keras' `fit(..., workers=4,
+        use_multiprocessing=True)`, share the work without duplicating
+        batches. Call `on_epoch_end` to reshuffle.
+
+        Args:
+            batch_size: int, the size of each batch.
+            kwargs: passed on to `BatchSequence` (mode, randomize, seed,
+                num_shards, shard_index and contiguous_shards).
+
+        Returns:
+            a BatchSequence, which is also a `keras.utils.Sequence` if Keras
+                is installed.
+        """
+
+        return get_sequence_class()(self, batch_size, **kwargs)
 
 
 class TextModule(Module):
@@ -243,11 +813,26 @@ class TextModule(Module):
     This module should have its data as a string.
     """
 
-    def __init__(self, level='char', missing='?', end='|'):
+    def __init__(self, level='char', missing='?', end='|',
+                 reuse_buffers=False):
+        """Creates a TextModule object.
+
+        Args:
+            level: str, 'char' or 'word', the tokens to split strings into.
+            missing: str, what to decode unknown indices as.
+            end: str, the token with index 0.
+            reuse_buffers: bool, if set, one-hot encoded data is written into
+                the same arrays on every call to train_data or test_data, so
+                earlier results are overwritten.
+        """
+
         self.missing = missing
         self.end = end
+        self.reuse_buffers = reuse_buffers
+        self.level = level
         self._char_to_idx = {end: 0}
         self._idx_to_char = {0: end}
+        self._buffers = {}
 
         if level == 'char':
             self.serialize = None
@@ -275,6 +860,29 @@ class TextModule(Module):
         for token in string_list:
             self.update_dicts(token)
 
+    def update_dicts_with_corpus(self, corpus, chunk_size=1 << 20):
+        """Adds the tokens in a corpus to the look-up dictionaries.
+
+        The corpus is decoded one chunk at a time, so it never has to fit in
+        memory.
+
+        Args:
+            corpus: TextCorpus, the corpus to add.
+            chunk_size: int, the number of bytes to decode at a time.
+        """
+
+        tokens = set()
+        whole_words = self.serialize is not None
+        for chunk in corpus.iter_chunks(chunk_size, whole_words=whole_words):
+            if self.serialize is None:
+                tokens.update(chunk)
+            else:
+                tokens.update(self.serialize(chunk))
+
+        # Sorts the tokens so the indices don't depend on the chunk size.
+        for token in sorted(tokens):
+            self.update_dicts(token)
+
     def update_dicts(self, c):
         """Adds a character to the look-up dictionaries.
 
@@ -334,59 +942,284 @@ class TextModule(Module):
 
         return len(self._idx_to_char)
 
-    def encode(self, data, max_len, update_dicts=False, one_hot=False):
-        """Encodes a string or list of strings to a Numpy array.
+    def encode_indices(self, data, max_len, update_dicts=False):
+        """Encodes a list of strings to an array of look-up indices.
 
         Args:
-            data: string or list of strings, the data to encode.
-            max_len: int, maximum length of a string.
+            data: list of strings, the data to encode.
+            max_len: int, maximum length of a string, in tokens.
             update_dicts: bool, if set, updates the dictionary while encoding
                 the strings.
-            one_hot: bool, if set, return
 
         Returns:
-            arr: the Numpy array, with shape (max_len) if the data is a string
-                or (len(data), max_len) if the data is a list of strings.
+            tuple (indices, lengths), where indices is an integer Numpy array
+                with shape (len(data), max_len), padded with zeros, and
+                lengths holds the number of tokens in each row.
         """
 
-        if one_hot and update_dicts:
-            raise ValueError('one_hot and update_dicts cannot both be set.')
+        indices = np.zeros((len(data), max_len), dtype=np.int64)
+        lengths = np.zeros(len(data), dtype=np.int64)
 
-        if isinstance(data, (list, tuple)):
-            arr = np.stack([self.encode(string, max_len,
-                                        update_dicts=update_dicts,
-                                        one_hot=one_hot)
-                            for string in data])
-        elif isinstance(data, six.string_types):
+        for i, string in enumerate(data):
             if self.serialize is not None:
-                data = self.serialize(data)
+                string = self.serialize(string)
 
             if update_dicts:
-                new_chars = [c for c in data if c not in self._char_to_idx]
-                for c in new_chars:
-                    self.update_dicts(c)
+                for c in string:
+                    if c not in self._char_to_idx:
+                        self.update_dicts(c)
 
             try:
-                if one_hot:
-                    eye = np.eye(self.num_chars)
-                    arr = np.zeros(shape=(max_len, self.num_chars))
-                    data = np.asarray([eye[self._char_to_idx[c]] for c in data])
-                    arr[:len(data)] = data[:max_len]
-                else:
-                    arr = np.zeros(shape=(max_len,))
-                    data = np.asarray([self._char_to_idx[c] for c in data])
-                    arr[:len(data)] = data[:max_len]
-
+                idxs = [self._char_to_idx[c] for c in string[:max_len]]
             except KeyError:
                 raise KeyError('You tried to encode a character that wasn\'t '
                                'in the look-up dict. Setting update_dict=True '
                                'will update the look-up dict as the characters '
                                'are encoded.')
+            indices[i, :len(idxs)] = idxs
+            lengths[i] = len(idxs)
+
+        return indices, lengths
+
+    def one_hot(self, indices, lengths=None, out=None):
+        """Writes one-hot encodings of look-up indices into an array.
+
+        All the ones are written with a single vectorized scatter, so there
+        are no intermediate per-string arrays. Passing the same `out` buffer
+        for every batch avoids allocating a new one each time.
+
+        Args:
+            indices: integer Numpy array with shape (..., max_len).
+            lengths: integer Numpy array with shape (...), the number of
+                valid indices in each row; positions past the end are left as
+                zeros. If None, every position is valid.
+            out: Numpy array with shape (..., max_len, num_chars) to write
+                into, or None to allocate a new array of the `dtype` setting.
+
+        Returns:
+            out: the one-hot encoded array.
+        """
+
+        indices = np.asarray(indices)
+        shape = indices.shape + (self.num_chars,)
+
+        if out is None:
+            out = np.zeros(shape, dtype=self.get_setting('dtype'))
+        else:
+            if out.shape != shape or not out.flags.c_contiguous:
+                raise ValueError('The output buffer should be a contiguous '
+                                 'array with shape %s, got %s'
+                                 % (shape, out.shape))
+            out.fill(0)
+
+        # Linear offsets of the ones in the flattened output.
+        flat_idxs = (np.arange(indices.size) * self.num_chars +
+                     indices.reshape(-1))
+        if lengths is not None:
+            max_len = indices.shape[-1]
+            valid = np.arange(max_len) < np.expand_dims(lengths, -1)
+            flat_idxs = flat_idxs[valid.reshape(-1)]
+
+        out.reshape(-1)[flat_idxs] = 1
+        return out
+
+    def get_buffer(self, name, shape, dtype=None):
+        """Returns a reusable output array, if reuse_buffers is set.
+
+        Args:
+            name: str, what the buffer is for.
+            shape: tuple, the shape of the buffer.
+            dtype: Numpy dtype or None, the type of the buffer, or None for
+                the `dtype` setting.
+
+        Returns:
+            the buffer for this name, reallocated if the shape changed, or
+                None if buffers aren't reused.
+        """
+
+        if not self.reuse_buffers:
+            return None
+
+        dtype = np.dtype(dtype or self.get_setting('dtype'))
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.zeros(shape, dtype=dtype)
+            self._buffers[name] = buf
+        return buf
+
+    def indices_to_array(self, name, indices, lengths, one_hot):
+        """Converts encoded indices to the array a module returns.
+
+        Args:
+            name: str, the name of the buffer to write one-hot encodings into
+                if reuse_buffers is set.
+            indices: integer Numpy array, from `encode_indices`.
+            lengths: integer Numpy array, from `encode_indices`.
+            one_hot: bool, if set, return one-hot encodings.
+
+        Returns:
+            Numpy array of one-hot encodings or of indices, of the `dtype`
+                setting.
+        """
+
+        if one_hot:
+            out = self.get_buffer(name, indices.shape + (self.num_chars,))
+            return self.one_hot(indices, lengths, out=out)
         else:
+            return indices.astype(self.get_setting('dtype'))
+
+    def encode(self, data, max_len, update_dicts=False, one_hot=False,
+               out=None):
+        """Encodes a string or list of strings to a Numpy array.
+
+        Args:
+            data: string or list of strings, the data to encode.
+            max_len: int, maximum length of a string.
+            update_dicts: bool, if set, updates the dictionary while encoding
+                the strings.
+            one_hot: bool, if set, return one-hot encodings, with an extra
+                last dimension of size num_chars.
+            out: Numpy array or None, if one_hot is set, an output buffer to
+                write the encodings into (see `one_hot`).
+
+        Returns:
+            arr: the Numpy array, with shape (max_len) if the data is a string
+                or (len(data), max_len) if the data is a list of strings.
+        """
+
+        if one_hot and update_dicts:
+            raise ValueError('one_hot and update_dicts cannot both be set.')
+
+        if isinstance(data, six.string_types):
+            if out is not None:
+                out = out[None]
+            arr = self.encode([data], max_len, update_dicts=update_dicts,
+                              one_hot=one_hot, out=out)
+            return arr[0]
+
+        if not isinstance(data, (list, tuple)):
             raise ValueError('The data must be either a string or list of '
                              'strings. Got "%s"' % (data))
 
-        return arr
+        indices, lengths = self.encode_indices(data, max_len,
+                                               update_dicts=update_dicts)
+
+        if one_hot:
+            return self.one_hot(indices, lengths, out=out)
+        else:
+            return indices.astype(self.get_setting('dtype'))
+
+    @staticmethod
+    def _to_indices(batch):
+        """Gets look-up indices from a batch which may be one-hot encoded."""
+
+        batch = np.asarray(batch)
+        if batch.ndim == 3:
+            # Padding rows are all zeros, so they become the end token.
+            return batch.argmax(axis=-1)
+        return batch.astype(np.int64)
+
+    def _get_stats_accumulators(self, x_data, y_data):
+        """Counts the tokens and the lengths of the encoded strings.
+
+        Index 0 (the end token) pads the strings, so it isn't counted.
+        """
+
+        accumulators = {'token_counts': (
+            Histogram(),
+            lambda x, y: np.concatenate(
+                [i[i != 0] for i in map(self._to_indices, x + y)]))}
+
+        def _lengths(is_input, i):
+            def fn(x, y):
+                batch = self._to_indices((x if is_input else y)[i])
+                return (batch != 0).sum(axis=-1)
+            return fn
+
+        for i in range(len(x_data)):
+            accumulators['input_%d_lengths' % i] = (Histogram(),
+                                                    _lengths(True, i))
+        for i in range(len(y_data)):
+            accumulators['output_%d_lengths' % i] = (Histogram(),
+                                                     _lengths(False, i))
+        return accumulators
+
+    def get_index_dtype(self):
+        """Returns the smallest unsigned integer type that fits the indices."""
+
+        return np.min_scalar_type(max(self.num_chars - 1, 0))
+
+    def encode_text(self, text):
+        """Encodes a whole text to a flat array of look-up indices.
+
+        Unlike `encode`, the text isn't split into padded rows, so samples and
+        their targets can be gathered from the result with a single indexing
+        operation (see `get_index_windows`).
+
+        Args:
+            text: str, the text to encode. Every token should be in the
+                look-up dict.
+
+        Returns:
+            Numpy array with one index per token, of type `get_index_dtype`.
+        """
+
+        tokens = text if self.serialize is None else self.serialize(text)
+        return np.fromiter((self._char_to_idx[c] for c in tokens),
+                           dtype=self.get_index_dtype(),
+                           count=len(tokens))
+
+    def encode_corpus(self, corpus, fpath, chunk_size=1 << 20):
+        """Encodes a TextCorpus to a file of look-up indices.
+
+        The corpus is encoded one chunk at a time, so neither it nor its
+        encoding has to fit in memory. The file holds the raw indices, which
+        can be memory-mapped with `np.memmap(fpath, self.get_index_dtype())`.
+
+        Args:
+            corpus: TextCorpus, the corpus to encode. Every token should be in
+                the look-up dict (see `update_dicts_with_corpus`).
+            fpath: str, where to write the indices.
+            chunk_size: int, the number of bytes to decode at a time.
+        """
+
+        whole_words = self.serialize is not None
+        with open(fpath, 'wb') as f:
+            for chunk in corpus.iter_chunks(chunk_size,
+                                            whole_words=whole_words):
+                f.write(self.encode_text(chunk).tobytes())
+
+    @staticmethod
+    def get_index_windows(indices, window, num_samples, rng=None):
+        """Gathers windows of consecutive indices starting at random places.
+
+        Inputs and their targets are both slices of the same window, so they
+        are gathered together: next-token targets are the indices after the
+        sample, and shifted sequence targets are the window moved by one.
+
+        Args:
+            indices: 1D Numpy array (or memory-mapped array) of indices, from
+                `encode_text` or `encode_corpus`.
+            window: int, the number of consecutive indices in each sample.
+            num_samples: int, the number of windows to gather.
+            rng: Numpy RandomState or None, the random number generator.
+
+        Returns:
+            Numpy array with shape (num_samples, window).
+
+        Raises:
+            ValueError: if there are fewer than `window` indices.
+        """
+
+        if len(indices) < window:
+            raise ValueError('The text to draw samples from is too short. '
+                             'It is only %d tokens, but it should be at '
+                             'least %d tokens' % (len(indices), window))
+
+        if rng is None:
+            rng = np.random
+        starts = rng.randint(0, len(indices) - window + 1, size=num_samples)
+        return np.asarray(indices[starts[:, None] + np.arange(window)])
 
     @staticmethod
     def get_string_samples(string, sample_len, num_samples, include_next=False):
@@ -408,7 +1241,7 @@ class TextModule(Module):
         if len(string) < min_length:
             raise ValueError('The string to draw samples from is too short. '
                              'It is only %d characters, but it should be at '
-                             'least %d characters' (len(string), min_length))
+                             'least %d characters' % (len(string), min_length))
 
         idxs = np.random.choice(len(string) - sample_len, num_samples)
         x_data = [string[i:i + sample_len] for i in idxs]
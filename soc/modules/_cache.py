@@ -0,0 +1,210 @@
+"""_cache.py
+
+Defines a manager for the size of the data directory.
+
+Each module's subdirectory holds two kinds of files. Raw sources, like
+downloads and scraped data, live directly in the subdirectory and are pinned:
+they are never evicted, since they may be expensive or impossible to get
+again. Derived artifacts, which can be rebuilt from the raw sources, live in
+its `cache` directory. When the data directory grows past the `cache_budget`
+setting, the derived artifacts that were used least recently are evicted.
+
+Last-access times are recorded explicitly by `touch`, rather than relying on
+the filesystem, which may be mounted without access times.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import datetime
+import os
+import shutil
+import time
+
+import click
+
+from ._lock import ensure_dir, is_temp_path
+from ._settings import get_setting
+
+# Name of the subdirectory of each module holding derived artifacts.
+CACHE_SUBDIR = 'cache'
+
+# Subdirectories of the data directory which don't belong to a module.
+_IGNORED_SUBDIRS = ('shared',)
+
+CacheEntry = collections.namedtuple(
+    'CacheEntry', ['module_name', 'name', 'path', 'size', 'last_access',
+                   'pinned'])
+
+
+def get_cache_dir(module_subdir):
+    """Returns the directory for a module's derived artifacts.
+
+    Args:
+        module_subdir: str, the path to the module's data subdirectory.
+
+    Returns:
+        str, the path to the cache directory, which is created if necessary.
+    """
+
+    cache_dir = os.path.join(module_subdir, CACHE_SUBDIR)
+    ensure_dir(cache_dir)
+    return cache_dir
+
+
+def touch(path):
+    """Records that a file or directory was just used."""
+
+    os.utime(path, (time.time(), os.stat(path).st_mtime))
+
+
+def get_size(path):
+    """Returns the size of a file, or of all files in a directory, in bytes."""
+
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+
+    size = 0
+    for root, _, fnames in os.walk(path):
+        for fname in fnames:
+            fpath = os.path.join(root, fname)
+            if not os.path.islink(fpath):
+                size += os.path.getsize(fpath)
+    return size
+
+
+def _make_entry(module_name, path, pinned):
+    return CacheEntry(module_name=module_name,
+                      name=os.path.basename(path),
+                      path=path,
+                      size=get_size(path),
+                      last_access=os.stat(path).st_atime,
+                      pinned=pinned)
+
+
+def list_entries(module_name=None):
+    """Lists the raw sources and derived artifacts in the data directory.
+
+    Args:
+        module_name: str or None, if set, only list this module's files.
+
+    Returns:
+        list of CacheEntry tuples, least recently used first.
+    """
+
+    data_dir = get_setting('data_dir')
+    if module_name is None:
+        module_names = sorted(os.listdir(data_dir))
+    else:
+        module_names = [module_name]
+
+    entries = []
+    for name in module_names:
+        module_subdir = os.path.join(data_dir, name)
+        if name in _IGNORED_SUBDIRS or not os.path.isdir(module_subdir):
+            continue
+
+        # Lock files and files being written are left alone.
+        for fname in os.listdir(module_subdir):
+            if fname != CACHE_SUBDIR and not is_temp_path(fname):
+                fpath = os.path.join(module_subdir, fname)
+                entries.append(_make_entry(name, fpath, pinned=True))
+
+        cache_dir = os.path.join(module_subdir, CACHE_SUBDIR)
+        if os.path.isdir(cache_dir):
+            for fname in os.listdir(cache_dir):
+                if not is_temp_path(fname):
+                    fpath = os.path.join(cache_dir, fname)
+                    entries.append(_make_entry(name, fpath, pinned=False))
+
+    entries.sort(key=lambda e: e.last_access)
+    return entries
+
+
+def prune(budget=None, module_name=None, keep=(), dry_run=False):
+    """Evicts least recently used derived artifacts until under budget.
+
+    Args:
+        budget: int or None, the budget in bytes, or None to use the
+            `cache_budget` setting. Zero means there is no limit.
+        module_name: str or None, if set, only this module's files count
+            towards the budget and are evicted.
+        keep: collection of paths which should not be evicted, such as an
+            artifact which is about to be used.
+        dry_run: bool, if set, don't actually remove anything.
+
+    Returns:
+        list of the CacheEntry tuples which were evicted.
+    """
+
+    if budget is None:
+        budget = get_setting('cache_budget')
+    if not budget:
+        return []
+
+    entries = list_entries(module_name)
+    total_size = sum(e.size for e in entries)
+    keep = set(os.path.abspath(p) for p in keep)
+
+    evicted = []
+    for entry in entries:
+        if total_size <= budget:
+            break
+        if entry.pinned or os.path.abspath(entry.path) in keep:
+            continue
+
+        if not dry_run:
+            if os.path.isdir(entry.path):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            elif os.path.exists(entry.path):
+                os.remove(entry.path)
+        total_size -= entry.size
+        evicted.append(entry)
+
+    return evicted
+
+
+def format_size(size):
+    """Formats a number of bytes for people to read."""
+
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '%.1f %s' % (size, unit)
+        size /= 1024.
+    return '%.1f TB' % size
+
+
+@click.group()
+def cache():
+    """Data cache command-line interface."""
+
+
+@cache.command()
+@click.option('--module_name', default=None)
+def ls(module_name):
+    entries = list_entries(module_name)
+    for entry in entries:
+        last_access = datetime.datetime.fromtimestamp(entry.last_access)
+        click.echo('%-12s %-40s %10s  %s  %s'
+                   % (entry.module_name, entry.name, format_size(entry.size),
+                      last_access.strftime('%Y-%m-%d %H:%M'),
+                      'raw' if entry.pinned else 'derived'))
+
+    budget = get_setting('cache_budget')
+    click.echo('Total: %s (budget: %s)'
+               % (format_size(sum(e.size for e in entries)),
+                  format_size(budget) if budget else 'unlimited'))
+
+
+@cache.command('prune')
+@click.option('--budget', default=None, type=int)
+@click.option('--module_name', default=None)
+@click.option('--dry_run/--no_dry_run', default=False)
+def prune_cache(budget, module_name, dry_run):
+    evicted = prune(budget=budget, module_name=module_name, dry_run=dry_run)
+    for entry in evicted:
+        click.echo('%s %s/%s (%s)'
+                   % ('Would evict' if dry_run else 'Evicted',
+                      entry.module_name, entry.name,
+                      format_size(entry.size)))
+    click.echo('Freed %s' % format_size(sum(e.size for e in evicted)))
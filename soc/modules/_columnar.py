@@ -0,0 +1,269 @@
+"""_columnar.py
+
+Defines a compressed, column-oriented storage format for datasets.
+
+A table is a directory holding a `meta.json` file and two files per column:
+`<column>.data`, the column's rows compressed in blocks of `block_rows`, and
+`<column>.index.npy`, the byte offset of each compressed block. Text columns
+are stored as UTF-8 bytes with an array of offsets marking where each string
+starts; array columns are stored as raw fixed-size rows. Reading a column, or
+a few of its rows, only decompresses the blocks which hold those rows.
+
+Blocks are compressed with zstd or lz4 if they are installed, and with zlib
+otherwise. Unlike pickle, loading a table never runs code from the file.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import json
+import os
+import zlib
+
+import numpy as np
+import six
+
+FORMAT_VERSION = 1
+
+_META_FNAME = 'meta.json'
+
+
+def _get_codecs():
+    """Returns a dict mapping codec names to (compress, decompress)."""
+
+    codecs = {'zlib': (lambda b: zlib.compress(b, 1), zlib.decompress)}
+
+    try:
+        import zstandard
+        codecs['zstd'] = (zstandard.ZstdCompressor(level=3).compress,
+                          zstandard.ZstdDecompressor().decompress)
+    except ImportError:
+        pass
+
+    try:
+        import lz4.frame
+        codecs['lz4'] = (lz4.frame.compress, lz4.frame.decompress)
+    except ImportError:
+        pass
+
+    return codecs
+
+_codecs = _get_codecs()
+
+
+def get_default_codec():
+    """Returns the fastest codec which is installed."""
+
+    for name in ('zstd', 'lz4', 'zlib'):
+        if name in _codecs:
+            return name
+
+
+def _encode_text_block(strings):
+    """Packs strings into offsets followed by their UTF-8 bytes."""
+
+    encoded = [s.encode('utf-8') if isinstance(s, six.text_type) else s
+               for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum([len(s) for s in encoded], out=offsets[1:])
+    return offsets.tobytes() + b''.join(encoded)
+
+
+def _decode_text_block(data, num_rows):
+    """Unpacks a block made by `_encode_text_block`."""
+
+    header = 8 * (num_rows + 1)
+    offsets = np.frombuffer(data[:header], dtype='<i8')
+    body = data[header:]
+    return [body[offsets[i]:offsets[i + 1]].decode('utf-8')
+            for i in range(num_rows)]
+
+
+def write_table(path, columns, block_rows=4096, codec=None):
+    """Writes columns to a new table.
+
+    Args:
+        path: str, the directory to write the table to.
+        columns: dict (preferably ordered) mapping column names to either a
+            list of strings or a Numpy array whose first dimension is rows.
+        block_rows: int, the number of rows compressed together. Smaller
+            blocks make reading a few rows faster and compress worse.
+        codec: str or None, 'zstd', 'lz4' or 'zlib', or None to use the
+            fastest one installed.
+
+    Raises:
+        ValueError: if the columns have different numbers of rows.
+    """
+
+    codec = codec or get_default_codec()
+    if codec not in _codecs:
+        raise ValueError('Codec "%s" is not installed. Available codecs: %s'
+                         % (codec, ', '.join(sorted(_codecs))))
+    compress = _codecs[codec][0]
+
+    num_rows = set(len(c) for c in columns.values())
+    if len(num_rows) > 1:
+        raise ValueError('All columns should have the same number of rows, '
+                         'got %s' % dict((k, len(v))
+                                         for k, v in columns.items()))
+    num_rows = num_rows.pop() if num_rows else 0
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    meta = {'version': FORMAT_VERSION,
+            'num_rows': num_rows,
+            'block_rows': block_rows,
+            'codec': codec,
+            'columns': collections.OrderedDict()}
+
+    for name, values in columns.items():
+        if isinstance(values, np.ndarray):
+            values = np.ascontiguousarray(values)
+            meta['columns'][name] = {'kind': 'array',
+                                     'dtype': values.dtype.str,
+                                     'shape': list(values.shape[1:])}
+        else:
+            meta['columns'][name] = {'kind': 'text'}
+
+        block_offsets = [0]
+        with open(os.path.join(path, '%s.data' % name), 'wb') as f:
+            for start in range(0, num_rows, block_rows):
+                block = values[start:start + block_rows]
+                if isinstance(values, np.ndarray):
+                    raw = block.tobytes()
+                else:
+                    raw = _encode_text_block(block)
+                data = compress(raw)
+                f.write(data)
+                block_offsets.append(block_offsets[-1] + len(data))
+        np.save(os.path.join(path, '%s.index.npy' % name),
+                np.asarray(block_offsets, dtype='<i8'))
+
+    # The metadata is written last, so its presence marks a complete table.
+    with open(os.path.join(path, _META_FNAME), 'w') as f:
+        json.dump(meta, f, indent=4)
+
+
+class ColumnarTable(object):
+    """Reads a table written by `write_table`."""
+
+    def __init__(self, path):
+        """Opens a table.
+
+        Args:
+            path: str, the directory holding the table.
+
+        Raises:
+            IOError: if there isn't a complete table at the path.
+            ValueError: if the table was written with a codec which isn't
+                installed.
+        """
+
+        meta_path = os.path.join(path, _META_FNAME)
+        if not os.path.exists(meta_path):
+            raise IOError('No table found at "%s"' % path)
+
+        with open(meta_path) as f:
+            meta = json.load(f, object_pairs_hook=collections.OrderedDict)
+
+        if meta['codec'] not in _codecs:
+            raise ValueError('The table at "%s" was compressed with "%s", '
+                             'which is not installed.' % (path, meta['codec']))
+
+        self.path = path
+        self.num_rows = meta['num_rows']
+        self.block_rows = meta['block_rows']
+        self.columns = meta['columns']
+        self._decompress = _codecs[meta['codec']][1]
+        self._block_offsets = {}
+
+    def __len__(self):
+        return self.num_rows
+
+    @property
+    def column_names(self):
+        """Gets the names of the columns, in the order they were written."""
+
+        return list(self.columns.keys())
+
+    def _read_block(self, name, block):
+        """Decompresses one block of a column."""
+
+        if name not in self._block_offsets:
+            self._block_offsets[name] = np.load(
+                os.path.join(self.path, '%s.index.npy' % name))
+        offsets = self._block_offsets[name]
+
+        with open(os.path.join(self.path, '%s.data' % name), 'rb') as f:
+            f.seek(int(offsets[block]))
+            data = self._decompress(f.read(int(offsets[block + 1] -
+                                                offsets[block])))
+
+        num_rows = min(self.block_rows,
+                       self.num_rows - block * self.block_rows)
+        column = self.columns[name]
+        if column['kind'] == 'text':
+            return _decode_text_block(data, num_rows)
+        else:
+            shape = (num_rows,) + tuple(column['shape'])
+            return np.frombuffer(data, dtype=column['dtype']).reshape(shape)
+
+    def read_column(self, name, rows=None):
+        """Reads a column, or some rows of it.
+
+        Args:
+            name: str, the name of the column.
+            rows: None for all rows, a slice, or a list or Numpy array of row
+                indices.
+
+        Returns:
+            list of unicode strings for text columns, or a Numpy array.
+        """
+
+        if name not in self.columns:
+            raise KeyError('No column "%s". Columns: %s'
+                           % (name, ', '.join(self.column_names)))
+
+        if rows is None:
+            rows = slice(None)
+        if isinstance(rows, slice):
+            rows = np.arange(self.num_rows)[rows]
+        rows = np.asarray(rows, dtype=np.int64)
+
+        if rows.size and (rows.min() < 0 or rows.max() >= self.num_rows):
+            raise IndexError('Row indices should be in [0, %d)'
+                             % self.num_rows)
+
+        blocks = rows // self.block_rows
+        decoded = dict((b, self._read_block(name, b))
+                       for b in np.unique(blocks))
+        within = rows - blocks * self.block_rows
+
+        if self.columns[name]['kind'] == 'text':
+            return [decoded[b][i] for b, i in zip(blocks, within)]
+
+        column = self.columns[name]
+        out = np.empty((len(rows),) + tuple(column['shape']),
+                       dtype=column['dtype'])
+        for b, block in decoded.items():
+            mask = blocks == b
+            out[mask] = block[within[mask]]
+        return out
+
+    def read(self, columns=None, rows=None):
+        """Reads several columns.
+
+        Args:
+            columns: list of str or None, the columns to read, or None for
+                all of them.
+            rows: see `read_column`.
+
+        Returns:
+            OrderedDict mapping column names to their values.
+        """
+
+        if columns is None:
+            columns = self.column_names
+        return collections.OrderedDict((name, self.read_column(name, rows))
+                                       for name in columns)
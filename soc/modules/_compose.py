@@ -0,0 +1,267 @@
+"""_compose.py
+
+Defines modules which combine other modules, or in-memory arrays, into one
+dataset.
+
+The combined datasets are views (see `_views.py`) which map their rows to rows
+of the underlying datasets, so composing modules doesn't copy any data; rows
+are only gathered when a batch is read. Composed modules are modules
+themselves, so they can be iterated over, sharded and composed further.
+"""
+
+from __future__ import absolute_import
+
+import numpy as np
+
+from ._base import Module
+from ._views import ConcatArray, IndexedArray
+
+
+def _get_data(module, mode):
+    """Gets a module's (x_data, y_data) for 'train' or 'test'."""
+
+    if mode == 'train':
+        return module.train_data
+    elif mode == 'test':
+        return module.test_data
+    else:
+        raise ValueError('Invalid mode: "%s" (should be "train" or "test")'
+                         % mode)
+
+
+class ArrayModule(Module):
+    """Module whose data are arrays that are already in memory.
+
+    This is useful for zipping a dataset with auxiliary arrays.
+    """
+
+    def __init__(self, x_train, y_train, x_test=None, y_test=None):
+        """Creates an ArrayModule object.
+
+        Args:
+            x_train: list of Numpy arrays (or views), the training inputs.
+            y_train: list of Numpy arrays (or views), the training targets.
+            x_test: list of Numpy arrays or None, the testing inputs.
+            y_test: list of Numpy arrays or None, the testing targets.
+        """
+
+        self.validate_dataset(x_train, y_train)
+        self._train = (list(x_train), list(y_train))
+        self._test = (list(x_test or []), list(y_test or []))
+        super(ArrayModule, self).__init__()
+
+    @property
+    def train_data(self):
+        """Returns the training data."""
+
+        return self._train
+
+    @property
+    def test_data(self):
+        """Returns the testing data."""
+
+        if not self._test[0] and not self._test[1]:
+            raise ValueError('This module has no testing data.')
+        return self._test
+
+    @property
+    def input_shape(self):
+        """Gets the input shape as a list of tuples."""
+
+        return [tuple(x.shape[1:]) for x in self._train[0]]
+
+    @property
+    def output_shape(self):
+        """Gets the output shape as a list of tuples."""
+
+        return [tuple(y.shape[1:]) for y in self._train[1]]
+
+
+class ConcatModule(Module):
+    """Concatenates the samples of modules with the same shapes.
+
+    For example, two AskReddit dumps with the same maximum lengths.
+    """
+
+    def __init__(self, modules):
+        """Creates a ConcatModule object.
+
+        Args:
+            modules: list of modules, whose input and output shapes are the
+                same.
+
+        Raises:
+            ValueError: if the modules' shapes are different.
+        """
+
+        if not modules:
+            raise ValueError('There should be at least one module.')
+
+        shapes = set(str(m.shape) for m in modules)
+        if len(shapes) > 1:
+            raise ValueError('Can only concatenate modules with the same '
+                             'shapes, got %s' % [m.shape for m in modules])
+
+        self.modules = list(modules)
+        super(ConcatModule, self).__init__()
+
+    def _concat(self, mode):
+        data = [_get_data(m, mode) for m in self.modules]
+        x_data = [ConcatArray([d[0][i] for d in data])
+                  for i in range(len(data[0][0]))]
+        y_data = [ConcatArray([d[1][i] for d in data])
+                  for i in range(len(data[0][1]))]
+        return x_data, y_data
+
+    @property
+    def train_data(self):
+        """Returns the concatenated training data."""
+
+        return self._concat('train')
+
+    @property
+    def test_data(self):
+        """Returns the concatenated testing data."""
+
+        return self._concat('test')
+
+    @property
+    def input_shape(self):
+        """Gets the input shape as a list of tuples."""
+
+        return self.modules[0].input_shape
+
+    @property
+    def output_shape(self):
+        """Gets the output shape as a list of tuples."""
+
+        return self.modules[0].output_shape
+
+
+class ZipModule(Module):
+    """Puts the inputs and outputs of modules side by side.
+
+    The i-th sample of the zipped module has the inputs of the i-th sample
+    of each module, followed by their outputs, so the modules should have
+    the same number of samples.
+    """
+
+    def __init__(self, modules):
+        """Creates a ZipModule object.
+
+        Args:
+            modules: list of modules, for example an MNIST module and an
+                ArrayModule with auxiliary inputs.
+        """
+
+        if not modules:
+            raise ValueError('There should be at least one module.')
+
+        self.modules = list(modules)
+        super(ZipModule, self).__init__()
+
+    def _zip(self, mode):
+        x_data, y_data = [], []
+        for module in self.modules:
+            module_x, module_y = _get_data(module, mode)
+            x_data.extend(module_x)
+            y_data.extend(module_y)
+
+        num_samples = set(len(a) for a in x_data + y_data)
+        if len(num_samples) > 1:
+            raise ValueError('Can only zip modules with the same number of '
+                             '%s samples, got %s'
+                             % (mode, sorted(num_samples)))
+        return x_data, y_data
+
+    @property
+    def train_data(self):
+        """Returns the zipped training data."""
+
+        return self._zip('train')
+
+    @property
+    def test_data(self):
+        """Returns the zipped testing data."""
+
+        return self._zip('test')
+
+    @property
+    def input_shape(self):
+        """Gets the input shape as a list of tuples."""
+
+        return sum((m.input_shape for m in self.modules), [])
+
+    @property
+    def output_shape(self):
+        """Gets the output shape as a list of tuples."""
+
+        return sum((m.output_shape for m in self.modules), [])
+
+
+class InterleaveModule(ConcatModule):
+    """Mixes the samples of modules with the same shapes, by weight.
+
+    Each sample of the mixture comes from a module drawn with probability
+    proportional to its weight, and each module's samples are used in order,
+    starting over when they run out. The mixture only depends on the seed.
+    """
+
+    def __init__(self, modules, weights=None, num_samples=None, seed=0):
+        """Creates an InterleaveModule object.
+
+        Args:
+            modules: list of modules, whose input and output shapes are the
+                same.
+            weights: list of non-negative floats or None, the sampling weight
+                of each module, or None to weight them equally.
+            num_samples: int or None, the number of samples in the mixture,
+                or None for the total number of samples of the modules.
+            seed: int, the seed for drawing modules.
+        """
+
+        super(InterleaveModule, self).__init__(modules)
+
+        if weights is None:
+            weights = [1.] * len(modules)
+        weights = np.asarray(weights, dtype=np.float64)
+        if (weights.shape != (len(modules),) or (weights < 0).any() or
+                not weights.sum()):
+            raise ValueError('Expected one non-negative weight per module, '
+                             'with a positive total, got %s' % list(weights))
+
+        self.weights = weights / weights.sum()
+        self.num_samples = num_samples
+        self.seed = seed
+
+    def _get_indices(self, lengths):
+        """Maps each sample of the mixture to a concatenated sample."""
+
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if (lengths[self.weights > 0] == 0).any():
+            raise ValueError('A module with a positive weight has no samples.')
+
+        num_samples = self.num_samples
+        if num_samples is None:
+            num_samples = int(lengths.sum())
+
+        rng = np.random.RandomState(self.seed)
+        sources = rng.choice(len(lengths), size=num_samples, p=self.weights)
+
+        # The n-th draw of a module maps to its (n % length)-th sample.
+        order = np.argsort(sources, kind='mergesort')
+        counts = np.bincount(sources, minlength=len(lengths))
+        starts = np.cumsum(counts) - counts
+        draw_idx = np.empty(num_samples, dtype=np.int64)
+        draw_idx[order] = np.arange(num_samples) - np.repeat(starts, counts)
+
+        offsets = np.cumsum(lengths) - lengths
+        safe_lengths = np.maximum(lengths, 1)
+        return offsets[sources] + draw_idx % safe_lengths[sources]
+
+    def _concat(self, mode):
+        x_data, y_data = super(InterleaveModule, self)._concat(mode)
+        lengths = [len(a) for a in (x_data or y_data)[0].arrays]
+        indices = self._get_indices(lengths)
+        return ([IndexedArray(x, indices) for x in x_data],
+                [IndexedArray(y, indices) for y in y_data])
@@ -0,0 +1,188 @@
+"""_corpus.py
+
+Defines a reader for text corpora which are too big to load into memory.
+
+The file is memory-mapped, so only the parts which are read are paged in.
+The vocabulary is built by decoding the file in chunks, and samples are read
+from random byte offsets, which are moved forward to the start of the next
+UTF-8 character so that a multi-byte character is never split.
+"""
+
+from __future__ import absolute_import
+
+import codecs
+import mmap
+import os
+
+import numpy as np
+
+# The most bytes a single UTF-8 character can take.
+_MAX_CHAR_BYTES = 4
+
+# How many times to redraw samples which ran into the end of the corpus.
+_MAX_RETRIES = 100
+
+
+def _is_continuation(byte):
+    """Returns True if a UTF-8 byte is in the middle of a character."""
+
+    return byte & 0xC0 == 0x80
+
+
+class TextCorpus(object):
+    """A memory-mapped, UTF-8 encoded text file, or a byte range of one."""
+
+    def __init__(self, fpath, start=0, end=None, encoding='utf-8'):
+        """Creates a TextCorpus object.
+
+        Args:
+            fpath: str, the path to the text file.
+            start: int, the byte offset where the corpus starts.
+            end: int or None, the byte offset where the corpus ends, or None
+                for the end of the file.
+            encoding: str, the encoding of the file. Sampling from random
+                offsets assumes that it is UTF-8 (or ASCII).
+        """
+
+        self.fpath = fpath
+        self.encoding = encoding
+
+        with open(fpath, 'rb') as f:
+            fsize = os.fstat(f.fileno()).st_size
+            self._mmap = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                          if fsize else b'')
+
+        self.end = fsize if end is None else min(end, fsize)
+        self.start = self._align(start)
+
+    def __len__(self):
+        """Returns the length of the corpus in bytes."""
+
+        return max(self.end - self.start, 0)
+
+    def _byte(self, offset):
+        return bytearray(self._mmap[offset:offset + 1])[0]
+
+    def _align(self, offset):
+        """Moves an offset forward to the start of a character."""
+
+        while offset < self.end and _is_continuation(self._byte(offset)):
+            offset += 1
+        return offset
+
+    def split(self, offset):
+        """Splits the corpus in two at a byte offset from its start.
+
+        Args:
+            offset: int, the number of bytes in the first part.
+
+        Returns:
+            tuple of TextCorpus objects (first, second).
+        """
+
+        cut = self._align(self.start + offset)
+        return (TextCorpus(self.fpath, self.start, cut, self.encoding),
+                TextCorpus(self.fpath, cut, self.end, self.encoding))
+
+    def iter_chunks(self, chunk_size=1 << 20, whole_words=False):
+        """Decodes the corpus one chunk at a time.
+
+        Args:
+            chunk_size: int, the number of bytes to decode at a time.
+            whole_words: bool, if set, chunks are only split on whitespace,
+                so that no word is split between two chunks.
+
+        Yields:
+            unicode strings, consecutive pieces of the corpus.
+        """
+
+        decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+        carry = u''
+        for offset in range(self.start, self.end, chunk_size):
+            stop = min(offset + chunk_size, self.end)
+            text = carry + decoder.decode(self._mmap[offset:stop],
+                                          final=stop == self.end)
+            carry = u''
+
+            if whole_words and stop < self.end:
+                cut = max(text.rfind(u' '), text.rfind(u'\n'))
+                text, carry = text[:cut + 1], text[cut + 1:]
+
+            if text:
+                yield text
+
+        if carry:
+            yield carry
+
+    def read(self, offset, num_chars):
+        """Reads characters from a byte offset, without decoding the corpus.
+
+        Args:
+            offset: int, the byte offset to start at, from the start of the
+                file. It must be the start of a character.
+            num_chars: int, the number of characters to read.
+
+        Returns:
+            unicode string, which is shorter than num_chars if the corpus
+                ends first.
+        """
+
+        stop = min(offset + num_chars * _MAX_CHAR_BYTES, self.end)
+        data = self._mmap[offset:stop]
+
+        # Drops a character which was cut off by the end of the window.
+        decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+        return decoder.decode(data, final=stop == self.end)[:num_chars]
+
+    def sample(self, sample_len, num_samples, include_next=False, rng=None):
+        """Draws substrings starting at random places in the corpus.
+
+        Args:
+            sample_len: int, the number of characters in each sample.
+            num_samples: int, the number of samples to draw.
+            include_next: bool, if set, also return the character after each
+                sample.
+            rng: Numpy RandomState or None, the random number generator.
+
+        Returns:
+            (x_data, y_data) if include_next, otherwise just x_data, where
+                each is a list of unicode strings.
+        """
+
+        if rng is None:
+            rng = np.random
+        window = sample_len + (1 if include_next else 0)
+
+        if len(self) < window:
+            raise ValueError('The corpus is too short. It is only %d bytes, '
+                             'but it should be at least %d bytes'
+                             % (len(self), window))
+
+        # Samples near the end can come up short if they have multi-byte
+        # characters; those are drawn again.
+        samples = [None] * num_samples
+        missing = list(range(num_samples))
+        for _ in range(_MAX_RETRIES):
+            if not missing:
+                break
+            offsets = rng.randint(self.start, self.end - window + 1,
+                                  size=len(missing))
+            retry = []
+            for i, offset in zip(missing, offsets):
+                text = self.read(self._align(int(offset)), window)
+                if len(text) == window:
+                    samples[i] = text
+                else:
+                    retry.append(i)
+            missing = retry
+
+        if missing:
+            raise ValueError('Could not draw samples of %d characters from '
+                             'the corpus; it is too short.' % window)
+
+        x_data = [s[:sample_len] for s in samples]
+        if include_next:
+            y_data = [s[sample_len:] for s in samples]
+            return x_data, y_data
+        else:
+            return x_data
@@ -0,0 +1,275 @@
+"""_dedup.py
+
+Defines a streaming filter which drops duplicate and near-duplicate texts.
+
+Exact duplicates are found by hashing each text. Near-duplicates are found
+with MinHash and locality-sensitive hashing (LSH): each text is split into
+overlapping byte shingles, and its signature is the minimum of several
+random hashes of the shingles. The chance that two texts agree on one
+element of their signatures is the Jaccard similarity of their shingles.
+The signature is cut into bands, and two texts whose signatures agree on a
+whole band are near-duplicates.
+
+Rather than keeping every hash it has seen, the filter sets bits in
+fixed-size Bloom filters, so its memory doesn't grow with the number of
+texts. The price is a small chance of dropping a text which isn't a
+duplicate, which is kept below `error_rate` as long as no more than
+`capacity` texts are seen. Texts are processed in chunks, with vectorized
+Numpy operations.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import math
+import re
+
+import numpy as np
+import six
+
+# The number of bytes in a shingle; up to 8 bytes are packed into an integer.
+_SHINGLE_BYTES = 5
+
+# Constants mixing integers into 64-bit hashes (from splitmix64).
+_MIX_1 = np.uint64(0xbf58476d1ce4e5b9)
+_MIX_2 = np.uint64(0x94d049bb133111eb)
+
+_WHITESPACE_REGEX = re.compile(r'\s+', re.UNICODE)
+
+
+def _mix(keys):
+    """Scrambles an array of uint64 keys (splitmix64's finalizer)."""
+
+    keys = keys ^ (keys >> np.uint64(30))
+    keys = keys * _MIX_1
+    keys = keys ^ (keys >> np.uint64(27))
+    keys = keys * _MIX_2
+    return keys ^ (keys >> np.uint64(31))
+
+
+def _hash_texts(texts):
+    """Hashes each text's UTF-8 bytes into a uint64."""
+
+    digests = b''.join(hashlib.md5(t.encode('utf-8')).digest()[:8]
+                       for t in texts)
+    return np.frombuffer(digests, dtype='<u8').astype(np.uint64)
+
+
+def _get_shingles(texts):
+    """Gets the overlapping byte shingles of some texts.
+
+    Texts are lowercased and their whitespace collapsed first, so changes
+    in case or spacing don't count as differences.
+
+    Returns:
+        tuple of Numpy arrays (shingles, starts): the uint64 shingles of all
+            the texts, and the position of each text's first shingle. Each
+            text has at least one shingle.
+    """
+
+    shingles, starts = [], []
+    num_shingles = 0
+    for text in texts:
+        text = _WHITESPACE_REGEX.sub(' ', text.lower()).strip()
+        data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+        if len(data) < _SHINGLE_BYTES:
+            data = np.concatenate([data, np.zeros(_SHINGLE_BYTES - len(data),
+                                                  dtype=np.uint8)])
+
+        # Packs each run of bytes into one integer.
+        num = len(data) - _SHINGLE_BYTES + 1
+        packed = np.zeros(num, dtype=np.uint64)
+        for i in range(_SHINGLE_BYTES):
+            packed = (packed << np.uint64(8)) | data[i:i + num]
+
+        shingles.append(packed)
+        starts.append(num_shingles)
+        num_shingles += num
+
+    return np.concatenate(shingles), np.asarray(starts, dtype=np.int64)
+
+
+class _BloomFilter(object):
+    """A fixed-size set of uint64 keys, with false positives."""
+
+    def __init__(self, capacity, error_rate):
+        """Sizes the filter to hold `capacity` keys at the error rate."""
+
+        num_bits = -capacity * math.log(error_rate) / math.log(2) ** 2
+        self.num_bits = max(int(math.ceil(num_bits / 8.)) * 8, 64)
+        self.num_hashes = max(int(round(
+            self.num_bits / float(capacity) * math.log(2))), 1)
+        self.bits = np.zeros(self.num_bits // 8, dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def _positions(self, keys):
+        """Gets the bits of each key, with double hashing."""
+
+        h1 = _mix(keys)
+        h2 = _mix(h1) | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return ((h1[:, None] + steps * h2[:, None]) %
+                np.uint64(self.num_bits)).astype(np.int64)
+
+    def contains(self, keys):
+        """Returns a boolean array, true for keys which were (probably) added.
+        """
+
+        positions = self._positions(keys)
+        bits = (self.bits[positions >> 3] >> (positions & 7)) & 1
+        return bits.all(axis=1)
+
+    def add(self, keys):
+        """Adds an array of keys."""
+
+        positions = self._positions(keys).reshape(-1)
+        np.bitwise_or.at(self.bits, positions >> 3,
+                         (1 << (positions & 7)).astype(np.uint8))
+
+
+class Deduplicator(object):
+    """Drops texts which repeat, or nearly repeat, texts seen before."""
+
+    def __init__(self,
+                 num_perm=64,
+                 num_bands=8,
+                 capacity=1000000,
+                 error_rate=1e-4,
+                 near=True,
+                 seed=0):
+        """Creates a Deduplicator object.
+
+        Two texts whose shingles have Jaccard similarity `s` are matched with
+        probability `1 - (1 - s ** r) ** num_bands`, where `r` is
+        `num_perm / num_bands`. With the defaults, this is 50% at `s = 0.77`
+        and over 95% at `s = 0.88`.
+
+        Args:
+            num_perm: int, the length of the MinHash signatures.
+            num_bands: int, the number of LSH bands, which should divide
+                num_perm. More bands match less similar texts.
+            capacity: int, the number of texts the filters are sized for.
+            error_rate: float, the chance of dropping a new text which isn't
+                a duplicate, until `capacity` texts have been seen.
+            near: bool, whether to drop near-duplicates, or only exact ones.
+            seed: int, the seed for the MinHash permutations.
+
+        Raises:
+            ValueError: if num_bands doesn't divide num_perm.
+        """
+
+        if num_perm % num_bands:
+            raise ValueError('The number of bands (%d) should divide the '
+                             'signature length (%d)' % (num_bands, num_perm))
+
+        # Multiply-shift hashing needs odd 64-bit multipliers.
+        rng = np.random.RandomState(seed)
+        high, low, self._b = rng.randint(2 ** 32, size=(3, num_perm),
+                                         dtype=np.int64).astype(np.uint64)
+        self._a = (high << np.uint64(32)) | low | np.uint64(1)
+
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.near = near
+        self._exact = _BloomFilter(capacity, error_rate)
+        self._bands = (_BloomFilter(capacity * num_bands, error_rate)
+                       if near else None)
+
+        self.num_seen = 0
+        self.num_exact = 0
+        self.num_near = 0
+
+    @property
+    def num_dropped(self):
+        """The number of texts dropped so far."""
+
+        return self.num_exact + self.num_near
+
+    @property
+    def nbytes(self):
+        """The memory used by the filters, in bytes."""
+
+        return self._exact.nbytes + (self._bands.nbytes if self.near else 0)
+
+    def signatures(self, texts):
+        """Computes the MinHash signatures of some texts.
+
+        Args:
+            texts: list of str, the texts.
+
+        Returns:
+            uint32 Numpy array with shape (len(texts), num_perm).
+        """
+
+        shingles, starts = _get_shingles(texts)
+        shingles = _mix(shingles)
+
+        # Multiply-shift hashing: the top bits of a * x + b, modulo 2 ** 64.
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for i in range(self.num_perm):
+            hashes = (self._a[i] * shingles + self._b[i]) >> np.uint64(32)
+            signatures[:, i] = np.minimum.reduceat(hashes, starts)
+        return signatures
+
+    def _band_keys(self, signatures):
+        """Hashes each band of each signature into a uint64 key."""
+
+        rows = self.num_perm // self.num_bands
+        bands = signatures.reshape(len(signatures), self.num_bands, rows)
+        keys = np.broadcast_to(np.arange(self.num_bands, dtype=np.uint64),
+                               bands.shape[:2])
+        for i in range(rows):
+            keys = _mix(keys ^ bands[:, :, i].astype(np.uint64))
+        return keys
+
+    @staticmethod
+    def _find_repeats(keys, seen):
+        """Marks the keys which were seen before, or earlier in the array."""
+
+        flat = keys.reshape(-1)
+        _, first, inverse = np.unique(flat, return_index=True,
+                                      return_inverse=True)
+        repeats = (first[inverse.reshape(-1)] != np.arange(len(flat)))
+        repeats |= seen.contains(flat)
+        seen.add(flat)
+        return repeats.reshape(keys.shape)
+
+    def keep(self, texts):
+        """Filters a chunk of texts.
+
+        A text is dropped if it duplicates, or nearly duplicates, any text
+        passed in before it, including texts which were dropped themselves.
+
+        Args:
+            texts: list of str, the texts, in order.
+
+        Returns:
+            boolean Numpy array, true for the texts to keep.
+        """
+
+        if not len(texts):
+            return np.zeros((0,), dtype=np.bool_)
+        texts = [t if isinstance(t, six.text_type) else t.decode('utf-8')
+                 for t in texts]
+
+        exact = self._find_repeats(_hash_texts(texts), self._exact)
+        if self.near:
+            keys = self._band_keys(self.signatures(texts))
+            near = self._find_repeats(keys, self._bands).any(axis=1) & ~exact
+        else:
+            near = np.zeros_like(exact)
+
+        self.num_seen += len(texts)
+        self.num_exact += int(exact.sum())
+        self.num_near += int(near.sum())
+        return ~(exact | near)
+
+    def summary(self):
+        """Describes how many texts were dropped, to print."""
+
+        return ('Dropped %d of %d records (%d exact duplicates, %d near '
+                'duplicates)' % (self.num_dropped, self.num_seen,
+                                 self.num_exact, self.num_near))
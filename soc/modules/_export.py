@@ -0,0 +1,204 @@
+"""_export.py
+
+Defines conversions of Numpy arrays to formats other libraries read without
+copying: buffer-protocol memoryviews, DLPack capsules (for PyTorch, JAX and
+TensorFlow) and Arrow record batches (for pandas and Arrow-based tools).
+
+Every conversion takes a `copy` flag, following `np.array`'s: False never
+copies, and raises a ValueError if the data can't be shared; True always
+copies; None only copies when sharing is impossible. Sharing is impossible
+for lazy views (from `_views.py`), which don't have a buffer of their own,
+and in these cases:
+
+- DLPack: read-only arrays, like memory-mapped caches, if Numpy can't mark
+  them as read-only in the capsule.
+- Arrow: boolean arrays (Arrow packs them into bits), arrays which aren't
+  C-contiguous, and arrays whose byte order isn't the machine's.
+
+Arrow support needs pyarrow, which is optional.
+"""
+
+from __future__ import absolute_import
+
+import collections
+
+import numpy as np
+
+FORMATS = ('memoryview', 'dlpack', 'arrow')
+
+
+def _as_array(arr, copy, reason=None):
+    """Gets a Numpy array for an array or view, honouring the copy flag.
+
+    Args:
+        arr: Numpy array or view.
+        copy: bool or None, see the module docstring.
+        reason: str or None, why arr can't be shared as it is, or None if it
+            can.
+
+    Returns:
+        Numpy array, either arr itself or a C-contiguous copy.
+
+    Raises:
+        ValueError: if arr has to be copied, but copy is False.
+    """
+
+    if reason is None and not isinstance(arr, np.ndarray):
+        reason = 'it is a lazy %s, not an array' % type(arr).__name__
+
+    if copy:
+        return np.array(arr, order='C', copy=True)
+    elif reason is None:
+        return arr
+    elif copy is None:
+        return np.array(arr, order='C', copy=True)
+    else:
+        raise ValueError('Can\'t share the data without copying, because %s. '
+                         'Pass copy=None to copy it only when needed, or '
+                         'copy=True to always copy it.' % reason)
+
+
+def to_memoryview(arr, copy=False):
+    """Gets a buffer-protocol view of an array.
+
+    Args:
+        arr: Numpy array or view.
+        copy: bool or None, whether to copy the data.
+
+    Returns:
+        memoryview with the array's shape, strides and format.
+    """
+
+    return memoryview(_as_array(arr, copy))
+
+
+def to_dlpack(arr, copy=False):
+    """Gets a DLPack capsule of an array.
+
+    A capsule can only be consumed once, for example by
+    `torch.utils.dlpack.from_dlpack` or `jax.dlpack.from_dlpack`.
+
+    Args:
+        arr: Numpy array or view.
+        copy: bool or None, whether to copy the data.
+
+    Returns:
+        PyCapsule holding a DLPack tensor.
+
+    Raises:
+        RuntimeError: if the installed Numpy (before 1.22) can't export
+            DLPack.
+    """
+
+    if not hasattr(np.ndarray, '__dlpack__'):
+        raise RuntimeError('Exporting DLPack needs Numpy 1.22 or later; '
+                           'found %s.' % np.__version__)
+
+    arr = _as_array(arr, copy)
+    try:
+        return arr.__dlpack__()
+    except BufferError as e:
+        return _as_array(arr, copy, reason=str(e)).__dlpack__()
+
+
+def _get_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Exporting to Arrow needs pyarrow. Install it with '
+                          '"pip install pyarrow".')
+    return pyarrow
+
+
+def to_arrow_array(arr, copy=False):
+    """Gets an Arrow array sharing an array's buffer.
+
+    The first dimension becomes the rows. Any further dimensions are nested
+    fixed-size lists, innermost last.
+
+    Args:
+        arr: Numpy array or view.
+        copy: bool or None, whether to copy the data.
+
+    Returns:
+        pyarrow.Array with len(arr) rows.
+    """
+
+    pa = _get_pyarrow()
+
+    reason = None
+    dtype = getattr(arr, 'dtype', None)
+    if dtype == np.bool_:
+        reason = 'Arrow stores booleans as bits'
+    elif dtype is not None and not dtype.isnative:
+        reason = 'its byte order isn\'t the machine\'s'
+    elif isinstance(arr, np.ndarray) and not arr.flags.c_contiguous:
+        reason = 'it isn\'t C-contiguous'
+
+    arr = _as_array(arr, copy, reason)
+    if arr.dtype == np.bool_:
+        values = pa.array(arr.reshape(-1))
+    else:
+        values = pa.Array.from_buffers(pa.from_numpy_dtype(arr.dtype),
+                                       arr.size, [None, pa.py_buffer(arr)])
+
+    # Groups the flat values into rows, from the innermost dimension out.
+    for size in reversed(arr.shape[1:]):
+        values = pa.FixedSizeListArray.from_arrays(values, size)
+    return values
+
+
+def to_record_batch(x_data, y_data, copy=False):
+    """Gets an Arrow record batch of a dataset, with one column per array.
+
+    The columns are named `x0`, `x1`, ... for the inputs and `y0`, `y1`, ...
+    for the outputs.
+
+    Args:
+        x_data: list of Numpy arrays or views, the inputs.
+        y_data: list of Numpy arrays or views, the outputs.
+        copy: bool or None, whether to copy the data.
+
+    Returns:
+        pyarrow.RecordBatch.
+    """
+
+    pa = _get_pyarrow()
+    columns = collections.OrderedDict()
+    for prefix, arrays in (('x', x_data), ('y', y_data)):
+        for i, arr in enumerate(arrays):
+            columns['%s%d' % (prefix, i)] = to_arrow_array(arr, copy)
+    return pa.RecordBatch.from_arrays(list(columns.values()),
+                                      list(columns.keys()))
+
+
+def export_arrays(x_data, y_data, format, copy=False):
+    """Converts a dataset or batch to another format.
+
+    Args:
+        x_data: list of Numpy arrays or views, the inputs.
+        y_data: list of Numpy arrays or views, the outputs.
+        format: str, one of 'memoryview', 'dlpack' or 'arrow'.
+        copy: bool or None, whether to copy the data.
+
+    Returns:
+        a pyarrow.RecordBatch for 'arrow', otherwise a tuple of lists
+            (x_data, y_data) of memoryviews or DLPack capsules.
+
+    Raises:
+        ValueError: if the format is invalid, or the data can't be shared
+            and copy is False.
+    """
+
+    if format == 'arrow':
+        return to_record_batch(x_data, y_data, copy)
+    elif format == 'memoryview':
+        convert = to_memoryview
+    elif format == 'dlpack':
+        convert = to_dlpack
+    else:
+        raise ValueError('Invalid format: "%s" (should be one of %s)'
+                         % (format, ', '.join(FORMATS)))
+
+    return ([convert(x, copy) for x in x_data],
+            [convert(y, copy) for y in y_data])
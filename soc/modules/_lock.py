@@ -0,0 +1,125 @@
+"""_lock.py
+
+Defines inter-process file locks, so that parallel jobs on the same machine
+don't download or build the same file at the same time, and helpers for
+writing files atomically.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows.
+    fcntl = None
+
+# Extension added to a path to get the path of its lock file.
+LOCK_EXT = '.lock'
+
+
+def get_temp_path(path):
+    """Returns a path, private to this process, to build a file in.
+
+    Once the file is complete it should be renamed to `path`, so that other
+    processes never see it partially written.
+    """
+
+    return '%s.tmp-%d' % (path, os.getpid())
+
+
+def is_temp_path(path):
+    """Returns True if the path is a lock file or a partially written file."""
+
+    return path.endswith(LOCK_EXT) or '.tmp-' in os.path.basename(path)
+
+
+def ensure_dir(path):
+    """Creates a directory if it doesn't exist, even if racing with others."""
+
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+class FileLock(object):
+    """An exclusive lock held on a file, shared between processes.
+
+    Usage:
+        with FileLock(fpath + LOCK_EXT):
+            ...
+    """
+
+    def __init__(self, path, timeout=None, poll_interval=0.1):
+        """Creates a FileLock object.
+
+        Args:
+            path: str, the path to the lock file.
+            timeout: float or None, the number of seconds to wait for the
+                lock before raising an error, or None to wait forever.
+            poll_interval: float, how often to retry, in seconds.
+        """
+
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+
+    def _try_acquire(self):
+        """Tries to take the lock once. Returns True if it was taken."""
+
+        if fcntl is not None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                os.close(fd)
+                return False
+        else:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                return False
+
+        self._fd = fd
+        return True
+
+    def acquire(self):
+        """Blocks until the lock is taken.
+
+        Raises:
+            RuntimeError: if the lock couldn't be taken before the timeout.
+        """
+
+        start = time.time()
+        while not self._try_acquire():
+            if self.timeout is not None and time.time() - start > self.timeout:
+                raise RuntimeError('Timed out waiting for lock "%s"'
+                                   % self.path)
+            time.sleep(self.poll_interval)
+
+    def release(self):
+        """Releases the lock."""
+
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        else:
+            os.close(self._fd)
+            os.remove(self.path)
+        self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
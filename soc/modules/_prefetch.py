@@ -0,0 +1,118 @@
+"""_prefetch.py
+
+Defines a way of preparing batches in background threads while the consumer
+works on the current one. Gathering rows and running vectorized transforms
+mostly happens inside Numpy, which releases the GIL, so threads are enough
+to overlap the work.
+"""
+
+from __future__ import absolute_import
+
+import sys
+import threading
+
+import six
+from six.moves import queue
+
+# Marks the end of a finite stream of jobs.
+_END = object()
+
+# How often blocked threads check whether they should stop, in seconds.
+_POLL_INTERVAL = 0.1
+
+
+class _Failure(object):
+    """Carries an exception from a background thread to the consumer."""
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+def prefetch(jobs, fn, depth=2, num_workers=1):
+    """Applies a function to jobs in background threads.
+
+    The jobs are dealt out to the workers in turn and the results are yielded
+    in the same order as the jobs. The threads stop when the returned
+    generator is closed or garbage collected.
+
+    Args:
+        jobs: iterable, the jobs to process.
+        fn: function taking (job, worker_index) and returning a result.
+        depth: int, the number of results each worker prepares in advance.
+        num_workers: int, the number of worker threads.
+
+    Yields:
+        the results of fn for each job.
+    """
+
+    if depth < 1 or num_workers < 1:
+        raise ValueError('depth and num_workers should be positive, got %d '
+                         'and %d' % (depth, num_workers))
+
+    stop = threading.Event()
+    in_queues = [queue.Queue(depth) for _ in range(num_workers)]
+    out_queues = [queue.Queue(depth) for _ in range(num_workers)]
+
+    def _put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _dispatch():
+        i = 0
+        try:
+            for job in jobs:
+                if not _put(in_queues[i % num_workers], job):
+                    return
+                i += 1
+        except Exception:
+            _put(in_queues[i % num_workers], _Failure(sys.exc_info()))
+        else:
+            _put(in_queues[i % num_workers], _END)
+
+    def _work(worker_index):
+        while not stop.is_set():
+            job = _get(in_queues[worker_index])
+            if job is _END or isinstance(job, _Failure):
+                _put(out_queues[worker_index], job)
+                return
+            try:
+                result = fn(job, worker_index)
+            except Exception:
+                result = _Failure(sys.exc_info())
+            if not _put(out_queues[worker_index], result):
+                return
+
+    threads = [threading.Thread(target=_dispatch)]
+    threads += [threading.Thread(target=_work, args=(i,))
+                for i in range(num_workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        i = 0
+        while True:
+            result = out_queues[i % num_workers].get()
+            if result is _END:
+                return
+            if isinstance(result, _Failure):
+                six.reraise(*result.exc_info)
+            yield result
+            i += 1
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
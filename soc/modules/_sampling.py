@@ -0,0 +1,208 @@
+"""_sampling.py
+
+Defines samplers which draw the samples of each batch for `iterate_data`,
+instead of a uniform shuffle.
+
+`WeightedSampler` draws samples in proportion to per-sample weights with an
+alias table (Walker's method), so each draw costs a constant amount of work
+regardless of the number of samples. The table is built with vectorized
+operations, and rebuilt lazily after the weights change, so weights can be
+updated between batches (for example, to focus on hard examples).
+`StratifiedSampler` draws a class first, then a sample of that class, so
+skewed datasets can be iterated in balanced batches.
+
+Samplers draw batches on demand, so no per-epoch list of samples is made.
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+import numpy as np
+
+
+def build_alias_table(weights):
+    """Builds an alias table for drawing indices in proportion to weights.
+
+    Column i of the table is picked uniformly at random; it gives i with
+    probability prob[i] and alias[i] otherwise. Columns of underweight
+    indices are topped up by overweight ones, in order: the deficits of the
+    underweight columns are laid end to end, and each overweight index
+    covers a stretch of that line as long as its excess. An overweight index
+    which runs out becomes underweight itself, and is topped up by the next.
+
+    Args:
+        weights: 1D array of non-negative floats, with a positive sum.
+
+    Returns:
+        tuple of Numpy arrays (prob, alias).
+
+    Raises:
+        ValueError: if the weights are invalid.
+    """
+
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim != 1 or not len(weights):
+        raise ValueError('Expected a non-empty 1D array of weights, got shape '
+                         '%s' % (weights.shape,))
+    if not np.isfinite(weights).all() or (weights < 0).any():
+        raise ValueError('Weights should be finite and non-negative.')
+    total = weights.sum()
+    if not total > 0:
+        raise ValueError('The weights should have a positive sum.')
+
+    num = len(weights)
+    prob = weights * (num / total)
+    alias = np.arange(num)
+
+    small = np.flatnonzero(prob < 1)
+    large = np.flatnonzero(prob >= 1)
+    if not len(small) or not len(large):
+        return np.ones(num), alias
+
+    deficits = np.cumsum(1 - prob[small])
+    excesses = np.cumsum(prob[large] - 1)
+
+    # Each underweight column is topped up by the overweight index whose
+    # stretch its deficit starts in.
+    starts = deficits - (1 - prob[small])
+    covering = np.searchsorted(excesses, starts, side='right')
+    alias[small] = large[np.minimum(covering, len(large) - 1)]
+
+    # Each overweight index but the last runs out partway through some
+    # deficit; what is left of its own column is topped up by the next one.
+    crossing = np.searchsorted(deficits, excesses[:-1], side='left')
+    crossing = np.minimum(crossing, len(deficits) - 1)
+    overshoot = np.maximum(deficits[crossing] - excesses[:-1], 0)
+    prob[large[:-1]] = np.clip(1 - overshoot, 0, 1)
+    alias[large[:-1]] = large[1:]
+    prob[large[-1]] = 1
+
+    return prob, alias
+
+
+class Sampler(object):
+    """Base class for samplers, which draw the indices of a batch."""
+
+    num_samples = None
+
+    def sample(self, num, rng=None):
+        """Draws sample indices.
+
+        Args:
+            num: int, the number of indices to draw.
+            rng: Numpy RandomState or None, the random number generator.
+
+        Returns:
+            int64 Numpy array of indices.
+        """
+
+        raise NotImplementedError()
+
+
+class WeightedSampler(Sampler):
+    """Draws samples with replacement, in proportion to their weights."""
+
+    def __init__(self, weights):
+        """Creates a WeightedSampler object.
+
+        Args:
+            weights: 1D array of non-negative floats, one per sample.
+        """
+
+        self._lock = threading.Lock()
+        self.weights = np.array(weights, dtype=np.float64)
+        self.num_samples = len(self.weights)
+        self._prob, self._alias = build_alias_table(self.weights)
+        self._dirty = False
+
+    def update_weights(self, weights, indices=None):
+        """Changes the weights of some samples.
+
+        The alias table is rebuilt the next time samples are drawn, so many
+        updates in a row only cost one rebuild.
+
+        Args:
+            weights: float or array of floats, the new weights.
+            indices: int array or None, the samples to update, or None to
+                replace all the weights.
+        """
+
+        with self._lock:
+            if indices is None:
+                weights = np.asarray(weights, dtype=np.float64)
+                if weights.shape != self.weights.shape:
+                    raise ValueError('Expected %d weights, got shape %s'
+                                     % (self.num_samples, weights.shape))
+                self.weights[:] = weights
+            else:
+                self.weights[indices] = weights
+            self._dirty = True
+
+    def sample(self, num, rng=None):
+        """Draws sample indices (see `Sampler.sample`)."""
+
+        if rng is None:
+            rng = np.random
+
+        with self._lock:
+            if self._dirty:
+                self._prob, self._alias = build_alias_table(self.weights)
+                self._dirty = False
+            prob, alias = self._prob, self._alias
+
+        columns = rng.randint(0, self.num_samples, size=num)
+        keep = rng.random_sample(num) < prob[columns]
+        return np.where(keep, columns, alias[columns])
+
+
+class StratifiedSampler(Sampler):
+    """Draws a class for each sample, then a sample of that class."""
+
+    def __init__(self, labels, class_weights=None):
+        """Creates a StratifiedSampler object.
+
+        Args:
+            labels: 1D array of non-negative integer labels, one per sample,
+                or a 2D array of one-hot labels.
+            class_weights: array of non-negative floats or None, how often to
+                draw each class, or None to draw the classes which have
+                samples equally often.
+        """
+
+        labels = np.asarray(labels)
+        if labels.ndim == 2:
+            labels = labels.argmax(axis=-1)
+        labels = labels.astype(np.int64)
+
+        self.num_samples = len(labels)
+        self._order = np.argsort(labels, kind='mergesort')
+        self.class_counts = np.bincount(labels)
+        self._class_starts = np.cumsum(self.class_counts) - self.class_counts
+
+        if class_weights is None:
+            class_weights = (self.class_counts > 0).astype(np.float64)
+        self.set_class_weights(class_weights)
+
+    def set_class_weights(self, class_weights):
+        """Changes how often each class is drawn."""
+
+        class_weights = np.asarray(class_weights, dtype=np.float64)
+        if class_weights.shape != self.class_counts.shape:
+            raise ValueError('Expected %d class weights, got shape %s'
+                             % (len(self.class_counts), class_weights.shape))
+        if (class_weights[self.class_counts == 0] > 0).any():
+            raise ValueError('Classes with no samples should have zero '
+                             'weight.')
+        self._classes = WeightedSampler(class_weights)
+
+    def sample(self, num, rng=None):
+        """Draws sample indices (see `Sampler.sample`)."""
+
+        if rng is None:
+            rng = np.random
+
+        classes = self._classes.sample(num, rng)
+        offsets = (rng.random_sample(num) *
+                   self.class_counts[classes]).astype(np.int64)
+        return self._order[self._class_starts[classes] + offsets]
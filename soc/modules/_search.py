@@ -0,0 +1,182 @@
+"""_search.py
+
+Defines an on-disk inverted index with BM25 ranking.
+
+An index is a directory holding `terms.json`, which maps each token to its
+term number, and Numpy arrays of postings sorted by term: for each term, the
+documents it appears in and how many times. `offsets.npy` marks where each
+term's postings start. The arrays are memory-mapped when the index is
+opened, so a query only reads the postings of its own terms, and never the
+documents themselves.
+"""
+
+from __future__ import absolute_import
+
+import json
+import os
+import re
+
+import numpy as np
+
+_TERMS_FNAME = 'terms.json'
+_META_FNAME = 'meta.json'
+
+_WORD_REGEX = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize_words(text):
+    """Splits text into lowercase words, ignoring punctuation."""
+
+    return _WORD_REGEX.findall(text.lower())
+
+
+def build_index(path, documents, tokenize=tokenize_words):
+    """Builds an inverted index of some documents.
+
+    Args:
+        path: str, the directory to write the index to.
+        documents: iterable of str, the documents; a document's number is its
+            position in the iterable.
+        tokenize: function mapping a document (or query) to a list of
+            tokens. By default, documents are split into lowercase words.
+    """
+
+    terms = {}
+    term_ids, doc_ids, counts, doc_lengths = [], [], [], []
+
+    for doc_id, document in enumerate(documents):
+        tokens = tokenize(document)
+        doc_lengths.append(len(tokens))
+        if not tokens:
+            continue
+
+        ids = np.fromiter((terms.setdefault(t, len(terms)) for t in tokens),
+                          dtype=np.int64, count=len(tokens))
+        unique, tf = np.unique(ids, return_counts=True)
+        term_ids.append(unique)
+        counts.append(tf)
+        doc_ids.append(np.full(len(unique), doc_id, dtype=np.int64))
+
+    if term_ids:
+        term_ids = np.concatenate(term_ids)
+        doc_ids = np.concatenate(doc_ids)
+        counts = np.concatenate(counts)
+    else:
+        term_ids = doc_ids = counts = np.zeros((0,), dtype=np.int64)
+
+    # Sorts the postings by term, then by document.
+    order = np.lexsort((doc_ids, term_ids))
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=offsets[1:])
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+    np.save(os.path.join(path, 'docs.npy'), doc_ids[order].astype(np.int32))
+    np.save(os.path.join(path, 'counts.npy'), counts[order].astype(np.int32))
+    np.save(os.path.join(path, 'lengths.npy'),
+            np.asarray(doc_lengths, dtype=np.int32))
+
+    with open(os.path.join(path, _TERMS_FNAME), 'w') as f:
+        json.dump(terms, f)
+
+    # The metadata is written last, so its presence marks a complete index.
+    with open(os.path.join(path, _META_FNAME), 'w') as f:
+        json.dump({'num_docs': len(doc_lengths),
+                   'num_terms': len(terms)}, f)
+
+
+class InvertedIndex(object):
+    """Reads an index written by `build_index`."""
+
+    def __init__(self, path, tokenize=tokenize_words):
+        """Opens an index.
+
+        Args:
+            path: str, the directory holding the index.
+            tokenize: the function the index was built with, to split
+                queries into tokens.
+
+        Raises:
+            IOError: if there isn't a complete index at the path.
+        """
+
+        if not os.path.exists(os.path.join(path, _META_FNAME)):
+            raise IOError('No index found at "%s"' % path)
+
+        with open(os.path.join(path, _TERMS_FNAME)) as f:
+            self._terms = json.load(f)
+
+        def _load(name):
+            return np.load(os.path.join(path, name), mmap_mode='r')
+
+        self.path = path
+        self.tokenize = tokenize
+        self._offsets = _load('offsets.npy')
+        self._docs = _load('docs.npy')
+        self._counts = _load('counts.npy')
+        self._lengths = _load('lengths.npy')
+        self.num_docs = len(self._lengths)
+        self._avg_length = (float(self._lengths.sum()) / self.num_docs
+                            if self.num_docs else 0.)
+
+    def __len__(self):
+        return self.num_docs
+
+    def postings(self, token):
+        """Gets the documents a token appears in.
+
+        Args:
+            token: str, the token.
+
+        Returns:
+            tuple of Numpy arrays (doc_ids, counts), sorted by document.
+        """
+
+        term = self._terms.get(token)
+        if term is None:
+            empty = np.zeros((0,), dtype=np.int32)
+            return empty, empty
+        start, stop = self._offsets[term], self._offsets[term + 1]
+        return self._docs[start:stop], self._counts[start:stop]
+
+    def search(self, query, k=10, k1=1.2, b=0.75):
+        """Ranks the documents which match a query with BM25.
+
+        Args:
+            query: str, the query.
+            k: int or None, the number of results, or None for all matches.
+            k1: float, how quickly repeated terms stop adding to the score.
+            b: float, how much long documents are penalized.
+
+        Returns:
+            list of (doc_id, score) tuples, best first.
+        """
+
+        doc_ids, scores = [], []
+        for token in set(self.tokenize(query)):
+            docs, counts = self.postings(token)
+            if not len(docs):
+                continue
+
+            idf = np.log(1 + (self.num_docs - len(docs) + 0.5) /
+                         (len(docs) + 0.5))
+            counts = counts.astype(np.float64)
+            norm = k1 * (1 - b + b * self._lengths[docs] / self._avg_length)
+            doc_ids.append(np.asarray(docs))
+            scores.append(idf * counts * (k1 + 1) / (counts + norm))
+
+        if not doc_ids:
+            return []
+
+        # Adds up the scores of each document over the query terms.
+        matches, inverse = np.unique(np.concatenate(doc_ids),
+                                     return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+
+        if k is not None and k < len(matches):
+            top = np.argpartition(-totals, k - 1)[:k]
+        else:
+            top = np.arange(len(matches))
+        top = top[np.lexsort((matches[top], -totals[top]))]
+        return [(int(matches[i]), float(totals[i])) for i in top]
@@ -0,0 +1,150 @@
+"""_sequence.py
+
+Defines a random-access view of a module's batches, for data loaders which
+fetch batches by index from several workers, like Keras' `Sequence`.
+
+Unlike the generator from `iterate_data`, any batch can be computed on its
+own: batch `i` of an epoch is always the same samples, taken from a
+permutation which only depends on the seed and the epoch number. Workers
+(threads or processes) that are handed different indices never produce the
+same batch, and no worker has to replay the batches before its own.
+"""
+
+from __future__ import absolute_import
+
+import numpy as np
+
+# The class returned by `get_sequence_class`, once it has been looked up.
+_sequence_class = None
+
+
+class BatchSequence(object):
+    """Random-access batches of a module, one epoch at a time."""
+
+    def __init__(self,
+                 module,
+                 batch_size,
+                 mode='train',
+                 randomize=True,
+                 seed=None,
+                 num_shards=1,
+                 shard_index=0,
+                 contiguous_shards=False):
+        """Creates a BatchSequence object.
+
+        The data is loaded once, when the sequence is created. Samples left
+        over after the last full batch of an epoch are dropped, as in
+        `iterate_data`.
+
+        Args:
+            module: the module to get batches from.
+            batch_size: int, the size of each batch.
+            mode: str, 'train' or 'test'.
+            randomize: bool, whether to randomize the batch entries.
+            seed: int or None, the seed for the per-epoch permutations and
+                the transforms. If None, one is drawn, so copies of the
+                sequence in other processes still agree on the batches.
+            num_shards: int, the number of machines splitting the data.
+            shard_index: int, which of the machines this is.
+            contiguous_shards: bool, see `Module.get_epoch_batches`.
+        """
+
+        super(BatchSequence, self).__init__()
+
+        if mode == 'train':
+            self._x_data, self._y_data = module.train_data
+        elif mode == 'test':
+            self._x_data, self._y_data = module.test_data
+        else:
+            raise ValueError('Invalid mode: "%s" (should be "train" or '
+                             '"test")' % mode)
+
+        if seed is None:
+            seed = np.random.randint(2 ** 31)
+
+        self.module = module
+        self.batch_size = batch_size
+        self.training = mode == 'train'
+        self.randomize = randomize
+        self.seed = seed
+        self.num_shards = num_shards
+        self.shard_index = shard_index
+        self.contiguous_shards = contiguous_shards
+        self.set_epoch(0)
+
+    def set_epoch(self, epoch):
+        """Moves to an epoch, computing its batches."""
+
+        self.epoch = epoch
+        self._batches = self.module.get_epoch_batches(
+            len((self._x_data or self._y_data)[0]),
+            self.batch_size,
+            epoch=epoch,
+            randomize=self.randomize,
+            seed=self.seed,
+            num_shards=self.num_shards,
+            shard_index=self.shard_index,
+            contiguous_shards=self.contiguous_shards)
+
+        if not self._batches:
+            raise ValueError('There are not enough samples to make batches '
+                             'of size %d for each shard.' % self.batch_size)
+
+    def __len__(self):
+        """Returns the number of batches in an epoch."""
+
+        return len(self._batches)
+
+    def __getitem__(self, index):
+        """Gets a batch of the current epoch.
+
+        Args:
+            index: int, the index of the batch.
+
+        Returns:
+            tuple of lists (x_data, y_data), as from `iterate_data`.
+        """
+
+        if not -len(self) <= index < len(self):
+            raise IndexError('Batch %d is out of range; there are %d batches '
+                             'per epoch' % (index, len(self)))
+        idx = self._batches[index]
+
+        # The transform's randomness only depends on which batch this is, so
+        # it doesn't matter which worker computes it.
+        rng = np.random.RandomState([self.seed, self.epoch, index % len(self)])
+        x_batch = [x[idx] for x in self._x_data]
+        x_batch = self.module._apply_transform(x_batch, rng, self.training)
+        return x_batch, [y[idx] for y in self._y_data]
+
+    def __iter__(self):
+        """Iterates over the batches of the current epoch."""
+
+        for index in range(len(self)):
+            yield self[index]
+
+    def on_epoch_end(self):
+        """Moves to the next epoch, reshuffling the batches."""
+
+        self.set_epoch(self.epoch + 1)
+
+
+def get_sequence_class():
+    """Returns the class `Module.as_sequence` creates.
+
+    If Keras is installed, this is a subclass of both BatchSequence and
+    `keras.utils.Sequence`, so Keras accepts it in `fit` with several
+    workers. Otherwise, it is just BatchSequence.
+    """
+
+    global _sequence_class
+
+    if _sequence_class is None:
+        try:
+            from keras.utils import Sequence
+            _sequence_class = type('KerasBatchSequence',
+                                   (BatchSequence, Sequence), {})
+        except ImportError:
+            _sequence_class = BatchSequence
+
+    return _sequence_class
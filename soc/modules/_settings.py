@@ -11,6 +11,11 @@ import logging
 import os
 import warnings
 
+import numpy as np
+import six
+
+from ._lock import FileLock, LOCK_EXT, ensure_dir, get_temp_path
+
 # Loads the base directory (Unix or Windows).
 _base_dir = os.path.expanduser('~')
 if not os.access(_base_dir, os.W_OK):
@@ -18,73 +23,229 @@ if not os.access(_base_dir, os.W_OK):
 
 # Gets or creates the main SOC directory.
 _pysoc_dir = os.path.join(_base_dir, '.pysoc')
-if not os.path.exists(_pysoc_dir):
-    os.makedirs(_pysoc_dir)
-
-# Loads settings file.
-_settings_path = os.path.join(_pysoc_dir, 'settings.json')
-if os.path.exists(_settings_path):
-    _settings_dict = json.load(open(_settings_path))
+ensure_dir(_pysoc_dir)
 
-# Creates a new settings file.
-else:
-    _default_data_dir = os.path.join(_pysoc_dir, 'data')
-    if not os.path.exists(_default_data_dir):
-        os.makedirs(_default_data_dir)
+# The type and default value of each setting. Settings which are missing from
+# the settings file get their default value, and values from environment
+# variables (which are always strings) are converted to the setting's type.
+_schema = {
+    # Where the module data is stored.
+    'data_dir': (str, None),
 
-    _settings_dict = {
-        'data_dir': _default_data_dir,
-        'chunk_size': 8192,
-    }
-    print('creating settings dict')
-    print('settings dict:', _settings_dict)
-    with open(_settings_path, 'w') as f:
-        f.write(json.dumps(_settings_dict, indent=4))
+    # The number of bytes to read at a time when downloading.
+    'chunk_size': (int, 8192),
 
+    # Maximum size of the data directory, in bytes, before derived artifacts
+    # are evicted. Zero means there is no limit.
+    'cache_budget': (int, 0),
 
-# Overrides with environment variables.
-for key, value in _settings_dict.items():
-    var_name = 'PYSOC_%s' % key.upper()
-    if var_name not in os.environ:
-        continue
+    # Artifact stores to try before a file's own URL, as paths or URLs.
+    'mirrors': (list, []),
 
-    var_value = os.environ[var_name]
-    if isinstance(value, (list, tuple)):
-        var_value = var_value.split(',')
+    # The default number of batches `iterate_data` prepares in the
+    # background, per worker. Zero means batches are prepared on demand.
+    'prefetch_depth': (int, 0),
 
-    # Updates settings with the new value.
-    _settings_dict[key] = var_value
-    logging.info('Updated ["%s": "%s" => "%s"]', key, value, var_value)
+    # The default number of workers for prefetching and preprocessing.
+    'num_workers': (int, 1),
 
+    # The floating-point type of encoded data, such as one-hot encodings.
+    'dtype': (str, 'float64'),
+}
 
-def _check_settings_dict():
-    """Performs validation checks on the settings dictionary."""
+# The key of the per-module overrides in the settings file, which maps module
+# names to dicts of settings, for example {"mnist": {"num_workers": 4}}.
+_MODULES_KEY = 'modules'
 
-    if 'chunk_size' not in _settings_dict:
+# Creates a new settings file. Parallel jobs on a fresh machine might all try
+# to do this, so only one of them writes it, atomically.
+_settings_path = os.path.join(_pysoc_dir, 'settings.json')
+if not os.path.exists(_settings_path):
+    with FileLock(_settings_path + LOCK_EXT):
+        if not os.path.exists(_settings_path):
+            _default_data_dir = os.path.join(_pysoc_dir, 'data')
+            ensure_dir(_default_data_dir)
+
+            _settings_dict = dict((k, v) for k, (_, v) in _schema.items())
+            _settings_dict['data_dir'] = _default_data_dir
+            print('creating settings dict')
+            print('settings dict:', _settings_dict)
+            _tmp_path = get_temp_path(_settings_path)
+            with open(_tmp_path, 'w') as f:
+                f.write(json.dumps(_settings_dict, indent=4))
+            os.rename(_tmp_path, _settings_path)
+
+# The settings, and the resolved settings of each module with its overrides
+# applied. These are filled in by `reload_settings`.
+_settings_dict = {}
+_module_settings = {}
+
+
+def _coerce(key, value):
+    """Converts a setting's value to its type, parsing it if it's a string.
+
+    Raises:
+        ValueError: if the value can't be converted.
+    """
+
+    if key not in _schema:
+        return value
+    setting_type = _schema[key][0]
+
+    if setting_type is int and isinstance(value, six.string_types):
+        try:
+            return int(value.strip())
+        except ValueError:
+            raise ValueError('Expected %s to be an integer, got "%s"'
+                             % (key, value))
+    elif setting_type is list and isinstance(value, six.string_types):
+        return [v.strip() for v in value.split(',') if v.strip()]
+    else:
+        return value
+
+
+def _check_settings_dict(settings_dict):
+    """Performs validation checks on a settings dictionary."""
+
+    for key in settings_dict:
+        if key not in _schema and key != _MODULES_KEY:
+            raise ValueError('Unknown setting "%s". Available settings: [%s]'
+                             % (key, ', '.join(sorted(_schema))))
+
+    if 'chunk_size' not in settings_dict:
         raise ValueError('Settings should include "chunk_size", an integer '
                          'specifying the download chunk size. Set this value '
                          'in "%s"' % _settings_path)
 
-    if not isinstance(_settings_dict['chunk_size'], int):
-        raise ValueError('Expected chunk_size to be an integer, got "%s"'
-                         % str(_settings_dict['chunk_size']))
-
-    if 'data_dir' not in _settings_dict:
+    for key, (setting_type, _) in _schema.items():
+        if setting_type is not int or key not in settings_dict:
+            continue
+        value = settings_dict[key]
+        if not isinstance(value, six.integer_types) or isinstance(value, bool):
+            raise ValueError('Expected %s to be an integer, got "%s"'
+                             % (key, str(value)))
+
+    if settings_dict['chunk_size'] <= 0:
+        raise ValueError('Expected chunk_size to be positive, got "%s"'
+                         % str(settings_dict['chunk_size']))
+
+    if settings_dict['cache_budget'] < 0:
+        raise ValueError('Expected cache_budget to be a non-negative '
+                         'integer, got "%s"'
+                         % str(settings_dict['cache_budget']))
+
+    if settings_dict['prefetch_depth'] < 0:
+        raise ValueError('Expected prefetch_depth to be a non-negative '
+                         'integer, got "%s"'
+                         % str(settings_dict['prefetch_depth']))
+
+    if settings_dict['num_workers'] < 1:
+        raise ValueError('Expected num_workers to be at least 1, got "%s"'
+                         % str(settings_dict['num_workers']))
+
+    if not isinstance(settings_dict['mirrors'], list):
+        raise ValueError('Expected mirrors to be a list of paths or URLs, '
+                         'got "%s"' % str(settings_dict['mirrors']))
+
+    try:
+        is_float = np.dtype(settings_dict['dtype']).kind == 'f'
+    except TypeError:
+        is_float = False
+    if not is_float:
+        raise ValueError('Expected dtype to be a floating-point type, such '
+                         'as "float32", got "%s"'
+                         % str(settings_dict['dtype']))
+
+    if not settings_dict.get('data_dir'):
         raise ValueError('The specified settings dictionary does not specify '
                          'a data directory: "%s" This path can be specified '
-                         'in "%s"' % (str(_settings_dict), _settings_path))
+                         'in "%s"' % (str(settings_dict), _settings_path))
 
-    if not os.access(_settings_dict['data_dir'], os.R_OK):
+    if not os.access(settings_dict['data_dir'], os.R_OK):
         raise ImportError('The specified data_dir does not have read '
                           'permission: "%s" This directory can be specified '
-                          'in "%s"' % (_settings_dict['data_dir'], _settings_path))
+                          'in "%s"' % (settings_dict['data_dir'], _settings_path))
 
-    if not os.access(_settings_dict['data_dir'], os.W_OK):
+    if not os.access(settings_dict['data_dir'], os.W_OK):
         warnings.warn('The current data_dir does not have write '
                       'permission: "%s". You will therefore be unable to '
-                      'download new files.' % _settings_dict['data_dir'])
+                      'download new files.' % settings_dict['data_dir'])
+
+    overrides = settings_dict.get(_MODULES_KEY, {})
+    if not isinstance(overrides, dict):
+        raise ValueError('Expected %s to map module names to settings, got '
+                         '"%s"' % (_MODULES_KEY, str(overrides)))
+    for module_name, module_dict in overrides.items():
+        if _MODULES_KEY in module_dict:
+            raise ValueError('Module settings can\'t have their own "%s"'
+                             % _MODULES_KEY)
+        merged = dict(settings_dict)
+        merged.update(module_dict)
+        merged.pop(_MODULES_KEY)
+        _check_settings_dict(merged)
+
+
+def reload_settings():
+    """Reads the settings file and environment variables again.
+
+    Settings are read once, when the package is imported, and looked up from
+    memory after that; this picks up changes made since then.
+
+    Raises:
+        ValueError: if a setting has the wrong type or value.
+    """
+
+    # Loads settings file.
+    with open(_settings_path) as f:
+        settings_dict = json.load(f)
+    for key, (setting_type, default) in _schema.items():
+        settings_dict[key] = _coerce(key, settings_dict.get(key, default))
+    settings_dict.setdefault(_MODULES_KEY, {})
+    for module_dict in settings_dict[_MODULES_KEY].values():
+        for key in list(module_dict):
+            module_dict[key] = _coerce(key, module_dict[key])
+
+    # Overrides with environment variables.
+    for key in _schema:
+        var_name = 'PYSOC_%s' % key.upper()
+        if var_name not in os.environ:
+            continue
 
-_check_settings_dict()
+        value = settings_dict[key]
+        var_value = _coerce(key, os.environ[var_name])
+
+        # Updates settings with the new value.
+        settings_dict[key] = var_value
+        logging.info('Updated ["%s": "%s" => "%s"]', key, value, var_value)
+
+    _check_settings_dict(settings_dict)
+    _settings_dict.clear()
+    _settings_dict.update(settings_dict)
+    _module_settings.clear()
+
+reload_settings()
+
+
+def get_module_settings(module_name=None):
+    """Gets all the settings for a module, with its overrides applied.
+
+    The result is computed once and cached until the settings change, so it
+    is cheap to call from hot paths.
+
+    Args:
+        module_name: str or None, the name of the module, or None for the
+            global settings.
+
+    Returns:
+        dict mapping setting names to values. It should not be modified.
+    """
+
+    if module_name not in _module_settings:
+        resolved = dict(_settings_dict)
+        overrides = resolved.pop(_MODULES_KEY)
+        resolved.update(overrides.get(module_name, {}))
+        _module_settings[module_name] = resolved
+    return _module_settings[module_name]
 
 
 def get_module_subdir(module_name):
@@ -93,35 +254,58 @@ def get_module_subdir(module_name):
     subdir_path = os.path.join(_settings_dict['data_dir'], module_name)
 
     # Creates the data subdirectory if it doesn't exist.
-    if not os.path.exists(subdir_path):
-        os.makedirs(subdir_path)
+    ensure_dir(subdir_path)
 
     return subdir_path
 
 
-def get_setting(attribute):
-    """Gets the value of an attribute."""
+def get_setting(attribute, module_name=None):
+    """Gets the value of an attribute.
+
+    Args:
+        attribute: str, the name of the setting.
+        module_name: str or None, if set, use the module's overrides.
+    """
 
     attribute = attribute.lower()
+    settings_dict = get_module_settings(module_name)
 
-    if attribute not in _settings_dict:
+    if attribute not in settings_dict:
         raise ValueError('Invalid attribute: "%s". Available attributes: '
-                         '[%s]' % (attribute, ', '.join(_settings_dict.keys())))
+                         '[%s]' % (attribute, ', '.join(settings_dict.keys())))
+
+    return settings_dict[attribute]
 
-    return _settings_dict[attribute]
 
+def set_setting(key, value, module_name=None):
+    """Updates a setting value, for this process only.
 
-def set_setting(key, value):
-    """Updates a setting value."""
+    Args:
+        key: str, the name of the setting.
+        value: the new value. Strings are converted to the setting's type.
+        module_name: str or None, if set, only override the setting for
+            this module.
+    """
 
     key = key.lower()
 
-    if key not in _settings_dict:
+    if key not in _schema:
         raise ValueError('Cannot add "%s" to the settings dictionary. '
                          'Available properties: "%s"'
                          % (key, _settings_dict.items()))
 
-    _settings_dict[key] = value
-
-    # Perform checks on the updated value.
-    _check_settings_dict()
+    new_dict = dict(_settings_dict)
+    new_dict[_MODULES_KEY] = dict((k, dict(v)) for k, v
+                                  in _settings_dict[_MODULES_KEY].items())
+    if module_name is None:
+        new_dict[key] = _coerce(key, value)
+    else:
+        new_dict[_MODULES_KEY].setdefault(module_name, {})[key] = _coerce(
+            key, value)
+
+    # Performs checks on the updated value, keeping the old settings if they
+    # fail.
+    _check_settings_dict(new_dict)
+    _settings_dict.clear()
+    _settings_dict.update(new_dict)
+    _module_settings.clear()
@@ -0,0 +1,153 @@
+"""_shared.py
+
+Defines a way of hosting preprocessed arrays in shared memory, so that several
+processes on the same machine can read from a single copy of a dataset.
+
+Each segment is a directory of `.npy` files. On Linux the directory is put in
+`/dev/shm`, which is backed by RAM; elsewhere it is put in the data directory.
+Readers memory-map the files, so attaching to a segment doesn't copy any data.
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import json
+import os
+import shutil
+
+import numpy as np
+
+from ._lock import ensure_dir, get_temp_path
+from ._settings import get_setting
+
+# Where shared segments live, if the system has a RAM-backed filesystem.
+_SHM_DIR = '/dev/shm'
+
+# File that marks a segment as completely written.
+_META_FNAME = 'meta.json'
+
+
+def get_shared_dir():
+    """Returns the directory where shared segments are stored."""
+
+    if os.path.isdir(_SHM_DIR) and os.access(_SHM_DIR, os.W_OK):
+        return _SHM_DIR
+
+    shared_dir = os.path.join(get_setting('data_dir'), 'shared')
+    ensure_dir(shared_dir)
+    return shared_dir
+
+
+class SharedDataset(object):
+    """A named, read-only dataset shared between processes.
+
+    The first process to call `publish` writes the arrays; every other process
+    calls `attach` to memory-map them. Publishing is atomic: arrays are written
+    to a private directory which is renamed into place once it is complete, so
+    readers never see a partially-written segment.
+    """
+
+    def __init__(self, name):
+        """Creates a handle to a shared dataset.
+
+        Args:
+            name: str, the name of the segment, unique to the data it holds.
+        """
+
+        self.name = name
+        self.path = os.path.join(get_shared_dir(), 'pysoc-%s' % name)
+        self.is_owner = False
+
+    def exists(self):
+        """Returns True if the segment has been completely published."""
+
+        return os.path.exists(os.path.join(self.path, _META_FNAME))
+
+    def publish(self, x_data, y_data, persist=False):
+        """Writes the dataset to the shared segment.
+
+        Args:
+            x_data: list of Numpy arrays, the input data.
+            y_data: list of Numpy arrays, the output / target data.
+            persist: bool, if not set, the segment is removed when this
+                process exits. Processes which have already attached keep
+                their mappings.
+
+        Returns:
+            bool, True if this process published the segment, False if another
+                process published it first.
+
+        Raises:
+            ValueError: if one of the arrays can't be memory-mapped.
+        """
+
+        if self.exists():
+            return False
+
+        tmp_path = get_temp_path(self.path)
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        try:
+            for prefix, arrays in (('x', x_data), ('y', y_data)):
+                for i, arr in enumerate(arrays):
+                    arr = np.asanyarray(arr)
+                    if arr.dtype.hasobject:
+                        raise ValueError('Arrays with object dtype can\'t be '
+                                         'shared, got one for %s_data[%d]'
+                                         % (prefix, i))
+                    np.save(os.path.join(tmp_path, '%s%d.npy' % (prefix, i)),
+                            arr)
+
+            meta = {'num_x': len(x_data), 'num_y': len(y_data)}
+            with open(os.path.join(tmp_path, _META_FNAME), 'w') as f:
+                json.dump(meta, f)
+
+            # Renaming onto an existing directory fails, so only one process
+            # can win the race to publish.
+            os.rename(tmp_path, self.path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if self.exists():
+                return False
+            raise
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        self.is_owner = True
+        if not persist:
+            atexit.register(self.unlink)
+
+        return True
+
+    def attach(self):
+        """Memory-maps the published dataset without copying it.
+
+        Returns:
+            tuple of lists (x_data, y_data) of read-only Numpy arrays.
+
+        Raises:
+            IOError: if the segment hasn't been published.
+        """
+
+        if not self.exists():
+            raise IOError('Shared dataset "%s" has not been published.'
+                          % self.name)
+
+        with open(os.path.join(self.path, _META_FNAME)) as f:
+            meta = json.load(f)
+
+        def _load(prefix, num):
+            return [np.load(os.path.join(self.path, '%s%d.npy' % (prefix, i)),
+                            mmap_mode='r')
+                    for i in range(num)]
+
+        return _load('x', meta['num_x']), _load('y', meta['num_y'])
+
+    def unlink(self):
+        """Removes the segment. Existing mappings remain valid."""
+
+        self.is_owner = False
+        shutil.rmtree(self.path, ignore_errors=True)
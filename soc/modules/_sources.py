@@ -0,0 +1,277 @@
+"""_sources.py
+
+Defines where raw files are downloaded from.
+
+Modules register their raw files with `register_source`. When a file is
+requested, the resolver turns its canonical URL into an ordered list of
+candidate URLs: one for each mirror in the `mirrors` setting, followed by the
+canonical URL itself. Each mirror is an artifact store laid out as
+`<mirror>/<module_name>/<fname>`, and can be a local or network path, or an
+HTTP server in front of such a directory.
+
+`pysoc prefetch` fills an artifact store in the same layout, so that it can
+be copied to or served for machines without internet access.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import os
+
+import click
+from multiprocessing.pool import ThreadPool
+from six.moves.urllib.request import pathname2url, urlopen
+
+from ._lock import FileLock, LOCK_EXT, ensure_dir, get_temp_path
+from ._settings import get_setting
+
+# Registered raw files, as (module_name, fname, url) tuples.
+_sources = []
+
+
+def register_source(module_name, fname, url):
+    """Registers a module's raw file, so it can be prefetched.
+
+    Args:
+        module_name: str, the name of the module.
+        fname: str, the name of the file in the module's directory.
+        url: str, the canonical URL of the file.
+    """
+
+    source = (module_name, fname, url)
+    if source not in _sources:
+        _sources.append(source)
+
+
+def get_sources(module_name=None):
+    """Returns the registered (module_name, fname, url) tuples."""
+
+    return [s for s in _sources if module_name in (None, s[0])]
+
+
+def _mirror_to_url(mirror):
+    """Turns a mirror, which may be a local path, into a base URL."""
+
+    if '://' not in mirror:
+        return 'file://' + pathname2url(os.path.abspath(mirror))
+    return mirror.rstrip('/')
+
+
+class SourceResolver(object):
+    """Maps a module's raw file to the URLs it can be downloaded from.
+
+    To change how files are found, subclass this and pass an instance to
+    `set_resolver`.
+    """
+
+    def get_mirrors(self):
+        """Returns the mirrors to try, in order."""
+
+        return get_setting('mirrors')
+
+    def get_urls(self, module_name, fname, url):
+        """Returns the URLs to try for a file, in order.
+
+        Args:
+            module_name: str, the name of the module.
+            fname: str, the name of the file.
+            url: str, the canonical URL of the file.
+
+        Returns:
+            list of str, the candidate URLs.
+        """
+
+        urls = ['%s/%s/%s' % (_mirror_to_url(mirror), module_name, fname)
+                for mirror in self.get_mirrors()]
+        urls.append(url)
+        return urls
+
+
+_resolver = SourceResolver()
+
+
+def get_resolver():
+    """Returns the resolver used to find raw files."""
+
+    return _resolver
+
+
+def set_resolver(resolver):
+    """Replaces the resolver used to find raw files."""
+
+    global _resolver
+    _resolver = resolver
+
+
+def download_url(url, fpath, label=None, use_bar=True):
+    """Downloads a URL to a file.
+
+    Args:
+        url: str, the URL to download.
+        fpath: str, where to write the file.
+        label: str, the label for the progress bar.
+        use_bar: bool, whether or not to use the progress bar.
+    """
+
+    response = urlopen(url)
+    info = response.info()
+
+    # Gets the total file size from the header, if there is one.
+    fsize = info.get('Content-Length')
+    if fsize is not None:
+        fsize = int(fsize.strip())
+
+    if use_bar:
+        bar = click.progressbar(length=fsize,
+                                label=label,
+                                fill_char='=',
+                                empty_char='.')
+
+    # Downloads the file.
+    chunk_size = get_setting('chunk_size')
+    with open(fpath, 'wb') as f:
+        chunk = response.read(chunk_size)
+        while chunk:
+            f.write(chunk)
+            if use_bar:
+                bar.update(len(chunk))
+            chunk = response.read(chunk_size)
+
+    if use_bar:
+        bar.finish()
+
+
+def fetch(fpath, urls, download_fn=download_url, force=False):
+    """Downloads a file from the first URL that works, unless it exists.
+
+    If several processes fetch the same missing file at once, one of them
+    downloads it while the others wait, and then they all use the downloaded
+    file. The file is downloaded to a temporary path and renamed once it is
+    complete, so that other processes never see a partial download.
+
+    Args:
+        fpath: str, where to put the file.
+        urls: list of str, the URLs to try, in order.
+        download_fn: function taking (url, fpath) which downloads a file.
+        force: bool, if set, download the file even if it exists.
+
+    Returns:
+        fpath: str, the path to the file.
+
+    Raises:
+        IOError: if the file couldn't be downloaded from any of the URLs.
+    """
+
+    if os.path.exists(fpath) and not force:
+        return fpath
+
+    def _get_mtime():
+        return os.stat(fpath).st_mtime if os.path.exists(fpath) else None
+    old_mtime = _get_mtime()
+
+    with FileLock(fpath + LOCK_EXT):
+        # Another process may have downloaded the file while we waited.
+        new_mtime = _get_mtime()
+        if new_mtime is not None and (not force or new_mtime != old_mtime):
+            return fpath
+
+        tmp_path = get_temp_path(fpath)
+        errors = []
+        try:
+            for url in urls:
+                try:
+                    download_fn(url, tmp_path)
+                except (IOError, OSError) as e:
+                    logging.info('Failed to download "%s": %s', url, e)
+                    errors.append('%s: %s' % (url, e))
+                    continue
+
+                os.rename(tmp_path, fpath)
+                return fpath
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    raise IOError('Could not download "%s" from any source:\n%s'
+                  % (os.path.basename(fpath), '\n'.join(errors)))
+
+
+def prefetch_sources(dest_dir=None,
+                     module_names=None,
+                     num_workers=4,
+                     force=False):
+    """Downloads registered raw files into an artifact store, in parallel.
+
+    Args:
+        dest_dir: str or None, the root of the store, or None to use the data
+            directory.
+        module_names: list of str or None, the modules whose files to fetch,
+            or None for all of them.
+        num_workers: int, the number of parallel downloads.
+        force: bool, if set, download files even if they exist.
+
+    Returns:
+        list of (module_name, fname, error) tuples, where error is None if
+            the file was fetched successfully.
+    """
+
+    if dest_dir is None:
+        dest_dir = get_setting('data_dir')
+
+    sources = [s for s in get_sources()
+               if module_names is None or s[0] in module_names]
+
+    def _fetch(source):
+        module_name, fname, url = source
+        module_dir = os.path.join(dest_dir, module_name)
+        ensure_dir(module_dir)
+
+        def _download(u, fpath):
+            download_url(u, fpath, use_bar=False)
+
+        urls = get_resolver().get_urls(module_name, fname, url)
+        try:
+            fetch(os.path.join(module_dir, fname), urls, _download,
+                  force=force)
+        except (IOError, OSError) as e:
+            return module_name, fname, str(e)
+        return module_name, fname, None
+
+    pool = ThreadPool(max(1, min(num_workers, len(sources))))
+    try:
+        return pool.map(_fetch, sources)
+    finally:
+        pool.close()
+        pool.join()
+
+
+@click.command()
+@click.argument('module_names', nargs=-1)
+@click.option('--all', 'fetch_all', is_flag=True, default=False)
+@click.option('--dest', default=None)
+@click.option('--num_workers', default=4)
+@click.option('--force/--no_force', default=False)
+def prefetch(module_names, fetch_all, dest, num_workers, force):
+    """Downloads raw data into a local artifact store."""
+
+    if not fetch_all and not module_names:
+        raise click.UsageError('Specify the modules to prefetch, or --all.')
+
+    if fetch_all:
+        module_names = None
+    results = prefetch_sources(dest_dir=dest,
+                               module_names=module_names,
+                               num_workers=num_workers,
+                               force=force)
+
+    failed = False
+    for module_name, fname, error in results:
+        if error is None:
+            click.echo('Fetched %s/%s' % (module_name, fname))
+        else:
+            click.echo('Failed %s/%s: %s' % (module_name, fname, error),
+                       err=True)
+            failed = True
+
+    if failed:
+        raise click.ClickException('Some files could not be prefetched.')
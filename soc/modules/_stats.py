@@ -0,0 +1,153 @@
+"""_stats.py
+
+Defines accumulators for summary statistics of datasets.
+
+The statistics are computed in a single pass over a dataset, one batch at a
+time. Each accumulator only keeps running totals, so its memory doesn't grow
+with the number of samples: means and variances are merged batch by batch
+with Chan et al.'s parallel algorithm, and integer values are counted in a
+growing array of bins.
+"""
+
+from __future__ import absolute_import
+
+import numpy as np
+
+# How many of the most frequent values `format_stats` lists.
+_NUM_TOP_VALUES = 10
+
+
+class ArrayStats(object):
+    """Running mean, standard deviation, minimum and maximum of an array."""
+
+    def __init__(self, elementwise=True):
+        """Creates an ArrayStats object.
+
+        Args:
+            elementwise: bool, if set, also keep the mean and standard
+                deviation of each element of a sample (for example, of each
+                pixel of an image).
+        """
+
+        self.elementwise = elementwise
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.min = None
+        self.max = None
+
+    def update(self, batch):
+        """Adds a batch of samples, whose first dimension is the batch."""
+
+        batch = np.asarray(batch, dtype=np.float64)
+        if not len(batch):
+            return
+        if not self.elementwise:
+            batch = batch.reshape(-1)
+
+        count = len(batch)
+        mean = batch.mean(axis=0)
+        m2 = ((batch - mean) ** 2).sum(axis=0)
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+        batch_min, batch_max = batch.min(), batch.max()
+        self.min = batch_min if self.min is None else min(self.min, batch_min)
+        self.max = batch_max if self.max is None else max(self.max, batch_max)
+
+    def result(self):
+        """Returns the statistics as a JSON-serializable dict."""
+
+        mean = np.asarray(self.mean, dtype=np.float64)
+        m2 = np.asarray(self.m2, dtype=np.float64)
+        count = max(self.count, 1)
+
+        # The overall variance combines the variance within each element with
+        # the variance between the elements' means.
+        total_mean = float(mean.mean()) if mean.size else 0.
+        total_var = float((m2 / count + (mean - total_mean) ** 2).mean()
+                          if mean.size else 0.)
+
+        result = {'kind': 'array',
+                  'count': self.count,
+                  'mean': total_mean,
+                  'std': total_var ** 0.5,
+                  'min': None if self.min is None else float(self.min),
+                  'max': None if self.max is None else float(self.max)}
+        if self.elementwise:
+            result['element_mean'] = mean.tolist()
+            result['element_std'] = np.sqrt(m2 / count).tolist()
+        return result
+
+
+class Histogram(object):
+    """Running counts of non-negative integer values."""
+
+    def __init__(self):
+        self.counts = np.zeros((0,), dtype=np.int64)
+
+    def update(self, values):
+        """Adds an array of non-negative integers."""
+
+        values = np.asarray(values, dtype=np.int64).reshape(-1)
+        if not values.size:
+            return
+
+        counts = np.bincount(values)
+        if len(counts) > len(self.counts):
+            counts[:len(self.counts)] += self.counts
+            self.counts = counts
+        else:
+            self.counts[:len(counts)] += counts
+
+    def result(self):
+        """Returns the counts as a JSON-serializable dict."""
+
+        total = int(self.counts.sum())
+        values = np.arange(len(self.counts))
+        mean = float((values * self.counts).sum()) / total if total else 0.
+        return {'kind': 'histogram',
+                'total': total,
+                'mean': mean,
+                'counts': self.counts.tolist()}
+
+
+def format_stats(report, labels=None):
+    """Formats a report from `Module.stats` to print.
+
+    Args:
+        report: dict, the report.
+        labels: dict or None, maps a histogram's name to a function which
+            gives a readable label for each value (for example, the token
+            with some index).
+
+    Returns:
+        str, one or more lines for each entry of the report.
+    """
+
+    labels = labels or {}
+    lines = ['Samples: %d' % report['num_samples']]
+
+    for name, entry in sorted(report['stats'].items()):
+        if entry['kind'] == 'array':
+            lines.append('%s: mean=%.4g std=%.4g min=%s max=%s'
+                         % (name, entry['mean'], entry['std'],
+                            entry['min'], entry['max']))
+        else:
+            counts = np.asarray(entry['counts'])
+            lines.append('%s: total=%d mean=%.4g distinct=%d'
+                         % (name, entry['total'], entry['mean'],
+                            np.count_nonzero(counts)))
+            label = labels.get(name, str)
+            top = np.argsort(-counts, kind='mergesort')[:_NUM_TOP_VALUES]
+            for value in top:
+                if not counts[value]:
+                    break
+                lines.append('    %s: %d' % (label(int(value)),
+                                             counts[value]))
+
+    return '\n'.join(lines)
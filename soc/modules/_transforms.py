@@ -0,0 +1,226 @@
+"""_transforms.py
+
+Defines data augmentation transforms. Each transform works on a whole batch
+at once using vectorized Numpy operations, rather than looping over samples
+in Python. Transforms are attached to a module through its `transform`
+attribute and are applied to the inputs as batches are produced by
+`Module.iterate_data`.
+
+Image transforms expect batches with shape (batch_size, height, width, ...).
+"""
+
+from __future__ import absolute_import
+
+import numpy as np
+
+
+class Transform(object):
+    """Defines the abstract transform class."""
+
+    # Random transforms are only applied to training data.
+    is_random = False
+
+    def __call__(self, batch, rng=None, training=True):
+        """Applies the transform to a batch.
+
+        Args:
+            batch: Numpy array, the batch to transform.
+            rng: Numpy RandomState, the random number generator to use.
+            training: bool, if not set, random transforms are skipped.
+
+        Returns:
+            the transformed batch.
+        """
+
+        if self.is_random and not training:
+            return batch
+        if rng is None:
+            rng = np.random
+        return self.apply(batch, rng)
+
+    def apply(self, batch, rng):
+        """Method signature for doing the transform."""
+
+        raise NotImplementedError()
+
+
+class Compose(Transform):
+    """Applies a sequence of transforms in order."""
+
+    def __init__(self, transforms):
+        self.transforms = list(transforms)
+
+    def __call__(self, batch, rng=None, training=True):
+        for transform in self.transforms:
+            batch = transform(batch, rng=rng, training=training)
+        return batch
+
+
+def _gather(images, rows, cols):
+    """Samples pixels from each image, filling out-of-bounds pixels with 0.
+
+    Args:
+        images: Numpy array with shape (batch_size, height, width, ...).
+        rows: Numpy array with shape (batch_size, height, width), the row to
+            sample for each output pixel.
+        cols: Numpy array with the same shape as rows, the column to sample.
+
+    Returns:
+        Numpy array with the same shape and type as images.
+    """
+
+    height, width = images.shape[1:3]
+    rows = np.rint(rows).astype(np.intp)
+    cols = np.rint(cols).astype(np.intp)
+    valid = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    np.clip(rows, 0, height - 1, out=rows)
+    np.clip(cols, 0, width - 1, out=cols)
+
+    batch_idx = np.arange(images.shape[0]).reshape(-1, 1, 1)
+    out = images[batch_idx, rows, cols]
+    out[~valid] = 0
+    return out
+
+
+def _grid(images):
+    """Returns (rows, cols) index grids, each with shape (1, height, width)."""
+
+    height, width = images.shape[1:3]
+    rows, cols = np.mgrid[0:height, 0:width]
+    return rows[None].astype(np.float32), cols[None].astype(np.float32)
+
+
+class RandomShift(Transform):
+    """Shifts each image by a random number of pixels."""
+
+    is_random = True
+
+    def __init__(self, max_shift=2):
+        """Creates a RandomShift transform.
+
+        Args:
+            max_shift: int, the maximum shift along each axis, in pixels.
+        """
+
+        self.max_shift = max_shift
+
+    def apply(self, batch, rng):
+        shifts = rng.randint(-self.max_shift, self.max_shift + 1,
+                             size=(2, batch.shape[0], 1, 1))
+        rows, cols = _grid(batch)
+        return _gather(batch, rows - shifts[0], cols - shifts[1])
+
+
+class RandomRotation(Transform):
+    """Rotates each image by a random angle about its center."""
+
+    is_random = True
+
+    def __init__(self, max_degrees=15.):
+        """Creates a RandomRotation transform.
+
+        Args:
+            max_degrees: float, the maximum rotation in either direction.
+        """
+
+        self.max_degrees = max_degrees
+
+    def apply(self, batch, rng):
+        max_radians = np.deg2rad(self.max_degrees)
+        theta = rng.uniform(-max_radians, max_radians,
+                            size=(batch.shape[0], 1, 1))
+        cos, sin = np.cos(theta), np.sin(theta)
+
+        # Maps each output pixel back to where it came from.
+        rows, cols = _grid(batch)
+        center_row = (batch.shape[1] - 1) / 2.
+        center_col = (batch.shape[2] - 1) / 2.
+        rows, cols = rows - center_row, cols - center_col
+        src_rows = cos * rows + sin * cols + center_row
+        src_cols = cos * cols - sin * rows + center_col
+
+        return _gather(batch, src_rows, src_cols)
+
+
+def _box_blur(arr, size, axis):
+    """Blurs an array along an axis with a moving average."""
+
+    arr = np.moveaxis(arr, axis, 0)
+    pad = [(size // 2, size - size // 2)] + [(0, 0)] * (arr.ndim - 1)
+    padded = np.pad(arr, pad, mode='edge')
+    cumsum = np.cumsum(padded, axis=0)
+    blurred = (cumsum[size:] - cumsum[:-size]) / float(size)
+    return np.moveaxis(blurred, 0, axis)
+
+
+class ElasticNoise(Transform):
+    """Displaces pixels by a smooth random field, as in elastic distortion."""
+
+    is_random = True
+
+    def __init__(self, alpha=2., smoothing=5):
+        """Creates an ElasticNoise transform.
+
+        Args:
+            alpha: float, the largest displacement, in pixels.
+            smoothing: int, the width of the filter used to smooth the random
+                displacement field.
+        """
+
+        self.alpha = alpha
+        self.smoothing = smoothing
+
+    def apply(self, batch, rng):
+        shape = (2, batch.shape[0]) + batch.shape[1:3]
+        field = rng.uniform(-1, 1, size=shape).astype(np.float32)
+        field = _box_blur(_box_blur(field, self.smoothing, 2),
+                          self.smoothing, 3)
+
+        # Scales each field so its largest displacement is alpha.
+        scale = np.abs(field).max(axis=(2, 3), keepdims=True)
+        field *= self.alpha / np.maximum(scale, 1e-6)
+
+        rows, cols = _grid(batch)
+        return _gather(batch, rows + field[0], cols + field[1])
+
+
+class Normalize(Transform):
+    """Subtracts a mean and divides by a standard deviation."""
+
+    def __init__(self, mean=0., std=1.):
+        """Creates a Normalize transform.
+
+        Args:
+            mean: float or Numpy array, broadcastable to a single sample.
+            std: float or Numpy array, broadcastable to a single sample.
+        """
+
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.inv_std = np.float32(1.) / np.asarray(std, dtype=np.float32)
+
+    def apply(self, batch, rng):
+        batch = np.subtract(batch, self.mean, dtype=np.float32)
+        batch *= self.inv_std
+        return batch
+
+
+class Cast(Transform):
+    """Casts a batch to another data type, such as float32."""
+
+    def __init__(self, dtype='float32', scale=None):
+        """Creates a Cast transform.
+
+        Args:
+            dtype: str or Numpy dtype, the type to cast to.
+            scale: float or None, if set, the batch is multiplied by this
+                after casting (e.g. 1 / 255 for images stored as bytes).
+        """
+
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+
+    def apply(self, batch, rng):
+        batch = batch.astype(self.dtype)
+        if self.scale is not None:
+            batch *= self.dtype.type(self.scale)
+        return batch
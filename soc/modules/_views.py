@@ -0,0 +1,152 @@
+"""_views.py
+
+Defines lazy, read-only views which combine arrays along their first
+dimension without copying them.
+
+A view only stores how its rows map to rows of the underlying arrays.
+Indexing it gathers just the requested rows, so concatenating or reordering
+multi-gigabyte (or memory-mapped) arrays costs nothing until a batch is read.
+Views support `len`, `shape`, `dtype`, integer and slice indexing, and fancy
+indexing with integer or boolean arrays, which is everything `iterate_data`
+needs. `np.asarray(view)` copies the whole view into memory.
+"""
+
+from __future__ import absolute_import
+
+import numpy as np
+import six
+
+
+def _get_rows(key, num_rows):
+    """Converts an index along the first dimension to an array of rows.
+
+    Returns:
+        tuple (rows, is_scalar), where rows is an int64 Numpy array and
+            is_scalar is True if the key was a single integer.
+
+    Raises:
+        IndexError: if a row is out of bounds.
+    """
+
+    if isinstance(key, slice):
+        return np.arange(num_rows)[key], False
+
+    is_scalar = isinstance(key, six.integer_types + (np.integer,))
+    rows = np.asarray(key)
+    if rows.dtype == np.bool_:
+        if rows.shape != (num_rows,):
+            raise IndexError('Boolean index should have shape (%d,), got %s'
+                             % (num_rows, rows.shape))
+        return np.flatnonzero(rows), False
+
+    rows = rows.astype(np.int64).reshape(-1)
+    if rows.size and (rows.min() < -num_rows or rows.max() >= num_rows):
+        raise IndexError('Index out of bounds for a view with %d rows'
+                         % num_rows)
+    return np.where(rows < 0, rows + num_rows, rows), is_scalar
+
+
+class ArrayView(object):
+    """Base class for views of arrays along their first dimension.
+
+    Subclasses set `shape` and `dtype` and define `_take`.
+    """
+
+    shape = None
+    dtype = None
+
+    def _take(self, rows):
+        """Gathers rows, given as an int64 Numpy array, into a new array."""
+
+        raise NotImplementedError()
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        rest = ()
+        if isinstance(key, tuple):
+            key, rest = key[0], key[1:]
+
+        rows, is_scalar = _get_rows(key, len(self))
+        arr = self._take(rows)
+        if is_scalar:
+            arr = arr[0]
+            return arr[rest] if rest else arr
+        return arr[(slice(None),) + rest] if rest else arr
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self._take(np.arange(len(self)))
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __repr__(self):
+        return '%s(shape=%s, dtype=%s)' % (self.__class__.__name__,
+                                           self.shape, self.dtype)
+
+
+class ConcatArray(ArrayView):
+    """Concatenates arrays (or views) along the first dimension."""
+
+    def __init__(self, arrays):
+        """Creates a ConcatArray object.
+
+        Args:
+            arrays: list of Numpy arrays or views, whose dimensions after the
+                first are the same.
+
+        Raises:
+            ValueError: if the arrays have different shapes.
+        """
+
+        if not arrays:
+            raise ValueError('There should be at least one array to '
+                             'concatenate.')
+
+        row_shapes = set(tuple(a.shape[1:]) for a in arrays)
+        if len(row_shapes) > 1:
+            raise ValueError('Can only concatenate arrays whose rows have the '
+                             'same shape, got %s'
+                             % [tuple(a.shape) for a in arrays])
+
+        self.arrays = list(arrays)
+        self.offsets = np.cumsum([0] + [len(a) for a in arrays])
+        self.shape = (int(self.offsets[-1]),) + row_shapes.pop()
+        self.dtype = np.result_type(*[a.dtype for a in arrays])
+
+    def _take(self, rows):
+        sources = np.searchsorted(self.offsets, rows, side='right') - 1
+        out = np.empty((len(rows),) + self.shape[1:], dtype=self.dtype)
+        for source in np.unique(sources):
+            mask = sources == source
+            out[mask] = self.arrays[source][rows[mask] -
+                                            self.offsets[source]]
+        return out
+
+
+class IndexedArray(ArrayView):
+    """Reorders, repeats or selects the rows of an array (or view)."""
+
+    def __init__(self, array, indices):
+        """Creates an IndexedArray object.
+
+        Args:
+            array: Numpy array or view, the underlying array.
+            indices: 1D integer array, the row of the underlying array that
+                each row of the view maps to.
+
+        Raises:
+            IndexError: if an index is out of bounds.
+        """
+
+        self.array = array
+        self.indices, _ = _get_rows(np.asarray(indices, dtype=np.int64),
+                                    len(array))
+        self.shape = (len(self.indices),) + tuple(array.shape[1:])
+        self.dtype = array.dtype
+
+    def _take(self, rows):
+        return np.asarray(self.array[self.indices[rows]])
@@ -6,16 +6,147 @@ Module for scraping data from AskReddit.
 from __future__ import print_function
 
 from ._base import TextModule
+from ._compose import ArrayModule
+from ._columnar import ColumnarTable, get_default_codec, write_table
+from ._dedup import Deduplicator
+from ._lock import get_temp_path
+from ._search import InvertedIndex, build_index
+from ._stats import format_stats
+from ._views import IndexedArray
 
 import click
+import collections
 import gzip
+import hashlib
+import logging
+import multiprocessing
 import os
 import json
+import shutil
 import time
 import random
 
 from six.moves import cPickle as pkl
-from urllib2 import urlopen
+
+import numpy as np
+
+# Extensions of the pickled format and the columnar format.
+_PICKLE_EXT = '.pkl.gz'
+_TABLE_EXT = '.cols'
+
+# The number of rows a worker encodes at a time.
+_ENCODE_CHUNK_ROWS = 4096
+
+# The frozen encoder of a worker process in the encoding pool.
+_encoder = None
+
+
+def _init_encoder(char_to_idx, level):
+    """Sets up a worker process with a copy of the look-up dict."""
+
+    global _encoder
+    _encoder = TextModule(level=level)
+    _encoder._char_to_idx = char_to_idx
+
+
+def _encode_chunk(args):
+    """Encodes some rows straight into the memory-mapped output arrays."""
+
+    strings, start, max_len, indices_path, lengths_path = args
+    indices, lengths = _encoder.encode_indices(strings, max_len)
+
+    stop = start + len(strings)
+    for path, arr in ((indices_path, indices), (lengths_path, lengths)):
+        out = np.load(path, mmap_mode='r+')
+        out[start:stop] = arr
+        out.flush()
+        del out
+
+    return len(strings)
+
+
+def save_table(fpath, questions, answers, codec=None):
+    """Saves question-answer pairs as a columnar table, atomically.
+
+    Args:
+        fpath: str, the path to the table.
+        questions: list of str, the questions.
+        answers: list of str, the answers.
+        codec: str or None, the codec to compress the table with.
+    """
+
+    columns = collections.OrderedDict([('question', questions),
+                                       ('answer', answers)])
+    tmp_path = get_temp_path(fpath)
+    try:
+        write_table(tmp_path, columns, codec=codec)
+        if os.path.exists(fpath):
+            shutil.rmtree(fpath)
+        os.rename(tmp_path, fpath)
+    finally:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+
+
+def _pair_texts(questions, answers):
+    """Joins questions and answers into the texts that are deduplicated."""
+
+    return [q + '\n' + a for q, a in zip(questions, answers)]
+
+
+def dedup_table(src_path, dst_path, deduplicator=None, codec=None):
+    """Copies a table without its duplicate question-answer pairs.
+
+    The rows are checked a block at a time, so only the deduplicator's
+    fixed-size filters are kept while scanning. The first of each group of
+    duplicates is kept.
+
+    Args:
+        src_path: str, the path to the table to read.
+        dst_path: str, the path to write the new table to. It can be the same
+            as src_path.
+        deduplicator: Deduplicator or None, the filter to use, or None for
+            one with the default parameters, sized for the table.
+        codec: str or None, the codec to compress the new table with.
+
+    Returns:
+        the Deduplicator, which counts the dropped pairs.
+    """
+
+    table = ColumnarTable(src_path)
+    if deduplicator is None:
+        deduplicator = Deduplicator(capacity=max(table.num_rows, 1))
+
+    keep = []
+    for start in range(0, table.num_rows, table.block_rows):
+        rows = slice(start, start + table.block_rows)
+        block = table.read(['question', 'answer'], rows=rows)
+        mask = deduplicator.keep(_pair_texts(block['question'],
+                                             block['answer']))
+        keep.append(np.flatnonzero(mask) + start)
+
+    rows = np.concatenate(keep) if keep else np.zeros((0,), dtype=np.int64)
+    save_table(dst_path,
+               table.read_column('question', rows),
+               table.read_column('answer', rows),
+               codec=codec)
+    return deduplicator
+
+
+def convert_pickle(pkl_path, table_path, codec=None):
+    """Converts a pickled AskReddit dump to a columnar table.
+
+    Only convert files you trust: loading a pickle can run arbitrary code.
+
+    Args:
+        pkl_path: str, the path to the `.pkl.gz` file.
+        table_path: str, the path to the table to write.
+        codec: str or None, the codec to compress the table with.
+    """
+
+    with gzip.open(pkl_path, 'rb') as f:
+        questions, answers = pkl.load(f)
+    save_table(table_path, questions, answers, codec=codec)
 
 
 class AskReddit(TextModule):
@@ -27,39 +158,191 @@ class AskReddit(TextModule):
                  max_answer_len=100,
                  one_hot_input=False,
                  one_hot_output=True,
+                 num_workers=None,
                  **kwargs):
         """Creates an AskReddit Module object.
 
         Args:
+            fname: str, the name of the scraped data, without extension.
             max_question_len: int, the maximum question length, in characters.
             max_answer_len: int, the maximum answer length, in characters.
+            num_workers: int or None, the number of processes to encode the
+                data with, or None for the `num_workers` setting. If more than
+                one, the encoded data is written to memory-mapped arrays in
+                the module cache, so it is only encoded once for each version
+                of the data.
         """
 
         self.max_question_len = max_question_len
         self.max_answer_len = max_answer_len
-        self.fname = fname + '.pkl.gz'
+        self.fname = fname + _PICKLE_EXT
+        self.table_fname = fname + _TABLE_EXT
         self._data = None
+        self._data_path = None
+        self._encoded = None
+        self._pool = None
+        self._pool_vocab_size = None
         self.one_hot_input = one_hot_input
         self.one_hot_output = one_hot_output
 
         kwargs['level'] = 'word'
         super(AskReddit, self).__init__(**kwargs)
 
-    def load_data(self):
-        """Loads the training and testing data."""
+        if num_workers is None:
+            num_workers = self.get_setting('num_workers')
+        self.num_workers = num_workers
+
+    def get_table(self):
+        """Opens the columnar table of question-answer pairs.
+
+        The table can be used to read some of the rows or columns without
+        decompressing the rest of the data.
+
+        Returns:
+            ColumnarTable with 'question' and 'answer' columns.
+        """
+
+        table_path = self.get_path(self.table_fname)
 
-        fpath = self.get_path(self.fname)
+        if not os.path.exists(table_path):
+            raise RuntimeError('No table found at "%s". Use the command-line '
+                               'interface to download data, or to convert '
+                               'an old "%s" file.' % (table_path, _PICKLE_EXT))
 
-        if not os.path.exists(fpath):
+        return ColumnarTable(table_path)
+
+    def _get_data_path(self):
+        """Returns the path to the table, or to the pickle if there is none.
+        """
+
+        table_path = self.get_path(self.table_fname)
+        if os.path.exists(table_path):
+            return table_path
+        elif os.path.exists(self.get_path(self.fname)):
+            return self.get_path(self.fname)
+        else:
             raise RuntimeError('No file found at "%s". Use the command-line '
-                               'interface to download data.' % fpath)
+                               'interface to download data.' % table_path)
+
+    def _get_artifact_name(self, prefix, *params):
+        """Names a cached artifact after a version of the data and params."""
+
+        data_path = self._get_data_path()
+        stat = os.stat(data_path)
+        key = ':'.join(str(p) for p in (data_path, stat.st_size,
+                                        int(stat.st_mtime)) + params)
+        return '%s-%s' % (prefix,
+                          hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    def load_data(self):
+        """Loads the training and testing data."""
 
-        with gzip.open(fpath, 'rb') as f:
-            self._data = pkl.load(f)
+        self._data_path = self._get_data_path()
+
+        if self._data_path.endswith(_TABLE_EXT):
+            table = self.get_table()
+            self._data = [table.read_column('question'),
+                          table.read_column('answer')]
+        else:
+            logging.warning('Loading pickled data from "%s". Run "pysoc '
+                            'ask_reddit convert" to convert it to the faster '
+                            'and safer columnar format.', self._data_path)
+            with gzip.open(self._data_path, 'rb') as f:
+                self._data = pkl.load(f)
 
+        self._encoded = None
         all_text = ' '.join(' '.join(i for i in x) for x in self._data)
         self.update_dicts_with_str(all_text)
 
+    def _get_pool(self):
+        """Gets the encoding pool, whose workers have the current vocabulary.
+
+        The pool is kept between calls, and is only restarted if the
+        vocabulary changed since its workers were started.
+        """
+
+        if self._pool is not None and self._pool_vocab_size != self.num_chars:
+            self.close()
+
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(
+                self.num_workers,
+                initializer=_init_encoder,
+                initargs=(dict(self._char_to_idx), self.level))
+            self._pool_vocab_size = self.num_chars
+
+        return self._pool
+
+    def close(self):
+        """Stops the encoding pool's worker processes, if there are any."""
+
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def encode_parallel(self, strings, max_len, indices_path, lengths_path):
+        """Encodes strings to look-up indices with the encoding pool.
+
+        The strings are split into chunks, and each worker writes the indices
+        of its chunks straight into memory-mapped output files.
+
+        Args:
+            strings: list of str, the strings to encode.
+            max_len: int, maximum length of a string, in tokens.
+            indices_path: str, the `.npy` file to write the indices to.
+            lengths_path: str, the `.npy` file to write the lengths to.
+        """
+
+        indices = np.lib.format.open_memmap(
+            indices_path, mode='w+', dtype=self.get_index_dtype(),
+            shape=(len(strings), max_len))
+        lengths = np.lib.format.open_memmap(
+            lengths_path, mode='w+', dtype=np.int64, shape=(len(strings),))
+        del indices, lengths
+
+        chunks = [(strings[i:i + _ENCODE_CHUNK_ROWS], i, max_len,
+                   indices_path, lengths_path)
+                  for i in range(0, len(strings), _ENCODE_CHUNK_ROWS)]
+        for _ in self._get_pool().imap_unordered(_encode_chunk, chunks):
+            pass
+
+    def _encode_data(self):
+        """Encodes the questions and answers to look-up indices.
+
+        Returns:
+            tuple of ((indices, lengths), (indices, lengths)), for the
+                questions and the answers.
+        """
+
+        questions, answers = self._data
+
+        if self.num_workers <= 1:
+            return (self.encode_indices(questions, self.max_question_len),
+                    self.encode_indices(answers, self.max_answer_len))
+
+        fname = self._get_artifact_name('encoded', self.level, self.num_chars,
+                                        self.max_question_len,
+                                        self.max_answer_len)
+        names = ('questions', 'answers')
+
+        def _build(tmp_path):
+            os.makedirs(tmp_path)
+            for name, strings, max_len in zip(
+                    names, self._data,
+                    (self.max_question_len, self.max_answer_len)):
+                self.encode_parallel(
+                    strings, max_len,
+                    os.path.join(tmp_path, '%s.npy' % name),
+                    os.path.join(tmp_path, '%s_lengths.npy' % name))
+
+        fpath = self.build_cached(fname, _build)
+        return tuple(
+            (np.load(os.path.join(fpath, '%s.npy' % name), mmap_mode='r'),
+             np.load(os.path.join(fpath, '%s_lengths.npy' % name),
+                     mmap_mode='r'))
+            for name in names)
+
     @property
     def train_data(self):
         """Returns the training data, loading it if necessary."""
@@ -67,18 +350,109 @@ class AskReddit(TextModule):
         if self._data is None:
             self.load_data()
 
-        questions, answers = self._data
-        questions = self.encode(questions,
-                                max_len=self.max_question_len,
-                                update_dicts=False,
-                                one_hot=self.one_hot_input)
-        answers = self.encode(answers,
-                              max_len=self.max_answer_len,
-                              update_dicts=False,
-                              one_hot=self.one_hot_output)
+        # The look-up indices only depend on the data, so they are only
+        # computed once; the one-hot encodings are scattered from them.
+        if self._encoded is None:
+            self._encoded = self._encode_data()
+        questions, answers = self._encoded
+
+        questions = self.indices_to_array('questions', *questions,
+                                          one_hot=self.one_hot_input)
+        answers = self.indices_to_array('answers', *answers,
+                                        one_hot=self.one_hot_output)
 
         return [questions], [answers]
 
+    def _iter_documents(self, block_rows=4096):
+        """Yields each question and its answer as one string.
+
+        With a table, the rows are read a block at a time, so the whole
+        dataset is never in memory.
+        """
+
+        if self._data is None and self._get_data_path().endswith(_TABLE_EXT):
+            table = self.get_table()
+            for start in range(0, table.num_rows, block_rows):
+                rows = slice(start, start + block_rows)
+                block = table.read(['question', 'answer'], rows=rows)
+                for question, answer in zip(block['question'],
+                                            block['answer']):
+                    yield question + '\n' + answer
+        else:
+            if self._data is None:
+                self.load_data()
+            for question, answer in zip(*self._data):
+                yield question + '\n' + answer
+
+    def get_index(self):
+        """Gets the inverted index of the data, building it if necessary.
+
+        The index maps each word of a question or its answer to the rows it
+        appears in. It is kept in the module cache, and rebuilt when the data
+        changes.
+
+        Returns:
+            InvertedIndex over the question-answer pairs.
+        """
+
+        fname = self._get_artifact_name('index')
+        fpath = self.build_cached(
+            fname,
+            lambda p: build_index(p, self._iter_documents()))
+        return InvertedIndex(fpath)
+
+    def search(self, query, k=10):
+        """Finds the question-answer pairs which best match a query.
+
+        Only the matching rows are read from the table, so searching doesn't
+        load the dataset.
+
+        Args:
+            query: str, the query. Words are matched case-insensitively, and
+                punctuation is ignored.
+            k: int or None, the number of results, or None for all matches.
+
+        Returns:
+            list of dicts with the 'id' (row), BM25 'score', 'question' and
+                'answer' of each match, best first.
+        """
+
+        results = self.get_index().search(query, k=k)
+        ids = [i for i, _ in results]
+
+        if self._data is None and self._get_data_path().endswith(_TABLE_EXT):
+            rows = self.get_table().read(['question', 'answer'], rows=ids)
+            questions, answers = rows['question'], rows['answer']
+        else:
+            if self._data is None:
+                self.load_data()
+            questions = [self._data[0][i] for i in ids]
+            answers = [self._data[1][i] for i in ids]
+
+        return [{'id': i, 'score': score, 'question': q, 'answer': a}
+                for (i, score), q, a in zip(results, questions, answers)]
+
+    def subset(self, query, k=None):
+        """Gets the pairs which match a query, as a training dataset.
+
+        Args:
+            query: str, the query.
+            k: int or None, the number of best matches to keep, or None for
+                all matches.
+
+        Returns:
+            ArrayModule whose training data are views of the encoded matches,
+                in the order of the rows.
+        """
+
+        ids = sorted(i for i, _ in self.get_index().search(query, k=k))
+        if not ids:
+            raise ValueError('No question-answer pairs match "%s"' % query)
+
+        x_data, y_data = self.train_data
+        return ArrayModule([IndexedArray(x, ids) for x in x_data],
+                           [IndexedArray(y, ids) for y in y_data])
+
     @property
     def input_shape(self):
         """Gets the input shape as a list of tuples."""
@@ -106,19 +480,21 @@ def ask_reddit():
 @ask_reddit.command()
 @click.option('--fname', default='ask_reddit')
 @click.option('--num_results', default=1000)
-@click.option('--override', default=False)
+@click.option('--override/--no_override', default=False)
 @click.option('--num_comments', default=5)
 @click.option('--time_filter',
               type=click.Choice(['hour', 'day', 'week',
                                  'month', 'year', 'all']),
               default='all')
 @click.option('--wait_time', default=0.5)
+@click.option('--dedup/--no_dedup', default=True)
 def download(fname,
              num_results,
              override,
              num_comments,
              time_filter,
-             wait_time):
+             wait_time,
+             dedup):
 
     # Uses the Reddit API wrapper.
     import praw
@@ -127,16 +503,19 @@ def download(fname,
     reddit = praw.Reddit()
 
     # Gets the save path.
-    fname = fname + '.pkl.gz'
-    fpath = AskReddit().get_path(fname)
+    fpath = AskReddit().get_path(fname + _TABLE_EXT)
 
-    if override and os.path.exists(fpath):
+    if not override and os.path.exists(fpath):
         raise ValueError('A file already exists at "%s". Use the --override '
-                         'flag to get rid of it, or use a different file name.')
+                         'flag to get rid of it, or use a different file name.'
+                         % fpath)
 
     questions = []
     answers = []
 
+    # Duplicates don't count towards the number of results.
+    deduplicator = Deduplicator(capacity=num_results) if dedup else None
+
     bar = click.progressbar(length=num_results, label='ask_reddit')
 
     num_parsed = 0
@@ -150,21 +529,67 @@ def download(fname,
         if not title.endswith('?'):
             continue
 
-        for comment in submission.comments[:num_comments]:
-            questions.append(title)
-            answers.append(comment.body)
-            num_parsed += 1
-            bar.update(num_parsed)
+        bodies = [c.body for c in submission.comments[:num_comments]]
+        if deduplicator is not None:
+            keep = deduplicator.keep(_pair_texts([title] * len(bodies),
+                                                 bodies))
+            bodies = [b for b, k in zip(bodies, keep) if k]
 
-            if num_parsed >= num_results:
-                break
+        for body in bodies[:num_results - num_parsed]:
+            questions.append(title)
+            answers.append(body)
+        bar.update(len(questions) - num_parsed)
+        num_parsed = len(questions)
 
     bar.finish()
 
+    if deduplicator is not None:
+        click.echo(deduplicator.summary())
+
     # Saves the output.
     click.echo('Saving to "%s"' % fpath)
-    with gzip.open(fpath, 'wb') as f:
-        pkl.dump([questions, answers], f)
+    save_table(fpath, questions, answers)
+    click.echo('Indexing')
+    AskReddit(fname=fname).get_index()
+    click.echo('Done')
+
+
+@ask_reddit.command()
+@click.option('--fname', default='ask_reddit')
+@click.option('--codec', default=None, type=click.Choice(['zstd', 'lz4',
+                                                          'zlib']))
+def convert(fname, codec):
+    """Converts a pickled dump to the columnar format."""
+
+    module = AskReddit(fname=fname)
+    pkl_path = module.get_path(module.fname)
+    table_path = module.get_path(module.table_fname)
+
+    click.echo('Converting "%s" to "%s" (%s)'
+               % (pkl_path, table_path, codec or get_default_codec()))
+    convert_pickle(pkl_path, table_path, codec=codec)
+    module.get_index()
+    click.echo('Done')
+
+
+@ask_reddit.command()
+@click.option('--fname', default='ask_reddit')
+@click.option('--near/--exact', default=True,
+              help='Whether to drop near-duplicates, or only exact ones.')
+@click.option('--num_perm', default=64)
+@click.option('--num_bands', default=8)
+def dedup(fname, near, num_perm, num_bands):
+    """Removes duplicate question-answer pairs from the table."""
+
+    module = AskReddit(fname=fname)
+    table_path = module.get_path(module.table_fname)
+    deduplicator = Deduplicator(num_perm=num_perm,
+                                num_bands=num_bands,
+                                capacity=max(len(module.get_table()), 1),
+                                near=near)
+    dedup_table(table_path, table_path, deduplicator)
+    click.echo(deduplicator.summary())
+    module.get_index()
     click.echo('Done')
 
 
@@ -183,3 +608,31 @@ def shape(max_question_len,
                   one_hot_output=one_hot_output)
     click.echo('Input shape: %s -- Output shape: %s'
                % (n.input_shape, n.output_shape))
+
+
+@ask_reddit.command()
+@click.option('--fname', default='ask_reddit')
+@click.option('--max_question_len', default=100)
+@click.option('--max_answer_len', default=100)
+@click.option('--refresh/--no_refresh', default=False)
+def stats(fname, max_question_len, max_answer_len, refresh):
+    n = AskReddit(fname=fname,
+                  max_question_len=max_question_len,
+                  max_answer_len=max_answer_len,
+                  one_hot_output=False)
+    report = n.stats(refresh=refresh)
+    labels = {'token_counts': lambda i: n.decode(i, argmax=False)}
+    click.echo(format_stats(report, labels))
+
+
+@ask_reddit.command()
+@click.argument('query')
+@click.option('--fname', default='ask_reddit')
+@click.option('-k', '--num_results', default=10)
+def search(query, fname, num_results):
+    """Finds question-answer pairs matching a query."""
+
+    for result in AskReddit(fname=fname).search(query, k=num_results):
+        click.echo('[%d] %.3f  %s' % (result['id'], result['score'],
+                                       result['question']))
+        click.echo('    %s' % result['answer'].replace('\n', ' ')[:200])
@@ -6,6 +6,8 @@ Module for dealing with MNIST data.
 from __future__ import absolute_import
 
 from ._base import Module
+from ._sources import register_source
+from ._stats import Histogram, format_stats
 
 from six.moves import cPickle as pkl
 import gzip
@@ -15,6 +17,7 @@ import numpy as np
 
 # Where the MNIST data is hosted.
 _MNIST_URL = 'https://s3.amazonaws.com/img-datasets/mnist.pkl.gz'
+register_source('mnist', 'mnist.pkl.gz', _MNIST_URL)
 
 
 class MNIST(Module):
@@ -25,10 +28,23 @@ class MNIST(Module):
 
     def __init__(self,
                  one_hot_output=True,
-                 file_name='mnist'):
+                 file_name='mnist',
+                 transform=None):
+        """Creates an MNIST Module object.
+
+        Args:
+            one_hot_output: bool, whether or not to use one-hot encoding on
+                the outputs.
+            file_name: str, the name of the cached file, without extension.
+            transform: a transform from `_transforms.py` (for example, a
+                Compose of random shifts and rotations), applied to each
+                batch of images from `iterate_data`.
+        """
+
         self._data = None
         self.one_hot_output = one_hot_output
         self._file_name = '%s.pkl.gz' % file_name
+        self.transform = transform
         super(MNIST, self).__init__()
 
     def load_data(self):
@@ -51,7 +67,7 @@ class MNIST(Module):
         x_train, y_train = self._data[0]
 
         if self.one_hot_output:
-            y_train = np.eye(10)[y_train]
+            y_train = np.eye(10, dtype=self.get_setting('dtype'))[y_train]
         else:
             y_train = np.expand_dims(y_train, -1)
 
@@ -66,7 +82,7 @@ class MNIST(Module):
         x_test, y_test = self._data[1]
 
         if self.one_hot_output:
-            y_test = np.eye(10)[y_test]
+            y_test = np.eye(10, dtype=self.get_setting('dtype'))[y_test]
         else:
             y_test = np.expand_dims(y_test, -1)
 
@@ -87,6 +103,18 @@ class MNIST(Module):
         else:
             return [(1,)]
 
+    def _get_stats_accumulators(self, x_data, y_data):
+        """Adds the number of samples of each class."""
+
+        accumulators = super(MNIST, self)._get_stats_accumulators(x_data,
+                                                                  y_data)
+        if self.one_hot_output:
+            labels = lambda x, y: y[0].argmax(axis=-1)
+        else:
+            labels = lambda x, y: y[0][:, 0]
+        accumulators['class_counts'] = (Histogram(), labels)
+        return accumulators
+
     def visualize(self, width=3, height=2):
         """Produces a visualization of the MNIST data.
 
@@ -128,3 +156,11 @@ def shape(one_hot_output):
     m = MNIST(one_hot_output=one_hot_output)
     click.echo('Input shape: %s -- Output shape: %s'
                % (m.input_shape, m.output_shape))
+
+
+@mnist.command()
+@click.option('--mode', default='train', type=click.Choice(['train', 'test']))
+@click.option('--refresh/--no_refresh', default=False)
+def stats(mode, refresh):
+    report = MNIST().stats(mode=mode, refresh=refresh)
+    click.echo(format_stats(report))
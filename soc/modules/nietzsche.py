@@ -5,12 +5,21 @@ Module for dealing with the Nietzsche text dataset.
 
 from __future__ import print_function
 
+import hashlib
+import os
+
+import numpy as np
+
 from ._base import TextModule
+from ._corpus import TextCorpus
+from ._sources import register_source
+from ._stats import format_stats
 
 import click
 
 # Where the Nietche data is hosted.
 _NIETZSCHE_URL = 'https://s3.amazonaws.com/text-datasets/nietzsche.txt'
+register_source('nietzsche', 'nietzsche.txt', _NIETZSCHE_URL)
 
 
 class Nietzsche(TextModule):
@@ -24,6 +33,9 @@ class Nietzsche(TextModule):
                  one_hot_input=False,
                  one_hot_output=True,
                  fname='nietzsche.txt',
+                 streaming=False,
+                 num_next=1,
+                 seq2seq=False,
                  **kwargs):
         """Creates a Nietzsche Module object.
 
@@ -31,83 +43,142 @@ class Nietzsche(TextModule):
             sample_len: int, the length of samples to draw from the module.
             num_samples: int, the number of samples to load into memory at once.
             num_test: int, number of test samples.
-            include_next: bool, if set, y_data is character right after the
-                last character in x_data.
+            include_next: bool, if set, y_data is the num_next characters right
+                after the last character in x_data.
             one_hot_input: bool, whether or not to use one-hot encoding on the
                 inputs.
             one_hot_output: bool, whether or not to use one-hot encoding on the
                 outputs.
+            fname: str, the name of the text file.
+            streaming: bool, if set, the text file is memory-mapped instead of
+                being read into memory, for corpora which are larger than RAM.
+                It must be UTF-8 encoded. Its encoding is cached on disk.
+            num_next: int, the number of characters to predict if
+                include_next is set.
+            seq2seq: bool, if set, y_data is x_data shifted by one character,
+                so there is a target for every input character. This takes
+                precedence over include_next.
         """
 
         self.sample_len = sample_len
         self.num_samples = num_samples
-        self.num_test = 100
+        self.num_test = num_test
         self.include_next = include_next
         self.one_hot_input = one_hot_input
         self.one_hot_output = one_hot_output
         self.fname = fname
-        self._text = None
+        self.streaming = streaming
+        self.num_next = num_next
+        self.seq2seq = seq2seq
+        self._encoded = None
         super(Nietzsche, self).__init__(**kwargs)
 
+    @property
+    def _target_len(self):
+        """The number of target tokens for each sample, or 0 for none."""
+
+        if self.seq2seq:
+            return self.sample_len
+        elif self.include_next:
+            return self.num_next
+        else:
+            return 0
+
+    @property
+    def _window(self):
+        """The number of consecutive tokens an input and its target span."""
+
+        if self.seq2seq:
+            return self.sample_len + 1
+        return self.sample_len + self._target_len
+
+    def _get_encoded_corpus(self, corpus):
+        """Memory-maps the cached encoding of a corpus, building it if needed.
+
+        The cached file is named after the corpus' byte range, its size and
+        modification time, and the vocabulary, so editing the text file or
+        changing the tokenizer builds a new one.
+        """
+
+        stat = os.stat(corpus.fpath)
+        key = '%s:%d:%d:%d:%d:%s:%d' % (self.fname, corpus.start, corpus.end,
+                                         stat.st_size, int(stat.st_mtime),
+                                         self.level, self.num_chars)
+        dtype = self.get_index_dtype()
+        fname = '%s-%s.%s' % (self.fname,
+                              hashlib.md5(key.encode('utf-8')).hexdigest(),
+                              dtype.name)
+
+        fpath = self.build_cached(
+            fname, lambda p: self.encode_corpus(corpus, p))
+        if not os.path.getsize(fpath):
+            return np.zeros((0,), dtype=dtype)
+        return np.memmap(fpath, dtype=dtype, mode='r')
+
     def load_data(self):
-        """Loads the training and testing data."""
+        """Loads the training and testing data.
+
+        The text is encoded to look-up indices once, so that drawing samples
+        and their targets is a single gather from the encoded text.
+        """
 
         nietzsche_path = self.get_file(self.fname,
                                        _NIETZSCHE_URL,
                                        use_bar=True,
                                        download=False)
 
-        with open(nietzsche_path, 'r') as f:
-            text = f.read()
+        cut_idx = self.num_test + self._window
+
+        if self.streaming:
+            corpus = TextCorpus(nietzsche_path)
+            self.update_dicts_with_corpus(corpus)
+            test_text, train_text = corpus.split(cut_idx)
+            encode = self._get_encoded_corpus
+        else:
+            with open(nietzsche_path, 'r') as f:
+                text = f.read()
 
-        # Add all the characters to the dictionary.
-        for c in set(text):
-            self.update_dicts(c)
+            # Add all the characters to the dictionary.
+            self.update_dicts_with_str(text)
 
-        cut_idx = self.num_test + self.sample_len
-        self._text = (text[:cut_idx], text[cut_idx:])
+            test_text, train_text = text[:cut_idx], text[cut_idx:]
+            encode = self.encode_text
 
-    def _process_text(self, text):
+        self._encoded = (encode(train_text), encode(test_text))
+
+    def _process_text(self, indices, split):
         """Convenience method for train_data and test_data."""
 
-        data = TextModule.get_string_samples(text,
-                                             self.sample_len,
-                                             self.num_samples,
-                                             include_next=self.include_next)
-
-        if self.include_next:
-            x_train, y_train = data
-            x_train = self.encode(x_train,
-                                  max_len=self.sample_len,
-                                  update_dicts=False,
-                                  one_hot=self.one_hot_input)
-            y_train = self.encode(y_train,
-                                  max_len=1,
-                                  update_dicts=False,
-                                  one_hot=self.one_hot_output)
-            return [x_train], [y_train]
-        else:
-            x_train = self.encode(x_train,
-                                  max_len=self.sample_len,
-                                  update_dicts=False,
-                                  one_hot=self.one_hot_input)
+        windows = TextModule.get_index_windows(indices,
+                                               self._window,
+                                               self.num_samples)
+        x_idxs = windows[:, :self.sample_len]
+        x_train = self.indices_to_array('%s_x' % split, x_idxs, None,
+                                        one_hot=self.one_hot_input)
+
+        if not self._target_len:
             return [x_train], []
 
+        y_idxs = windows[:, -self._target_len:]
+        y_train = self.indices_to_array('%s_y' % split, y_idxs, None,
+                                        one_hot=self.one_hot_output)
+        return [x_train], [y_train]
+
     @property
     def train_data(self):
         """Returns the training data, loading it if necessary."""
 
-        if self._text is None:
+        if self._encoded is None:
             self.load_data()
-        return self._process_text(self._text[0])
+        return self._process_text(self._encoded[0], 'train')
 
     @property
     def test_data(self):
         """Returns the testing data, loading it if necessary."""
 
-        if self._text is None:
+        if self._encoded is None:
             self.load_data()
-        return self._process_text(self._text[1])
+        return self._process_text(self._encoded[1], 'test')
 
     @property
     def input_shape(self):
@@ -122,11 +193,11 @@ class Nietzsche(TextModule):
     def output_shape(self):
         """Gets the output shape as a list of tuples."""
 
-        if self.include_next:
+        if self._target_len:
             if self.one_hot_output:
-                return [(1, self.num_chars)]
+                return [(self._target_len, self.num_chars)]
             else:
-                return [(1,)]
+                return [(self._target_len,)]
         else:
             return [()]
 
@@ -150,11 +221,30 @@ def download(fname):
 @click.option('--one_hot_input/--no_one_hot_input', default=False)
 @click.option('--one_hot_output/--no_one_hot_output', default=True)
 @click.option('--include_next/--no_include_next', default=True)
-def shape(sample_len, one_hot_input, one_hot_output, include_next):
+@click.option('--num_next', default=1)
+@click.option('--seq2seq/--no_seq2seq', default=False)
+def shape(sample_len, one_hot_input, one_hot_output, include_next, num_next,
+          seq2seq):
     n = Nietzsche(sample_len=sample_len,
                   num_samples=1,
                   one_hot_input=one_hot_input,
                   one_hot_output=one_hot_output,
-                  include_next=include_next)
+                  include_next=include_next,
+                  num_next=num_next,
+                  seq2seq=seq2seq)
     click.echo('Input shape: %s -- Output shape: %s'
                % (n.input_shape, n.output_shape))
+
+
+@nietzsche.command()
+@click.option('--sample_len', default=100)
+@click.option('--num_samples', default=10000)
+@click.option('--mode', default='train', type=click.Choice(['train', 'test']))
+@click.option('--refresh/--no_refresh', default=False)
+def stats(sample_len, num_samples, mode, refresh):
+    n = Nietzsche(sample_len=sample_len,
+                  num_samples=num_samples,
+                  one_hot_output=False)
+    report = n.stats(mode=mode, refresh=refresh)
+    labels = {'token_counts': lambda i: n.decode(i, argmax=False)}
+    click.echo(format_stats(report, labels))
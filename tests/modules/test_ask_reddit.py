@@ -1,10 +1,17 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import gzip
 import os
 import pytest
 
+from six.moves import cPickle as pkl
+
+import numpy as np
+
 from soc.modules import AskReddit
+from soc.modules import Deduplicator
+from soc.modules.ask_reddit import convert_pickle, dedup_table, save_table
 ask_reddit = AskReddit(max_question_len=100,
                        max_answer_len=100)
 
@@ -13,5 +20,86 @@ def test_shape():
     assert ask_reddit.shape == ([(100,)], [(100, 1)])
 
 
+def test_convert_pickle():
+    module = AskReddit(fname='test_convert', one_hot_output=False)
+    pkl_path = module.get_path(module.fname)
+    questions = ['What is up?', 'Why is the sky blue?']
+    answers = ['The sky', 'Rayleigh scattering']
+    with gzip.open(pkl_path, 'wb') as f:
+        pkl.dump([questions, answers], f)
+
+    convert_pickle(pkl_path, module.get_path(module.table_fname))
+    os.remove(pkl_path)
+
+    assert module.get_table().read_column('answer', [1]) == answers[1:]
+    (x_data,), (y_data,) = module.train_data
+    assert x_data.shape == (2, 100)
+    assert module.decode(y_data, argmax=False) == ['The sky',
+                                                    'Rayleigh scattering']
+
+
+def test_encode_parallel():
+    questions = ['What is up %d?' % i for i in range(300)]
+    answers = ['Not much %d' % i for i in range(300)]
+    module = AskReddit(fname='test_parallel', num_workers=2)
+    save_table(module.get_path(module.table_fname), questions, answers)
+
+    serial = AskReddit(fname='test_parallel')
+    try:
+        (x_data,), (y_data,) = module.train_data
+        (x_serial,), (y_serial,) = serial.train_data
+        np.testing.assert_array_equal(x_data, x_serial)
+        np.testing.assert_array_equal(y_data, y_serial)
+    finally:
+        module.close()
+
+
+def test_search():
+    questions = ['What is your favorite book?',
+                 'Which city would you live in?',
+                 'What is the best pizza topping?']
+    answers = ['A book about books.',
+               'Paris, for the bakeries.',
+               'Mushrooms on pizza.']
+    module = AskReddit(fname='test_search', one_hot_output=False)
+    save_table(module.get_path(module.table_fname), questions, answers)
+
+    results = module.search('Books', k=2)
+    assert len(results) == 1
+    assert results[0]['id'] == 0
+    assert results[0]['answer'] == answers[0]
+
+    results = module.search('pizza city?', k=1)
+    assert [r['id'] for r in results] == [2]
+    assert module.search('spaceships') == []
+
+    subset = module.subset('pizza city')
+    (x_data,), (y_data,) = subset.train_data
+    (x_full,), _ = module.train_data
+    assert len(x_data) == 2
+    np.testing.assert_array_equal(np.asarray(x_data), x_full[[1, 2]])
+
+
+def test_dedup():
+    answer = ('Honestly, the best thing I ever did was learn to cook a few '
+              'simple meals at home.')
+    questions = ['What was your best decision?'] * 4 + ['Any life tips?']
+    answers = [answer, answer, answer.replace('few', 'couple of'),
+               'Moving to a new city.', answer]
+    module = AskReddit(fname='test_dedup')
+    table_path = module.get_path(module.table_fname)
+    save_table(table_path, questions, answers)
+
+    deduplicator = dedup_table(table_path, table_path,
+                               Deduplicator(capacity=100))
+    assert (deduplicator.num_seen, deduplicator.num_exact,
+            deduplicator.num_near) == (5, 1, 2)
+    assert module.get_table().read_column('answer') == [answers[0],
+                                                        answers[3]]
+
+    exact = Deduplicator(near=False)
+    assert exact.keep(answers).tolist() == [True, False, True, True, False]
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
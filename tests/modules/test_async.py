@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+
+import pytest
+
+import numpy as np
+
+import soc.modules._base as base
+
+asyncio = pytest.importorskip('asyncio')
+
+
+class AsyncModule(base.Module):
+    """Small in-memory module for testing the asynchronous API."""
+
+    def __init__(self):
+        self._data = None
+        super(AsyncModule, self).__init__()
+
+    def load_data(self):
+        self._data = np.arange(20)
+
+    @property
+    def train_data(self):
+        if self._data is None:
+            self.load_data()
+        return [self._data.reshape(-1, 1)], [self._data]
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def test_aload(loop):
+    module = AsyncModule()
+    loop.run_until_complete(module.aload())
+    assert module._data is not None
+
+
+def test_aiterate_data(loop):
+    iterator = AsyncModule().aiterate_data(5, randomize=False)
+    batches = [loop.run_until_complete(iterator.__anext__())
+               for _ in range(4)]
+    iterator.close()
+    seen = sorted(int(i) for _, (y,) in batches for i in y)
+    assert seen == list(range(20))
+
+
+def test_aiterate_data_stops(loop):
+    iterator = base.AsyncIterator(iter([1, 2]))
+    assert loop.run_until_complete(iterator.__anext__()) == 1
+    assert loop.run_until_complete(iterator.__anext__()) == 2
+    with pytest.raises(StopAsyncIteration):
+        loop.run_until_complete(iterator.__anext__())
+
+
+def test_aget_files(loop, tmpdir):
+    files = []
+    for i in range(3):
+        source = tmpdir.join('source%d.txt' % i)
+        source.write('file %d' % i)
+        files.append(('async%d.txt' % i, 'file://%s' % source))
+
+    paths = loop.run_until_complete(
+        AsyncModule().aget_files(files, download=True))
+    assert [open(p).read() for p in paths] == ['file 0', 'file 1', 'file 2']
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
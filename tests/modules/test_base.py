@@ -1,13 +1,53 @@
 from __future__ import absolute_import
 
+import multiprocessing
 import os
 import pytest
+import time
+
+import numpy as np
 
 import soc.modules._base as base
+from soc.modules import ArrayModule
+from soc.modules._views import IndexedArray
 
 module = base.Module()
 
 
+class RangeModule(base.Module):
+    """Module whose samples are their own indices."""
+
+    def __init__(self, num_samples=103):
+        self.num_samples = num_samples
+        super(RangeModule, self).__init__()
+
+    @property
+    def train_data(self):
+        idxs = np.arange(self.num_samples)
+        return [idxs.reshape(-1, 1)], [idxs]
+
+
+def _read_shard(args):
+    shard_index, num_shards, contiguous_shards = args
+    iterator = RangeModule().iterate_data(batch_size=5,
+                                          seed=1337,
+                                          num_shards=num_shards,
+                                          shard_index=shard_index,
+                                          contiguous_shards=contiguous_shards)
+    num_batches = len(base.Module.get_epoch_batches(
+        103, 5, seed=1337, num_shards=num_shards, shard_index=shard_index,
+        contiguous_shards=contiguous_shards))
+
+    # Reads two epochs.
+    epochs = [[], []]
+    for epoch in epochs:
+        for _ in range(num_batches):
+            x_data, y_data = next(iterator)
+            assert (x_data[0][:, 0] == y_data[0]).all()
+            epoch.extend(int(i) for i in y_data[0])
+    return epochs
+
+
 def test_get_path():
     fname = 'test.ext'
     fpath = module.get_path(fname)
@@ -34,5 +74,263 @@ def test_get_file():
     assert fpath.endswith('module')
 
 
+@pytest.mark.parametrize('contiguous_shards', [False, True])
+def test_sharded_iteration(contiguous_shards):
+    num_shards = 4
+    pool = multiprocessing.Pool(num_shards)
+    try:
+        results = pool.map(_read_shard, [(i, num_shards, contiguous_shards)
+                                         for i in range(num_shards)])
+    finally:
+        pool.close()
+        pool.join()
+
+    for epoch in range(2):
+        seen = [i for shard in results for i in shard[epoch]]
+
+        # 103 samples are split into 4 shards of 5 batches of 5 samples.
+        assert len(seen) == 100
+        assert len(set(seen)) == 100
+
+    # The epochs are shuffled differently.
+    assert results[0][0] != results[0][1]
+
+
+def test_epoch_batches_need_seed():
+    with pytest.raises(ValueError):
+        base.Module.get_epoch_batches(100, 5, num_shards=2, shard_index=1)
+
+
+def test_iterate_data_in_order():
+    iterator = RangeModule(num_samples=10).iterate_data(batch_size=5,
+                                                        randomize=False)
+    batches = [next(iterator)[1][0].tolist() for _ in range(3)]
+    assert batches == [list(range(5)), list(range(5, 10)), list(range(5))]
+
+
+class CountingModule(base.Module):
+    """Module which records each download and build in a log file."""
+
+    def _log(self, event):
+        with open(self.get_path('events.log'), 'a') as f:
+            f.write('%s %d\n' % (event, os.getpid()))
+
+        # Gives the other processes time to pile up on the lock.
+        time.sleep(0.2)
+
+    def _download(self, url, fpath, use_bar=True):
+        self._log('download')
+        super(CountingModule, self)._download(url, fpath, use_bar=use_bar)
+
+
+def _get_file(url):
+    fpath = CountingModule().get_file('downloaded.txt', url, use_bar=False)
+    with open(fpath) as f:
+        return f.read()
+
+
+def _build_cached(_):
+    module = CountingModule()
+
+    def _build(fpath):
+        module._log('build')
+        with open(fpath, 'w') as f:
+            f.write('built')
+
+    with open(module.build_cached('built.txt', _build)) as f:
+        return f.read()
+
+
+@pytest.fixture
+def counting_module():
+    module = CountingModule()
+    for fname in ('events.log', 'downloaded.txt'):
+        if os.path.exists(module.get_path(fname)):
+            os.remove(module.get_path(fname))
+    if os.path.exists(module.get_cache_path('built.txt')):
+        os.remove(module.get_cache_path('built.txt'))
+    return module
+
+
+def _get_events(module):
+    with open(module.get_path('events.log')) as f:
+        return [line.split()[0] for line in f]
+
+
+def test_get_file_downloads_once(counting_module, tmpdir):
+    source = tmpdir.join('source.txt')
+    source.write('hello world')
+
+    pool = multiprocessing.Pool(4)
+    try:
+        results = pool.map(_get_file, ['file://%s' % source] * 4)
+    finally:
+        pool.close()
+        pool.join()
+
+    assert results == ['hello world'] * 4
+    assert _get_events(counting_module) == ['download']
+    assert not [f for f in os.listdir(counting_module.data_subdir)
+                if '.tmp-' in f]
+
+
+def test_build_cached_builds_once(counting_module):
+    pool = multiprocessing.Pool(4)
+    try:
+        results = pool.map(_build_cached, range(4))
+    finally:
+        pool.close()
+        pool.join()
+
+    assert results == ['built'] * 4
+    assert _get_events(counting_module) == ['build']
+
+
+@pytest.mark.parametrize('transform_in_workers', [False, True])
+def test_prefetch(transform_in_workers):
+    module = RangeModule()
+    module.transform = lambda x, rng, training: x * 2
+
+    serial = module.iterate_data(batch_size=5, seed=3)
+    prefetched = module.iterate_data(batch_size=5,
+                                     seed=3,
+                                     prefetch=2,
+                                     num_workers=3,
+                                     transform_in_workers=transform_in_workers)
+    for _ in range(50):
+        (x_a,), (y_a,) = next(serial)
+        (x_b,), (y_b,) = next(prefetched)
+        np.testing.assert_array_equal(y_a, y_b)
+        np.testing.assert_array_equal(x_b[:, 0], y_b * 2)
+    prefetched.close()
+
+
+def test_prefetch_errors():
+    iterator = RangeModule(num_samples=3).iterate_data(batch_size=5,
+                                                       prefetch=2)
+    with pytest.raises(ValueError):
+        next(iterator)
+
+
+def test_one_hot_encode():
+    text_module = base.TextModule(reuse_buffers=True)
+    strings = ['abc', 'ba', '', 'cabbage']
+    text_module.encode(strings, 4, update_dicts=True)
+
+    # Compares against encoding one character at a time.
+    eye = np.eye(text_module.num_chars)
+    expected = np.zeros((len(strings), 4, text_module.num_chars))
+    for i, string in enumerate(strings):
+        for j, c in enumerate(string[:4]):
+            expected[i, j] = eye[text_module.encode(c, 1)[0].astype(int)]
+
+    arr = text_module.encode(strings, 4, one_hot=True)
+    np.testing.assert_array_equal(arr, expected)
+    np.testing.assert_array_equal(
+        text_module.encode('ba', 4, one_hot=True), expected[1])
+
+    indices, lengths = text_module.encode_indices(strings, 4)
+    out = text_module.get_buffer('test', arr.shape)
+    assert text_module.one_hot(indices, lengths, out=out) is out
+    assert text_module.get_buffer('test', arr.shape) is out
+    np.testing.assert_array_equal(out, expected)
+
+    with pytest.raises(ValueError):
+        text_module.one_hot(indices, lengths, out=out[:, :2])
+
+
+def test_stats():
+    module = RangeModule(num_samples=1000)
+    report = module.stats(batch_size=64, refresh=True)
+    stats = report['stats']
+    assert report['num_samples'] == 1000
+    assert np.isclose(stats['input_0']['mean'], np.arange(1000).mean())
+    assert np.isclose(stats['output_0']['std'], np.arange(1000).std())
+    assert stats['output_0']['max'] == 999
+
+    # The second call reads the cached report.
+    module.compute_stats = None
+    assert module.stats() == report
+
+
+def test_text_stats():
+    class StringsModule(base.TextModule):
+        @property
+        def train_data(self):
+            strings = ['abc', 'ba', '', 'cabbage']
+            x = self.encode(strings, 4, update_dicts=True)
+            return [x], [self.encode(strings, 4, one_hot=True)]
+
+    stats = StringsModule().compute_stats(batch_size=3)['stats']
+    assert stats['input_0_lengths']['counts'] == [1, 0, 1, 1, 1]
+    assert stats['output_0_lengths'] == stats['input_0_lengths']
+    assert stats['token_counts']['total'] == 2 * (3 + 2 + 4)
+
+
+def test_as_sequence():
+    module = RangeModule()
+    module.transform = lambda x, rng, training: x + rng.randint(2)
+    sequence = module.as_sequence(batch_size=10, seed=7)
+    assert len(sequence) == 10
+
+    # Batches can be computed in any order, and always come out the same.
+    batches = [sequence[i] for i in reversed(range(len(sequence)))][::-1]
+    for i, (x_batch, y_batch) in enumerate(batches):
+        np.testing.assert_array_equal(sequence[i][0][0], x_batch[0])
+    seen = np.concatenate([y for _, (y,) in batches])
+    assert len(set(seen)) == 100
+
+    first = [y for _, (y,) in sequence]
+    sequence.on_epoch_end()
+    assert sequence.epoch == 1
+    assert any((a != b).any() for a, (_, (b,)) in zip(first, sequence))
+
+
+def test_export():
+    x = np.arange(12, dtype=np.float32).reshape(6, 2)
+    y = np.arange(6)
+    module = ArrayModule([x], [y])
+
+    (x_view,), (y_view,) = module.export_data(format='memoryview')
+    assert x_view.shape == (6, 2) and x_view.format == 'f'
+    x[0, 0] = 100
+    assert np.asarray(x_view)[0, 0] == 100
+
+    # Lazy views have no buffer to share.
+    lazy = ArrayModule([IndexedArray(x, [1, 0])], [y[:2]])
+    with pytest.raises(ValueError):
+        lazy.export_data(format='memoryview')
+    (x_view,), _ = lazy.export_data(format='memoryview', copy=None)
+    np.testing.assert_array_equal(np.asarray(x_view), x[[1, 0]])
+
+    iterator = module.iterate_export(3, format='memoryview', prefetch=0)
+    (x_batch,), (y_batch,) = next(iterator)
+    assert len(x_batch) == len(y_batch) == 3
+
+    if hasattr(np.ndarray, '__dlpack__'):
+        x.flags.writeable = False
+        (capsule,), _ = module.export_data(format='dlpack', copy=None)
+        assert type(capsule).__name__ == 'PyCapsule'
+
+
+def test_export_arrow():
+    pa = pytest.importorskip('pyarrow')
+    x = np.arange(24, dtype=np.int32).reshape(4, 3, 2)
+    y = np.array([True, False, True, True])
+    module = ArrayModule([x], [y])
+
+    with pytest.raises(ValueError):
+        module.export_data(format='arrow')
+    batch = module.export_data(format='arrow', copy=None)
+    assert batch.schema.names == ['x0', 'y0']
+    assert batch.num_rows == 4
+    assert batch.column(0)[1].as_py() == x[1].tolist()
+    assert batch.column(1).to_pylist() == y.tolist()
+
+    values = batch.column(0).flatten().flatten()
+    assert values.buffers()[1].address == x.ctypes.data
+    assert isinstance(values, pa.Int32Array)
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import pytest
+
+from click.testing import CliRunner
+
+import soc.modules._base as base
+import soc.modules._cache as cache
+
+
+class CacheModule(base.Module):
+    """Module with some raw and derived files for testing the cache."""
+
+
+@pytest.fixture
+def module():
+    module = CacheModule()
+    for fname in os.listdir(module.data_subdir):
+        path = os.path.join(module.data_subdir, fname)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    def _write(fpath, last_access):
+        with open(fpath, 'wb') as f:
+            f.write(b'x' * 100)
+        os.utime(fpath, (last_access, last_access))
+
+    _write(module.get_path('raw.bin'), 0)
+    for i, fname in enumerate(['old.npy', 'new.npy', 'newest.npy']):
+        _write(module.get_cache_path(fname), 1000 * (i + 1))
+    return module
+
+
+def test_list_entries(module):
+    entries = cache.list_entries('cachemodule')
+    assert [e.name for e in entries] == ['raw.bin', 'old.npy', 'new.npy',
+                                         'newest.npy']
+    assert [e.pinned for e in entries] == [True, False, False, False]
+    assert all(e.size == 100 for e in entries)
+
+
+def test_prune(module):
+    # Using an artifact makes it the most recently used.
+    module.get_cache_path('old.npy')
+
+    evicted = cache.prune(budget=250, module_name='cachemodule')
+    assert [e.name for e in evicted] == ['new.npy', 'newest.npy']
+    assert os.path.exists(module.get_path('raw.bin'))
+    assert os.path.exists(module.get_cache_path('old.npy'))
+
+    # Raw sources are never evicted, even if they are over budget.
+    evicted = cache.prune(budget=50, module_name='cachemodule',
+                          keep=[module.get_cache_path('old.npy')])
+    assert evicted == []
+
+
+def test_cli(module):
+    runner = CliRunner()
+    result = runner.invoke(cache.cache, ['ls', '--module_name', 'cachemodule'])
+    assert result.exit_code == 0
+    assert 'newest.npy' in result.output
+
+    result = runner.invoke(cache.cache, ['prune', '--budget', '150',
+                                         '--module_name', 'cachemodule',
+                                         '--dry_run'])
+    assert result.exit_code == 0
+    assert 'Would evict cachemodule/old.npy' in result.output
+    assert os.path.exists(module.get_cache_path('old.npy'))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
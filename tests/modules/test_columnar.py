@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import pytest
+
+import numpy as np
+
+from soc.modules._columnar import ColumnarTable, write_table
+
+strings = ['row %d: %s' % (i, 'ü' * (i % 7)) for i in range(1000)]
+arrays = np.arange(3000, dtype='int32').reshape(1000, 3)
+
+
+@pytest.fixture
+def table(tmpdir):
+    path = str(tmpdir.join('table.cols'))
+    columns = collections.OrderedDict([('text', strings), ('ids', arrays)])
+    write_table(path, columns, block_rows=64, codec='zlib')
+    return ColumnarTable(path)
+
+
+def test_read_all(table):
+    assert len(table) == 1000
+    assert table.column_names == ['text', 'ids']
+    assert table.read_column('text') == strings
+    np.testing.assert_array_equal(table.read_column('ids'), arrays)
+
+
+def test_read_rows(table, monkeypatch):
+    read_blocks = []
+    read_block = table._read_block
+
+    def _read_block(name, block):
+        read_blocks.append((name, int(block)))
+        return read_block(name, block)
+    monkeypatch.setattr(table, '_read_block', _read_block)
+
+    rows = [999, 3, 70, 65]
+    data = table.read(columns=['text'], rows=rows)
+    assert list(data.keys()) == ['text']
+    assert data['text'] == [strings[i] for i in rows]
+
+    # Only the blocks holding the rows are decompressed.
+    assert sorted(read_blocks) == [('text', 0), ('text', 1), ('text', 15)]
+
+    np.testing.assert_array_equal(table.read_column('ids', slice(60, 70)),
+                                  arrays[60:70])
+
+
+def test_invalid_tables(tmpdir):
+    with pytest.raises(IOError):
+        ColumnarTable(str(tmpdir))
+
+    with pytest.raises(ValueError):
+        write_table(str(tmpdir.join('a')), {'a': ['x'], 'b': ['y', 'z']})
+
+    with pytest.raises(ValueError):
+        write_table(str(tmpdir.join('b')), {'a': ['x']}, codec='snappy')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import pytest
+
+import numpy as np
+
+from soc.modules import Nietzsche
+from soc.modules._corpus import TextCorpus
+
+text = 'Ünd sö wëiter — über ℵ alles, 天下 𝄞 ' * 50
+
+
+@pytest.fixture
+def corpus_path(tmpdir):
+    fpath = tmpdir.join('corpus.txt')
+    with io.open(str(fpath), 'w', encoding='utf-8') as f:
+        f.write(text)
+    return str(fpath)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_iter_chunks(corpus_path, chunk_size):
+    corpus = TextCorpus(corpus_path)
+    chunks = list(corpus.iter_chunks(chunk_size))
+    assert ''.join(chunks) == text
+
+    chunks = list(corpus.iter_chunks(chunk_size, whole_words=True))
+    assert ''.join(chunks) == text
+    assert all(c.endswith(' ') for c in chunks)
+
+
+def test_split_on_character_boundary(corpus_path):
+    corpus = TextCorpus(corpus_path)
+
+    # The second byte of "Ü" is in the middle of a character.
+    first, second = corpus.split(1)
+    assert first.read(first.start, 2) == 'Ü'
+    assert second.read(second.start, 3) == 'nd '
+
+
+def test_sample(corpus_path):
+    corpus = TextCorpus(corpus_path)
+    x_data, y_data = corpus.sample(9, 200, include_next=True,
+                                   rng=np.random.RandomState(0))
+    assert len(x_data) == len(y_data) == 200
+    for x, y in zip(x_data, y_data):
+        assert len(x) == 9 and len(y) == 1
+        assert x + y in text
+
+
+def test_sample_too_short(corpus_path):
+    corpus = TextCorpus(corpus_path).split(10)[0]
+    with pytest.raises(ValueError):
+        corpus.sample(20, 1)
+
+
+def test_streaming_nietzsche():
+    nietzsche = Nietzsche(sample_len=7, num_samples=13, streaming=True,
+                          fname='test_corpus.txt')
+    with io.open(nietzsche.get_path('test_corpus.txt'), 'w',
+                 encoding='utf-8') as f:
+        f.write(text)
+
+    x_data, y_data = nietzsche.train_data
+    assert [x_data[0].shape[1:]] == nietzsche.input_shape
+    assert [y_data[0].shape[1:]] == nietzsche.output_shape
+    assert nietzsche.num_chars == len(set(text)) + 1
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('num_next,seq2seq', [(1, False), (3, False),
+                                              (None, True)])
+def test_nietzsche_targets(streaming, num_next, seq2seq):
+    nietzsche = Nietzsche(sample_len=5, num_samples=20, num_next=num_next,
+                          seq2seq=seq2seq, streaming=streaming,
+                          one_hot_input=False, one_hot_output=False,
+                          fname='test_targets.txt')
+
+    # In-memory text is read as bytes on Python 2, so this text is ASCII.
+    ascii_text = 'the quick brown fox jumps over the lazy dog. ' * 20
+    with io.open(nietzsche.get_path('test_targets.txt'), 'w') as f:
+        f.write(ascii_text)
+
+    (x_data,), (y_data,) = nietzsche.train_data
+    assert [y_data.shape[1:]] == nietzsche.output_shape
+    for x, y in zip(x_data.astype(int), y_data.astype(int)):
+        x = ''.join(nietzsche._idx_to_char[i] for i in x)
+        y = ''.join(nietzsche._idx_to_char[i] for i in y)
+        if seq2seq:
+            assert x[1:] == y[:-1] and x + y[-1] in ascii_text
+        else:
+            assert x + y in ascii_text
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
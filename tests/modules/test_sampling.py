@@ -0,0 +1,61 @@
+from __future__ import absolute_import
+
+import pytest
+
+import numpy as np
+
+from soc.modules import ArrayModule, WeightedSampler, StratifiedSampler
+from soc.modules._sampling import build_alias_table
+
+
+@pytest.mark.parametrize('power', [1, 4])
+def test_alias_table(power):
+    rng = np.random.RandomState(power)
+    weights = rng.exponential(size=100) ** power
+    weights[::7] = 0
+    prob, alias = build_alias_table(weights)
+
+    # Adds up how much of the table each index gets.
+    mass = prob.copy()
+    np.add.at(mass, alias, 1 - prob)
+    np.testing.assert_allclose(mass, weights * 100 / weights.sum())
+
+
+def test_weighted_sampler():
+    sampler = WeightedSampler([1, 0, 3])
+    rng = np.random.RandomState(0)
+    counts = np.bincount(sampler.sample(40000, rng), minlength=3)
+    np.testing.assert_allclose(counts / 40000., [0.25, 0, 0.75], atol=0.01)
+
+    sampler.update_weights(0, indices=[2])
+    assert (sampler.sample(100, rng) == 0).all()
+
+    with pytest.raises(ValueError):
+        WeightedSampler([0, 0])
+
+
+def test_stratified_sampler():
+    labels = np.array([0] * 95 + [1] * 5)
+    sampler = StratifiedSampler(labels)
+    drawn = labels[sampler.sample(20000, np.random.RandomState(0))]
+    assert abs(drawn.mean() - 0.5) < 0.02
+
+    one_hot = np.eye(3)[labels]
+    sampler = StratifiedSampler(one_hot)
+    with pytest.raises(ValueError):
+        sampler.set_class_weights([1, 1, 1])
+
+
+def test_iterate_with_sampler():
+    weights = np.zeros(103)
+    weights[:10] = 1
+    module = ArrayModule([np.arange(103).reshape(-1, 1)], [np.arange(103)])
+    iterator = module.iterate_data(batch_size=8, seed=0,
+                                   sampler=WeightedSampler(weights))
+    for _ in range(20):
+        (x_batch,), (y_batch,) = next(iterator)
+        assert (y_batch < 10).all()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -20,3 +20,32 @@ def test_get_module_subdir():
 def test_set_data_dir():
     with pytest.raises(ImportError):
         settings.set_setting('data_dir', '/tmp/not/a/directory')
+
+
+def test_env_coercion(monkeypatch):
+    monkeypatch.setenv('PYSOC_CHUNK_SIZE', '4096')
+    monkeypatch.setenv('PYSOC_MIRRORS', '/srv/a, http://b')
+    try:
+        settings.reload_settings()
+        assert settings.get_setting('chunk_size') == 4096
+        assert settings.get_setting('mirrors') == ['/srv/a', 'http://b']
+
+        monkeypatch.setenv('PYSOC_NUM_WORKERS', 'many')
+        with pytest.raises(ValueError):
+            settings.reload_settings()
+    finally:
+        monkeypatch.undo()
+        settings.reload_settings()
+
+
+def test_module_overrides():
+    try:
+        settings.set_setting('num_workers', '3', module_name='mnist')
+        assert settings.get_setting('num_workers', 'mnist') == 3
+        assert settings.get_setting('num_workers') == 1
+
+        with pytest.raises(ValueError):
+            settings.set_setting('dtype', 'int32', module_name='mnist')
+        assert settings.get_setting('dtype', 'mnist') == 'float64'
+    finally:
+        settings.reload_settings()
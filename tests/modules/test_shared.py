@@ -0,0 +1,60 @@
+from __future__ import absolute_import
+
+import multiprocessing
+import pytest
+
+import numpy as np
+
+import soc.modules._base as base
+
+
+class SharedModule(base.Module):
+    """Small in-memory module for testing shared datasets."""
+
+    def __init__(self, tag='test'):
+        self.tag = tag
+        super(SharedModule, self).__init__()
+
+    @property
+    def train_data(self):
+        x = np.arange(60, dtype='float32').reshape(20, 3)
+        y = np.arange(20, dtype='int64')
+        return [x], [y]
+
+
+def _attach_sum(tag):
+    x_data, y_data = SharedModule(tag=tag).shared_data()
+    return float(x_data[0].sum()), bool(x_data[0].flags.writeable)
+
+
+def test_shared_data():
+    module = SharedModule(tag='test_shared_data')
+    module.release_shared(force=True)
+
+    x_data, y_data = module.shared_data()
+    assert isinstance(x_data[0], np.memmap)
+    assert not x_data[0].flags.writeable
+    np.testing.assert_array_equal(y_data[0], np.arange(20))
+
+    pool = multiprocessing.Pool(2)
+    try:
+        results = pool.map(_attach_sum, ['test_shared_data'] * 2)
+    finally:
+        pool.close()
+        pool.join()
+    assert results == [(float(x_data[0].sum()), False)] * 2
+
+    module.release_shared()
+    assert not base.SharedDataset(
+        module._get_shared_name('train')).exists()
+
+
+def test_shared_object_dtype():
+    shared = base.SharedDataset('test_object_dtype')
+    with pytest.raises(ValueError):
+        shared.publish([np.array([u'a', None], dtype=object)], [])
+    assert not shared.exists()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+
+import os
+import pytest
+
+from click.testing import CliRunner
+
+import soc.modules._base as base
+import soc.modules._sources as sources
+from soc.modules._settings import set_setting
+
+
+class MirroredModule(base.Module):
+    """Module whose raw file is only available from a mirror."""
+
+
+@pytest.fixture
+def origin(tmpdir):
+    """Registers a source whose canonical URL is a local file."""
+
+    fpath = tmpdir.join('origin', 'data.txt')
+    fpath.write('payload', ensure=True)
+    source = ('mirroredmodule', 'data.txt', 'file://%s' % fpath)
+    sources.register_source(*source)
+    yield source
+    sources._sources.remove(source)
+    set_setting('mirrors', [])
+
+
+def test_get_urls(tmpdir):
+    set_setting('mirrors', [str(tmpdir), 'http://cache.local/pysoc/'])
+    try:
+        urls = sources.get_resolver().get_urls('mnist', 'mnist.pkl.gz',
+                                               'https://example.com/m.pkl.gz')
+    finally:
+        set_setting('mirrors', [])
+
+    assert urls == ['file://%s/mnist/mnist.pkl.gz' % tmpdir,
+                    'http://cache.local/pysoc/mnist/mnist.pkl.gz',
+                    'https://example.com/m.pkl.gz']
+
+
+def test_fetch_falls_back(tmpdir):
+    source = tmpdir.join('source.txt')
+    source.write('hello')
+    fpath = str(tmpdir.join('dest.txt'))
+
+    sources.fetch(fpath, ['file://%s/missing.txt' % tmpdir,
+                          'file://%s' % source],
+                  lambda url, f: sources.download_url(url, f, use_bar=False))
+    assert open(fpath).read() == 'hello'
+
+    with pytest.raises(IOError):
+        sources.fetch(str(tmpdir.join('other.txt')),
+                      ['file://%s/missing.txt' % tmpdir])
+
+
+def test_prefetch_and_mirror(origin, tmpdir):
+    store = tmpdir.join('store')
+    result = CliRunner().invoke(sources.prefetch, ['mirroredmodule',
+                                                   '--dest', str(store)])
+    assert result.exit_code == 0, result.output
+    assert store.join('mirroredmodule', 'data.txt').read() == 'payload'
+
+    # With the store as a mirror, the canonical URL is never used.
+    set_setting('mirrors', [str(store)])
+    module = MirroredModule()
+    fpath = module.get_file('data.txt', 'http://unreachable.invalid/data.txt',
+                            use_bar=False, download=True)
+    assert open(fpath).read() == 'payload'
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
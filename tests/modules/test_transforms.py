@@ -0,0 +1,78 @@
+from __future__ import absolute_import
+
+import pytest
+
+import numpy as np
+
+from soc.modules import (Compose, RandomShift, RandomRotation, ElasticNoise,
+                         Normalize, Cast)
+
+
+def _images(batch_size=8):
+    rng = np.random.RandomState(0)
+    return rng.randint(0, 256, size=(batch_size, 28, 28)).astype('uint8')
+
+
+def test_random_shift():
+    images = np.zeros((2, 5, 5), dtype='uint8')
+    images[:, 2, 2] = 1
+
+    shifted = RandomShift(max_shift=2)(images, rng=np.random.RandomState(0))
+    assert shifted.shape == images.shape
+    assert shifted.dtype == images.dtype
+
+    # Each image's single pixel is moved, but not out of the image.
+    assert (shifted.reshape(2, -1).sum(axis=1) == 1).all()
+
+
+def test_no_rotation():
+    images = _images()
+    rotated = RandomRotation(max_degrees=0)(images)
+    np.testing.assert_array_equal(rotated, images)
+
+
+class _FixedRng(object):
+    """Stands in for a RandomState that always draws the same value."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def uniform(self, low, high, size):
+        return np.full(size, self.value)
+
+
+def test_rotation_by_quarter_turn():
+    images = np.zeros((1, 3, 3))
+    images[0, 0, 1] = 1
+    rotated = RandomRotation(max_degrees=90).apply(images,
+                                                   _FixedRng(np.pi / 2))
+    assert rotated.sum() == 1
+    assert rotated[0, 1, 0] == 1 or rotated[0, 1, 2] == 1
+
+
+def test_random_transforms_skip_test_data():
+    images = _images()
+    transform = Compose([RandomShift(), RandomRotation(), ElasticNoise()])
+    np.testing.assert_array_equal(transform(images, training=False), images)
+
+
+def test_transforms_are_seeded():
+    images = _images()
+    transform = Compose([RandomShift(), RandomRotation(), ElasticNoise()])
+    a = transform(images, rng=np.random.RandomState(1))
+    b = transform(images, rng=np.random.RandomState(1))
+    np.testing.assert_array_equal(a, b)
+    assert a.shape == images.shape
+
+
+def test_normalize_and_cast():
+    images = _images()
+    transform = Compose([Cast('float32', scale=1. / 255), Normalize(0.5, 0.5)])
+    out = transform(images)
+    assert out.dtype == np.float32
+    assert out.min() >= -1 and out.max() <= 1
+    np.testing.assert_allclose(out, images / 127.5 - 1, atol=1e-5)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
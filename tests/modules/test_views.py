@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+
+import pytest
+
+import numpy as np
+
+from soc.modules import ArrayModule, ConcatModule, ZipModule, InterleaveModule
+from soc.modules._views import ConcatArray, IndexedArray
+
+
+def test_concat_array():
+    a = np.arange(12).reshape(4, 3)
+    b = np.arange(12, 18).reshape(2, 3)
+    view = ConcatArray([a, np.zeros((0, 3), dtype=int), b])
+    expected = np.concatenate([a, b])
+
+    assert view.shape == (6, 3) and len(view) == 6
+    np.testing.assert_array_equal(np.asarray(view), expected)
+    np.testing.assert_array_equal(view[5], expected[5])
+    np.testing.assert_array_equal(view[-1, 1:], expected[-1, 1:])
+    np.testing.assert_array_equal(view[1:5], expected[1:5])
+    np.testing.assert_array_equal(view[[5, 0, 4]], expected[[5, 0, 4]])
+    np.testing.assert_array_equal(view[expected[:, 0] > 6],
+                                  expected[expected[:, 0] > 6])
+
+    with pytest.raises(IndexError):
+        view[6]
+    with pytest.raises(ValueError):
+        ConcatArray([a, np.zeros((2, 4))])
+
+
+def test_indexed_array():
+    a = np.arange(10)
+    view = IndexedArray(ConcatArray([a, a]), [19, 0, 0, 3])
+    np.testing.assert_array_equal(view[:], [9, 0, 0, 3])
+    np.testing.assert_array_equal(view[[3, 0]], [3, 9])
+
+
+def test_compose_modules():
+    images = ArrayModule([np.arange(20).reshape(10, 2)], [np.arange(10)])
+    aux = ArrayModule([np.arange(10) * 10], [])
+
+    zipped = ZipModule([images, aux])
+    assert zipped.input_shape == [(2,), ()]
+    (x_a, x_b), (y,) = next(zipped.iterate_data(4, seed=0))
+    np.testing.assert_array_equal(x_a[:, 0], 2 * y)
+    np.testing.assert_array_equal(x_b, 10 * y)
+
+    concat = ConcatModule([images, images])
+    (x,), (y,) = concat.train_data
+    assert len(x) == len(y) == 20
+    np.testing.assert_array_equal(y[8:12], [8, 9, 0, 1])
+
+    with pytest.raises(ValueError):
+        ConcatModule([images, aux])
+
+
+def test_interleave_module():
+    small = ArrayModule([np.zeros((3, 1))], [np.arange(3)])
+    large = ArrayModule([np.ones((50, 1))], [np.arange(50)])
+    mixed = InterleaveModule([small, large], weights=[3, 1],
+                             num_samples=4000, seed=1)
+
+    (x,), (y,) = mixed.train_data
+    assert len(x) == 4000
+    assert abs(np.mean(x[:] == 0) - 0.75) < 0.05
+
+    # Each module's samples are used in order, cycling.
+    np.testing.assert_array_equal(y[x[:, 0] == 0][:7], [0, 1, 2, 0, 1, 2, 0])
+    np.testing.assert_array_equal(np.asarray(mixed.train_data[1][0]),
+                                  np.asarray(y))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])